@@ -23,7 +23,9 @@ def create_app(config_name=None):
         if key.isupper() or key in ['HOST', 'PORT', 'DEBUG', 'ENV']:
             app.config[key] = value
     
-    # 初始化扩展
+    # 初始化扩展（数据库类型不支持upsert时直接报配置错误）
+    from utils.upsert import check_database_dialect
+    check_database_dialect(app)
     db.init_app(app)
     login_manager.init_app(app)
     migrate.init_app(app, db)
@@ -32,10 +34,38 @@ def create_app(config_name=None):
     # 配置CORS
     CORS(app, origins=app.config.get('CORS_ORIGINS', ['*']))
     
+    # 初始化运行指标（需在其他请求钩子之前注册，熔断返回的503也计入）
+    from utils.metrics import init_metrics
+    init_metrics(app)
+    
     # 初始化数据库监控
     from utils.db_monitor import init_db_monitoring
     init_db_monitoring(app)
     
+    # 初始化请求级SQL统计（Server-Timing响应头和N+1警告）
+    from utils.query_profiler import init_query_profiler
+    init_query_profiler(app)
+    
+    # 初始化慢查询日志
+    from utils.slow_query_log import init_slow_query_log
+    init_slow_query_log(app)
+    
+    # 初始化每日统计计数缓冲
+    from utils.counter_buffer import init_daily_stats_buffer
+    init_daily_stats_buffer(app)
+    
+    # 初始化修行日历缓存
+    from utils.heatmap_cache import init_heatmap_cache
+    init_heatmap_cache(app)
+    
+    # 初始化统计快照缓存
+    from utils.stats_snapshot import init_stats_snapshot
+    init_stats_snapshot(app)
+    
+    # 初始化异步同步任务队列（接管重启后遗留的任务）
+    from utils.sync_job_queue import init_sync_job_queue
+    init_sync_job_queue(app)
+    
     # 导入所有模型确保它们被注册到SQLAlchemy
     from models import User, AdminUser, Chanting, Dedication, ChantingRecord, DailyStats, DedicationTemplate, SyncRecord, SyncConfig
     
@@ -58,6 +58,36 @@ class Config:
         # 分页配置
         self.POSTS_PER_PAGE = 20
         
+        # 每日统计计数缓冲：写入间隔（秒，0为不缓冲直接写入）和触发写入的累计次数
+        self.DAILY_STATS_FLUSH_INTERVAL = app_config.get('daily_stats_flush_interval', 2)
+        self.DAILY_STATS_FLUSH_THRESHOLD = app_config.get('daily_stats_flush_threshold', 500)
+        self.DAILY_STATS_FLUSH_MAX_RETRIES = app_config.get('daily_stats_flush_max_retries', 5)
+        
+        # 修行日历内存缓存的最大条目数（每个用户每年一条，超出时淘汰最久未使用的）
+        self.HEATMAP_CACHE_SIZE = app_config.get('heatmap_cache_size', 1024)
+        
+        # 后台首页和同步统计快照的缓存时间（秒，0为不缓存）
+        self.STATS_SNAPSHOT_TTL = app_config.get('stats_snapshot_ttl', 30)
+        
+        # 数据库健康检查：正常时的检查间隔（秒，0为只在出错时检查）、出错或熔断期间的检查间隔、
+        # 打开熔断器的连续失败次数（熔断期间API和同步请求直接返回503）
+        self.DB_HEALTH_CHECK_INTERVAL = app_config.get('db_health_check_interval', 30)
+        self.DB_HEALTH_RETRY_INTERVAL = app_config.get('db_health_retry_interval', 5)
+        self.DB_CIRCUIT_FAILURE_THRESHOLD = app_config.get('db_circuit_failure_threshold', 3)
+        
+        # 请求级SQL统计：每个请求的查询次数和数据库耗时（毫秒）预算，同一语句允许的重复次数，超出时记录警告
+        self.QUERY_PROFILER_ENABLED = app_config.get('query_profiler_enabled', True)
+        self.QUERY_BUDGET_COUNT = app_config.get('query_budget_count', 50)
+        self.QUERY_BUDGET_TIME_MS = app_config.get('query_budget_time_ms', 500)
+        self.QUERY_REPEAT_THRESHOLD = app_config.get('query_repeat_threshold', 10)
+        
+        # 慢查询日志：记录阈值（毫秒，0为不记录）和保留的最近记录条数（/system/slow-queries查看）
+        self.SLOW_QUERY_THRESHOLD_MS = app_config.get('slow_query_threshold_ms', 200)
+        self.SLOW_QUERY_LOG_SIZE = app_config.get('slow_query_log_size', 100)
+        
+        # /system/metrics 的访问令牌（请求头 Authorization: Bearer <令牌>），未配置时只允许已登录后台访问
+        self.METRICS_TOKEN = os.environ.get('METRICS_TOKEN') or app_config.get('metrics_token')
+        
         # 应用运行配置
         self.HOST = app_config.get('host', '0.0.0.0')
         self.PORT = app_config.get('port', 5566)
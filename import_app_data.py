@@ -97,7 +97,7 @@ def import_chantings(sqlite_conn, app_context):
         imported_count = 0
         for row in chantings:
             # 检查是否已存在
-            existing = Chanting.query.filter_by(title=row['title'], content=row['content']).first()
+            existing = Chanting.find_by_content(row['title'], row['content']).first()
             if existing:
                 print(f"佛号经文 {row['title']} 已存在，跳过")
                 continue
@@ -149,10 +149,7 @@ def import_dedications(sqlite_conn, app_context):
                 chanting_row = cursor.fetchone()
                 if chanting_row:
                     # 在MySQL中查找对应的佛号经文
-                    chanting = Chanting.query.filter_by(
-                        title=chanting_row['title'], 
-                        content=chanting_row['content']
-                    ).first()
+                    chanting = Chanting.find_by_content(chanting_row['title'], chanting_row['content']).first()
                     if chanting:
                         chanting_id = chanting.id
             
@@ -189,10 +186,7 @@ def import_chanting_records(sqlite_conn, app_context):
                 continue
             
             # 在MySQL中查找对应的佛号经文
-            chanting = Chanting.query.filter_by(
-                title=chanting_row['title'], 
-                content=chanting_row['content']
-            ).first()
+            chanting = Chanting.find_by_content(chanting_row['title'], chanting_row['content']).first()
             if not chanting:
                 print(f"MySQL中未找到对应的佛号经文: {chanting_row['title']}")
                 continue
@@ -225,6 +219,7 @@ def import_daily_stats(sqlite_conn, app_context):
         stats = cursor.fetchall()
         
         imported_count = 0
+        changes = []  # (user_id, chanting_id, 日期, 原次数, 新次数)，用于更新修行汇总、时间汇总和修行日历
         for row in stats:
             # 查找关联的佛号经文
             cursor.execute("SELECT title, content FROM chantings WHERE id = ?", (row['chanting_id'],))
@@ -233,10 +228,7 @@ def import_daily_stats(sqlite_conn, app_context):
                 continue
             
             # 在MySQL中查找对应的佛号经文
-            chanting = Chanting.query.filter_by(
-                title=chanting_row['title'], 
-                content=chanting_row['content']
-            ).first()
+            chanting = Chanting.find_by_content(chanting_row['title'], chanting_row['content']).first()
             if not chanting:
                 continue
             
@@ -248,7 +240,9 @@ def import_daily_stats(sqlite_conn, app_context):
             ).first()
             if existing:
                 # 更新计数
+                old_count = existing.count
                 existing.count = max(existing.count, row['count'])
+                changes.append((existing.user_id, chanting.id, stat_date, old_count, existing.count))
                 print(f"更新统计数据: {chanting.title} {stat_date} -> {existing.count}")
             else:
                 stat = DailyStats(
@@ -259,9 +253,12 @@ def import_daily_stats(sqlite_conn, app_context):
                     updated_at=datetime.fromisoformat(row['updated_at']) if row['updated_at'] else datetime.utcnow()
                 )
                 db.session.add(stat)
+                changes.append((None, chanting.id, stat_date, 0, row['count']))
                 imported_count += 1
                 print(f"导入统计数据: {chanting.title} {stat_date} -> {row['count']}")
         
+        db.session.flush()
+        DailyStats.refresh_summaries(changes)
         db.session.commit()
         print(f"✅ 每日统计导入完成，共导入 {imported_count} 条记录")
 
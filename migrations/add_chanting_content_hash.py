@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+数据库迁移脚本：为chantings表添加content_hash字段并回填现有数据
+运行方法: python migrations/add_chanting_content_hash.py
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import db
+from models.chanting import Chanting
+
+INDEX_NAME = 'idx_chantings_content_hash'
+BACKFILL_BATCH_SIZE = 500
+
+def upgrade():
+    """添加content_hash字段、回填哈希值并创建复合索引"""
+    print("开始迁移：为chantings表添加content_hash字段...")
+
+    try:
+        inspector = db.inspect(db.engine)
+        columns = [col['name'] for col in inspector.get_columns('chantings')]
+
+        with db.engine.connect() as conn:
+            if 'content_hash' not in columns:
+                conn.execute(db.text("ALTER TABLE chantings ADD COLUMN content_hash VARCHAR(64) NULL"))
+                print("✓ 添加 content_hash 字段成功")
+            else:
+                print("• content_hash 字段已存在")
+            conn.commit()
+
+        backfill_content_hash()
+
+        indexes = [index['name'] for index in inspector.get_indexes('chantings')]
+        with db.engine.connect() as conn:
+            if INDEX_NAME not in indexes:
+                conn.execute(db.text(f"CREATE INDEX {INDEX_NAME} ON chantings (content_hash, is_deleted)"))
+                print(f"✓ 创建索引 {INDEX_NAME} 成功")
+            else:
+                print(f"• 索引 {INDEX_NAME} 已存在")
+            conn.commit()
+
+        print("迁移完成")
+
+    except Exception as e:
+        print(f"迁移失败: {e}")
+        db.session.rollback()
+        raise
+
+def backfill_content_hash():
+    """为content_hash为空的佛号经文回填哈希值"""
+    table = Chanting.__table__
+    total = 0
+
+    while True:
+        rows = db.session.execute(
+            db.select(table.c.id, table.c.title, table.c.content)
+            .where(table.c.content_hash.is_(None))
+            .limit(BACKFILL_BATCH_SIZE)
+        ).all()
+        if not rows:
+            break
+
+        # 回填不算内容变更：显式写回原updated_at，否则列的onupdate会把它改成当前时间，
+        # 所有佛号在增量下载和ETag看来都像刚被修改过
+        for row in rows:
+            db.session.execute(
+                table.update()
+                .where(table.c.id == row.id)
+                .values(content_hash=Chanting.compute_content_hash(row.title, row.content),
+                        updated_at=table.c.updated_at)
+            )
+        db.session.commit()
+        total += len(rows)
+        print(f"已回填 {total} 条")
+
+    print(f"✓ content_hash 回填完成，共 {total} 条")
+
+def downgrade():
+    """删除content_hash字段和索引"""
+    print("开始回滚：删除chantings表的content_hash字段...")
+
+    try:
+        with db.engine.connect() as conn:
+            if db.engine.dialect.name == 'mysql':
+                conn.execute(db.text(f"DROP INDEX {INDEX_NAME} ON chantings"))
+            else:
+                conn.execute(db.text(f"DROP INDEX {INDEX_NAME}"))
+            conn.execute(db.text("ALTER TABLE chantings DROP COLUMN content_hash"))
+            conn.commit()
+
+        print("回滚完成")
+
+    except Exception as e:
+        print(f"回滚失败: {e}")
+        raise
+
+if __name__ == '__main__':
+    from app import create_app
+
+    app = create_app()
+    with app.app_context():
+        upgrade()
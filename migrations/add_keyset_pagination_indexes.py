@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+数据库迁移脚本：添加游标分页使用的复合索引
+运行方法: python migrations/add_keyset_pagination_indexes.py
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import db
+
+# 索引名 -> (表名, 列)
+TARGET_INDEXES = {
+    'idx_chanting_records_user_created': ('chanting_records', 'user_id, created_at, id'),
+    'idx_chanting_records_created': ('chanting_records', 'created_at, id'),
+    'idx_sync_records_started': ('sync_records', 'sync_started_at, id'),
+    'idx_sync_records_user_started': ('sync_records', 'user_id, sync_started_at, id'),
+}
+
+def upgrade():
+    """创建游标分页复合索引"""
+    print("开始迁移：添加游标分页索引...")
+
+    try:
+        inspector = db.inspect(db.engine)
+
+        with db.engine.connect() as conn:
+            for index_name, (table_name, columns) in TARGET_INDEXES.items():
+                indexes = [index['name'] for index in inspector.get_indexes(table_name)]
+                if index_name not in indexes:
+                    conn.execute(db.text(f"CREATE INDEX {index_name} ON {table_name} ({columns})"))
+                    print(f"✓ 创建索引 {index_name} 成功")
+                else:
+                    print(f"• 索引 {index_name} 已存在")
+            conn.commit()
+
+        print("迁移完成")
+
+    except Exception as e:
+        print(f"迁移失败: {e}")
+        raise
+
+def downgrade():
+    """删除游标分页复合索引"""
+    print("开始回滚：删除游标分页索引...")
+
+    try:
+        with db.engine.connect() as conn:
+            for index_name, (table_name, _) in TARGET_INDEXES.items():
+                if db.engine.dialect.name == 'mysql':
+                    conn.execute(db.text(f"DROP INDEX {index_name} ON {table_name}"))
+                else:
+                    conn.execute(db.text(f"DROP INDEX {index_name}"))
+            conn.commit()
+
+        print("回滚完成")
+
+    except Exception as e:
+        print(f"回滚失败: {e}")
+        raise
+
+if __name__ == '__main__':
+    from app import create_app
+
+    app = create_app()
+    with app.app_context():
+        upgrade()
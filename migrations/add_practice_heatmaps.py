@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+数据库迁移脚本：创建practice_heatmaps修行日历表、daily_stats用户日期索引，并根据daily_stats生成初始日历
+运行方法: python migrations/add_practice_heatmaps.py
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import db
+from models.practice_heatmap import PracticeHeatmap
+
+def upgrade():
+    """创建practice_heatmaps表和idx_daily_stats_user_date索引，并重建修行日历"""
+    print("开始迁移：创建practice_heatmaps表...")
+
+    try:
+        inspector = db.inspect(db.engine)
+        if 'practice_heatmaps' not in inspector.get_table_names():
+            PracticeHeatmap.__table__.create(db.engine)
+            print("✓ 创建practice_heatmaps表成功")
+        else:
+            print("• practice_heatmaps表已存在")
+
+        indexes = [index['name'] for index in inspector.get_indexes('daily_stats')]
+        if 'idx_daily_stats_user_date' not in indexes:
+            with db.engine.connect() as conn:
+                conn.execute(db.text("CREATE INDEX idx_daily_stats_user_date ON daily_stats (user_id, date)"))
+                conn.commit()
+            print("✓ 创建索引 idx_daily_stats_user_date 成功")
+        else:
+            print("• 索引 idx_daily_stats_user_date 已存在")
+
+        rebuilt = PracticeHeatmap.rebuild()
+        db.session.commit()
+        print(f"✓ 重建修行日历 {rebuilt} 条")
+
+        print("迁移完成")
+
+    except Exception as e:
+        db.session.rollback()
+        print(f"迁移失败: {e}")
+        raise
+
+def downgrade():
+    """删除practice_heatmaps表和idx_daily_stats_user_date索引"""
+    print("开始回滚：删除practice_heatmaps表...")
+
+    try:
+        PracticeHeatmap.__table__.drop(db.engine, checkfirst=True)
+        with db.engine.connect() as conn:
+            if db.engine.dialect.name == 'mysql':
+                conn.execute(db.text("DROP INDEX idx_daily_stats_user_date ON daily_stats"))
+            else:
+                conn.execute(db.text("DROP INDEX idx_daily_stats_user_date"))
+            conn.commit()
+        print("回滚完成")
+
+    except Exception as e:
+        print(f"回滚失败: {e}")
+        raise
+
+if __name__ == '__main__':
+    from app import create_app
+
+    app = create_app()
+    with app.app_context():
+        upgrade()
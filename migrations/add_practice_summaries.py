@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+数据库迁移脚本：创建practice_summaries修行汇总表，并根据daily_stats生成初始数据
+运行方法: python migrations/add_practice_summaries.py
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import db
+from models.practice_summary import PracticeSummary
+
+def upgrade():
+    """创建practice_summaries表并重建汇总"""
+    print("开始迁移：创建practice_summaries表...")
+
+    try:
+        inspector = db.inspect(db.engine)
+        if 'practice_summaries' not in inspector.get_table_names():
+            PracticeSummary.__table__.create(db.engine)
+            print("✓ 创建practice_summaries表成功")
+        else:
+            print("• practice_summaries表已存在")
+
+        rebuilt = PracticeSummary.rebuild()
+        db.session.commit()
+        print(f"✓ 重建修行汇总 {rebuilt} 条")
+
+        print("迁移完成")
+
+    except Exception as e:
+        db.session.rollback()
+        print(f"迁移失败: {e}")
+        raise
+
+def downgrade():
+    """删除practice_summaries表"""
+    print("开始回滚：删除practice_summaries表...")
+
+    try:
+        PracticeSummary.__table__.drop(db.engine, checkfirst=True)
+        print("回滚完成")
+
+    except Exception as e:
+        print(f"回滚失败: {e}")
+        raise
+
+if __name__ == '__main__':
+    from app import create_app
+
+    app = create_app()
+    with app.app_context():
+        upgrade()
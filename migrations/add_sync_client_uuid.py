@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+数据库迁移脚本：为修行记录和回向表添加client_uuid字段（增量同步使用）
+运行方法: python migrations/add_sync_client_uuid.py
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import db
+
+# 表名 -> 索引名
+TARGET_TABLES = {
+    'chanting_records': 'idx_chanting_records_client_uuid',
+    'dedications': 'idx_dedications_client_uuid',
+}
+
+def upgrade():
+    """添加client_uuid字段和 (user_id, client_uuid) 复合索引"""
+    print("开始迁移：添加增量同步所需的client_uuid字段...")
+
+    try:
+        inspector = db.inspect(db.engine)
+
+        with db.engine.connect() as conn:
+            for table_name, index_name in TARGET_TABLES.items():
+                columns = [col['name'] for col in inspector.get_columns(table_name)]
+                if 'client_uuid' not in columns:
+                    conn.execute(db.text(f"ALTER TABLE {table_name} ADD COLUMN client_uuid VARCHAR(64) NULL"))
+                    print(f"✓ {table_name} 添加 client_uuid 字段成功")
+                else:
+                    print(f"• {table_name}.client_uuid 字段已存在")
+
+                indexes = [index['name'] for index in inspector.get_indexes(table_name)]
+                if index_name not in indexes:
+                    conn.execute(db.text(f"CREATE INDEX {index_name} ON {table_name} (user_id, client_uuid)"))
+                    print(f"✓ 创建索引 {index_name} 成功")
+                else:
+                    print(f"• 索引 {index_name} 已存在")
+
+            conn.commit()
+
+        print("迁移完成")
+
+    except Exception as e:
+        print(f"迁移失败: {e}")
+        raise
+
+def downgrade():
+    """删除client_uuid字段和索引"""
+    print("开始回滚：删除client_uuid字段...")
+
+    try:
+        with db.engine.connect() as conn:
+            for table_name, index_name in TARGET_TABLES.items():
+                if db.engine.dialect.name == 'mysql':
+                    conn.execute(db.text(f"DROP INDEX {index_name} ON {table_name}"))
+                else:
+                    conn.execute(db.text(f"DROP INDEX {index_name}"))
+                conn.execute(db.text(f"ALTER TABLE {table_name} DROP COLUMN client_uuid"))
+            conn.commit()
+
+        print("回滚完成")
+
+    except Exception as e:
+        print(f"回滚失败: {e}")
+        raise
+
+if __name__ == '__main__':
+    from app import create_app
+
+    app = create_app()
+    with app.app_context():
+        upgrade()
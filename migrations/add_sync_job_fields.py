@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+数据库迁移脚本：为sync_records表添加异步同步任务字段和同步结果计数
+运行方法: python migrations/add_sync_job_fields.py
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import db
+
+def get_new_columns():
+    """字段名 -> 列定义，任务数据在MySQL下使用LONGTEXT"""
+    payload_type = 'LONGTEXT' if db.engine.dialect.name == 'mysql' else 'TEXT'
+    return {
+        'result_details': 'TEXT NULL',
+        'job_status': 'VARCHAR(20) NULL',
+        'job_progress': 'INTEGER NULL',
+        'job_payload': f'{payload_type} NULL',
+    }
+
+def upgrade():
+    """添加 result_details、job_status、job_progress、job_payload 字段"""
+    print("开始迁移：为sync_records表添加异步任务字段...")
+
+    try:
+        inspector = db.inspect(db.engine)
+        columns = [col['name'] for col in inspector.get_columns('sync_records')]
+
+        with db.engine.connect() as conn:
+            for column_name, column_def in get_new_columns().items():
+                if column_name not in columns:
+                    conn.execute(db.text(f"ALTER TABLE sync_records ADD COLUMN {column_name} {column_def}"))
+                    print(f"✓ 添加 {column_name} 字段成功")
+                else:
+                    print(f"• {column_name} 字段已存在")
+            conn.commit()
+
+        print("迁移完成")
+
+    except Exception as e:
+        print(f"迁移失败: {e}")
+        raise
+
+def downgrade():
+    """删除异步任务字段"""
+    print("开始回滚：删除sync_records表的异步任务字段...")
+
+    try:
+        with db.engine.connect() as conn:
+            for column_name in get_new_columns():
+                conn.execute(db.text(f"ALTER TABLE sync_records DROP COLUMN {column_name}"))
+            conn.commit()
+
+        print("回滚完成")
+
+    except Exception as e:
+        print(f"回滚失败: {e}")
+        raise
+
+if __name__ == '__main__':
+    from app import create_app
+
+    app = create_app()
+    with app.app_context():
+        upgrade()
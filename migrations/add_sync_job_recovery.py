@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+数据库迁移脚本：异步同步任务使用独立的pending状态，并记录任务执行次数
+运行方法: python migrations/add_sync_job_recovery.py
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import db
+
+STATUS_ENUM = "ENUM('success', 'failed', 'partial', 'pending')"
+OLD_STATUS_ENUM = "ENUM('success', 'failed', 'partial')"
+
+def upgrade():
+    """sync_status增加pending，添加job_attempts字段，未完成的任务改为pending"""
+    print("开始迁移：异步同步任务状态和执行次数...")
+
+    try:
+        inspector = db.inspect(db.engine)
+        columns = [col['name'] for col in inspector.get_columns('sync_records')]
+
+        with db.engine.connect() as conn:
+            if db.engine.dialect.name == 'mysql':
+                conn.execute(db.text(
+                    f"ALTER TABLE sync_records MODIFY COLUMN sync_status {STATUS_ENUM} NOT NULL DEFAULT 'success'"
+                ))
+                print("✓ sync_status 增加 pending 状态")
+
+            if 'job_attempts' not in columns:
+                conn.execute(db.text("ALTER TABLE sync_records ADD COLUMN job_attempts INTEGER NULL"))
+                print("✓ 添加 job_attempts 字段成功")
+            else:
+                print("• job_attempts 字段已存在")
+
+            result = conn.execute(db.text(
+                "UPDATE sync_records SET sync_status = 'pending' WHERE job_status IN ('queued', 'running')"
+            ))
+            print(f"✓ {result.rowcount} 个未完成的任务改为 pending 状态")
+            conn.commit()
+
+        print("迁移完成")
+
+    except Exception as e:
+        print(f"迁移失败: {e}")
+        raise
+
+def downgrade():
+    """pending状态改回partial，删除job_attempts字段"""
+    print("开始回滚：异步同步任务状态和执行次数...")
+
+    try:
+        with db.engine.connect() as conn:
+            conn.execute(db.text("UPDATE sync_records SET sync_status = 'partial' WHERE sync_status = 'pending'"))
+            if db.engine.dialect.name == 'mysql':
+                conn.execute(db.text(
+                    f"ALTER TABLE sync_records MODIFY COLUMN sync_status {OLD_STATUS_ENUM} NOT NULL DEFAULT 'success'"
+                ))
+            conn.execute(db.text("ALTER TABLE sync_records DROP COLUMN job_attempts"))
+            conn.commit()
+
+        print("回滚完成")
+
+    except Exception as e:
+        print(f"回滚失败: {e}")
+        raise
+
+if __name__ == '__main__':
+    from app import create_app
+
+    app = create_app()
+    with app.app_context():
+        upgrade()
@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+数据库迁移脚本：创建sync_tombstones同步删除标记表
+运行方法: python migrations/add_sync_tombstones.py
+
+此前同步写入的updated_at为app端时间，与服务器时间的下载游标不可比较，
+升级后app应不带游标全量下载一次
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import db
+from models.sync_tombstone import SyncTombstone
+
+def upgrade():
+    """创建sync_tombstones表"""
+    print("开始迁移：创建sync_tombstones表...")
+
+    try:
+        inspector = db.inspect(db.engine)
+        if 'sync_tombstones' not in inspector.get_table_names():
+            SyncTombstone.__table__.create(db.engine)
+            print("✓ 创建sync_tombstones表成功")
+        else:
+            print("• sync_tombstones表已存在")
+
+        print("迁移完成")
+
+    except Exception as e:
+        print(f"迁移失败: {e}")
+        raise
+
+def downgrade():
+    """删除sync_tombstones表"""
+    print("开始回滚：删除sync_tombstones表...")
+
+    try:
+        SyncTombstone.__table__.drop(db.engine, checkfirst=True)
+        print("回滚完成")
+
+    except Exception as e:
+        print(f"回滚失败: {e}")
+        raise
+
+if __name__ == '__main__':
+    from app import create_app
+
+    app = create_app()
+    with app.app_context():
+        upgrade()
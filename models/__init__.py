@@ -3,14 +3,18 @@ from .chanting import Chanting
 from .dedication import Dedication
 from .chanting_record import ChantingRecord
 from .daily_stats import DailyStats
+from .practice_summary import PracticeSummary
+from .stats_rollup import StatsRollup
+from .practice_heatmap import PracticeHeatmap
 from .dedication_template import DedicationTemplate
 from .sync_record import SyncRecord
 from .sync_config import SyncConfig
+from .sync_tombstone import SyncTombstone
 from .chapter import Chapter
 from .reading_progress import ReadingProgress
 
 __all__ = [
     'User', 'AdminUser', 'Chanting', 'Dedication', 
-    'ChantingRecord', 'DailyStats', 'DedicationTemplate',
-    'SyncRecord', 'SyncConfig', 'Chapter', 'ReadingProgress'
+    'ChantingRecord', 'DailyStats', 'PracticeSummary', 'StatsRollup', 'PracticeHeatmap', 'DedicationTemplate',
+    'SyncRecord', 'SyncConfig', 'SyncTombstone', 'Chapter', 'ReadingProgress'
 ]
\ No newline at end of file
@@ -1,4 +1,6 @@
+import hashlib
 from datetime import datetime
+from sqlalchemy import event
 from database import db
 
 class Chanting(db.Model):
@@ -13,9 +15,15 @@ class Chanting(db.Model):
     is_built_in = db.Column(db.Boolean, default=False)  # 是否为内置
     is_deleted = db.Column(db.Boolean, default=False)  # 逻辑删除
     user_id = db.Column(db.Integer, nullable=True)  # 创建者ID，内置内容为空
+    content_hash = db.Column(db.String(64), nullable=True)  # 标题+内容的SHA-256，用于按内容快速查找
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
+    # 同步时按 (content_hash, is_deleted) 查找佛号经文，避免比较TEXT全文
+    __table_args__ = (
+        db.Index('idx_chantings_content_hash', 'content_hash', 'is_deleted'),
+    )
+    
     def to_dict(self):
         """转换为字典格式"""
         return {
@@ -31,6 +39,20 @@ class Chanting(db.Model):
             'updated_at': self.updated_at.isoformat() if self.updated_at else None
         }
     
+    @staticmethod
+    def compute_content_hash(title, content):
+        """计算标题+内容的哈希值"""
+        raw = f"{title or ''}\n{content or ''}"
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+    
+    @classmethod
+    def find_by_content(cls, title, content):
+        """按标题和内容查找（走content_hash索引）"""
+        return cls.query.filter_by(
+            content_hash=cls.compute_content_hash(title, content),
+            title=title
+        )
+    
     @classmethod
     def get_active(cls):
         """获取未删除的记录"""
@@ -104,4 +126,10 @@ dì zàng ！ dì zàng ！ rǔ zhī shén lì bù kě sī yì ， rǔ zhī cí
                 chanting = Chanting(**data)
                 db.session.add(chanting)
         
-        db.session.commit()
\ No newline at end of file
+        db.session.commit()
+
+@event.listens_for(Chanting, 'before_insert')
+@event.listens_for(Chanting, 'before_update')
+def _update_content_hash(mapper, connection, target):
+    """创建或更新时同步维护content_hash"""
+    target.content_hash = Chanting.compute_content_hash(target.title, target.content)
@@ -8,9 +8,17 @@ class ChantingRecord(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     chanting_id = db.Column(db.Integer, nullable=False)
     user_id = db.Column(db.Integer, nullable=True)  # 可选，如果需要用户关联
+    client_uuid = db.Column(db.String(64), nullable=True)  # app端稳定主键，用于增量同步
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
+    # 增量同步按 (user_id, client_uuid) 查找记录；列表按 (时间, id) 游标分页
+    __table_args__ = (
+        db.Index('idx_chanting_records_client_uuid', 'user_id', 'client_uuid'),
+        db.Index('idx_chanting_records_user_created', 'user_id', 'created_at', 'id'),
+        db.Index('idx_chanting_records_created', 'created_at', 'id'),
+    )
+    
     def to_dict(self):
         """转换为字典格式"""
         return {
@@ -21,33 +29,30 @@ class ChantingRecord(db.Model):
             'updated_at': self.updated_at.isoformat() if self.updated_at else None
         }
     
-    def to_dict_with_chanting(self):
-        """包含佛号经文详情的字典格式"""
+    def to_dict_with_chanting(self, loader=None):
+        """包含佛号经文详情的字典格式，批量序列化时传入预加载的loader"""
         from models.chanting import Chanting
+        from utils.relation_loader import RelationLoader
+        loader = loader or RelationLoader()
         data = self.to_dict()
-        if self.chanting_id:
-            chanting = Chanting.query.get(self.chanting_id)
-            if chanting:
-                data['chanting'] = chanting.to_dict()
+        chanting = loader.get(Chanting, self.chanting_id)
+        if chanting:
+            data['chanting'] = chanting.to_dict()
         return data
     
-    def to_dict_with_user_and_chanting(self):
-        """包含用户和佛号经文详情的字典格式"""
-        from models.chanting import Chanting
+    def to_dict_with_user_and_chanting(self, loader=None):
+        """包含用户和佛号经文详情的字典格式，批量序列化时传入预加载的loader"""
         from models.user import User
-        data = self.to_dict()
-        if self.chanting_id:
-            chanting = Chanting.query.get(self.chanting_id)
-            if chanting:
-                data['chanting'] = chanting.to_dict()
-        if self.user_id:
-            user = User.query.get(self.user_id)
-            if user:
-                data['user'] = {
-                    'id': user.id,
-                    'username': user.username,
-                    'nickname': user.nickname,
-                    'avatar': user.avatar,
-                    'avatar_type': user.avatar_type
-                }
+        from utils.relation_loader import RelationLoader
+        loader = loader or RelationLoader()
+        data = self.to_dict_with_chanting(loader)
+        user = loader.get(User, self.user_id)
+        if user:
+            data['user'] = {
+                'id': user.id,
+                'username': user.username,
+                'nickname': user.nickname,
+                'avatar': user.avatar,
+                'avatar_type': user.avatar_type
+            }
         return data
\ No newline at end of file
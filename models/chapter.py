@@ -45,12 +45,13 @@ class Chapter(db.Model):
         self.updated_at = datetime.utcnow()
         db.session.commit()
     
-    def to_dict_with_chanting(self):
-        """包含经文详情的字典格式"""
+    def to_dict_with_chanting(self, loader=None):
+        """包含经文详情的字典格式，批量序列化时传入预加载的loader"""
         from models.chanting import Chanting
+        from utils.relation_loader import RelationLoader
+        loader = loader or RelationLoader()
         data = self.to_dict()
-        if self.chanting_id:
-            chanting = Chanting.query.get(self.chanting_id)
-            if chanting:
-                data['chanting'] = chanting.to_dict()
+        chanting = loader.get(Chanting, self.chanting_id)
+        if chanting:
+            data['chanting'] = chanting.to_dict()
         return data
\ No newline at end of file
@@ -1,5 +1,8 @@
 from datetime import datetime, date
 from database import db
+from utils.metrics import DAILY_STATS_WRITES
+from utils.bulk_writer import BulkWriter
+from utils.upsert import upsert_statement
 
 class DailyStats(db.Model):
     """每日统计模型 - 对应Flutter应用的DailyStats"""
@@ -16,6 +19,8 @@ class DailyStats(db.Model):
     # 创建复合唯一索引，确保每个用户每天每个佛号经文只有一条统计记录
     __table_args__ = (
         db.UniqueConstraint('chanting_id', 'user_id', 'date', name='unique_daily_stats'),
+        db.Index('idx_daily_stats_date', 'date'),
+        db.Index('idx_daily_stats_user_date', 'user_id', 'date'),
     )
     
     def to_dict(self):
@@ -30,55 +35,208 @@ class DailyStats(db.Model):
             'updated_at': self.updated_at.isoformat() if self.updated_at else None
         }
     
-    def to_dict_with_chanting(self):
-        """包含佛号经文详情的字典格式"""
+    def to_dict_with_chanting(self, loader=None):
+        """包含佛号经文详情的字典格式，批量序列化时传入预加载的loader"""
         from models.chanting import Chanting
+        from utils.relation_loader import RelationLoader
+        loader = loader or RelationLoader()
         data = self.to_dict()
-        if self.chanting_id:
-            chanting = Chanting.query.get(self.chanting_id)
-            if chanting:
-                data['chanting'] = chanting.to_dict()
+        chanting = loader.get(Chanting, self.chanting_id)
+        if chanting:
+            data['chanting'] = chanting.to_dict()
         return data
     
+    @classmethod
+    def build_upsert(cls, rows, increment=False):
+        """
+        构造批量upsert语句，按 (chanting_id, user_id, date) 唯一约束合并
+        increment为True时冲突行执行 count = count + n，否则直接设置为 n
+        """
+        table = cls.__table__
+        now = datetime.utcnow()
+        values = [{
+            'chanting_id': row['chanting_id'],
+            'user_id': row.get('user_id'),
+            'date': row.get('date') or date.today(),
+            'count': row.get('count', 0),
+            'created_at': row.get('created_at') or now,
+            'updated_at': row.get('updated_at') or now
+        } for row in rows]
+        return upsert_statement(table, values, ['chanting_id', 'user_id', 'date'], lambda new: {
+            'count': table.c.count + new.count if increment else new.count,
+            'updated_at': new.updated_at
+        })
+    
+    @classmethod
+    def upsert(cls, chanting_id, user_id, stat_date, count, increment=False):
+        """单条统计的原子增加或设置（不提交事务），同时刷新修行汇总"""
+        cls.upsert_many([{
+            'chanting_id': chanting_id,
+            'user_id': user_id,
+            'date': stat_date,
+            'count': count
+        }], increment=increment)
+    
+    @classmethod
+    def upsert_many(cls, rows, increment=False):
+        """
+        批量原子增加或设置（不提交事务），同时更新修行汇总
+        
+        计数由一条upsert语句写入；修行汇总需要的原次数在同一事务内、这些行已被本事务锁住后读取，
+        并发写入同一统计时依次执行，不会读到过期的原次数：
+        增加时先写后读，原次数为新次数减去增量（2条语句）；
+        设置时先以 count = count + 0 锁住（不存在则创建）这些行，读取原次数后再写入（3条语句）
+        user_id为空的统计不会触发唯一约束冲突（NULL互不相等），改为锁定查询后更新或插入
+        """
+        if not rows:
+            return
+        written = len(rows)
+        changes = cls._write_ownerless([row for row in rows if row.get('user_id') is None], increment)
+        rows = [row for row in rows if row.get('user_id') is not None]
+        keys = [(row['user_id'], row['chanting_id'], row.get('date') or date.today()) for row in rows]
+        
+        if rows and increment:
+            db.session.execute(cls.build_upsert(rows, increment=True))
+            current = cls.get_counts(keys, for_update=True)
+            increments = {}
+            for key, row in zip(keys, rows):
+                increments[key] = increments.get(key, 0) + row.get('count', 0)
+            changes.extend(
+                (*key, current.get(key, 0) - total, current.get(key, 0))
+                for key, total in increments.items()
+            )
+        elif rows:
+            current = cls.lock_counts(rows)
+            db.session.execute(cls.build_upsert(rows))
+            new_counts = {key: row.get('count', 0) for key, row in zip(keys, rows)}
+            changes.extend((*key, current.get(key, 0), count) for key, count in new_counts.items())
+        
+        cls.refresh_summaries(changes)
+        DAILY_STATS_WRITES.inc(written, source='increment' if increment else 'set')
+    
+    @classmethod
+    def _write_ownerless(cls, rows, increment):
+        """逐条写入user_id为空的统计：锁定查询已有的一条，存在则更新，不存在则插入，返回汇总的变化"""
+        changes = []
+        for row in rows:
+            stat_date = row.get('date') or date.today()
+            stats = cls.query.filter_by(
+                chanting_id=row['chanting_id'], user_id=None, date=stat_date
+            ).order_by(cls.id).populate_existing().with_for_update().first()
+            old_count = stats.count if stats else 0
+            new_count = old_count + row.get('count', 0) if increment else row.get('count', 0)
+            if stats:
+                stats.count = new_count
+            else:
+                db.session.add(cls(chanting_id=row['chanting_id'], user_id=None, date=stat_date, count=new_count))
+            db.session.flush()
+            changes.append((None, row['chanting_id'], stat_date, old_count, new_count))
+        return changes
+    
+    @classmethod
+    def lock_counts(cls, rows, batch_size=None):
+        """
+        锁住这些统计行（不存在则以0次创建）后读取原次数，返回 {(user_id, chanting_id, 日期): 次数}
+        以 count = count + 0 的upsert取得行锁，之后直到事务提交，其他写入同一统计的事务都要等待，
+        调用方随后写入新次数、按原次数更新修行汇总不会漂移；user_id为空的行不会触发唯一约束冲突，跳过锁定
+        """
+        rows = list(rows)
+        writer = BulkWriter(cls, batch_size, statement_builder=lambda batch: cls.build_upsert(batch, increment=True))
+        for row in rows:
+            if row.get('user_id') is not None:
+                writer.add({**row, 'count': 0})
+        writer.close()
+        return cls.get_counts(
+            ((row.get('user_id'), row['chanting_id'], row.get('date') or date.today()) for row in rows),
+            for_update=True
+        )
+    
+    @classmethod
+    def get_counts(cls, keys, chunk_size=500, for_update=False):
+        """
+        批量读取 (user_id, chanting_id, 日期) 的当前次数，返回 {键: 次数}，不存在的键不返回
+        for_update为True时以锁定读读取最新提交的值（SQLite整库写锁，无需FOR UPDATE）
+        """
+        keys = list({key for key in keys})
+        counts = {}
+        for start in range(0, len(keys), chunk_size):
+            chunk = keys[start:start + chunk_size]
+            conditions = []
+            user_keys = [key for key in chunk if key[0] is not None]
+            if user_keys:
+                conditions.append(db.tuple_(cls.user_id, cls.chanting_id, cls.date).in_(user_keys))
+            anonymous_keys = [(chanting_id, stat_date) for user_id, chanting_id, stat_date in chunk if user_id is None]
+            if anonymous_keys:
+                conditions.append(db.and_(
+                    cls.user_id.is_(None),
+                    db.tuple_(cls.chanting_id, cls.date).in_(anonymous_keys)
+                ))
+            query = db.session.query(
+                cls.user_id, cls.chanting_id, cls.date, cls.count
+            ).filter(db.or_(*conditions))
+            if for_update:
+                query = query.with_for_update()
+            counts.update(
+                ((user_id, chanting_id, stat_date), count)
+                for user_id, chanting_id, stat_date, count in query
+            )
+        return counts
+    
+    @staticmethod
+    def refresh_summaries(changes):
+        """
+        更新这些统计所属 (用户, 佛号经文) 的修行汇总、所在日期的时间汇总和 (用户, 年份) 的修行日历
+        changes为 (user_id, chanting_id, 日期, 原次数, 新次数)，新增的统计原次数为0，删除的统计新次数为0
+        """
+        from models.practice_summary import PracticeSummary
+        from models.stats_rollup import StatsRollup
+        from models.practice_heatmap import PracticeHeatmap
+        changes = list(changes)
+        PracticeSummary.apply_changes(changes)
+        deltas = {}
+        for _, _, stat_date, old_count, new_count in changes:
+            deltas[stat_date] = deltas.get(stat_date, 0) + (new_count or 0) - (old_count or 0)
+        StatsRollup.apply_deltas(deltas)
+        PracticeHeatmap.apply_changes(changes)
+    
+    @classmethod
+    def get_stats(cls, chanting_id, user_id, stat_date):
+        """获取某天的统计记录"""
+        return cls.query.filter_by(
+            chanting_id=chanting_id,
+            user_id=user_id,
+            date=stat_date
+        ).populate_existing().first()
+    
     @classmethod
     def get_or_create_today(cls, chanting_id, user_id=None):
         """获取或创建今日统计记录"""
         today = date.today()
-        stats = cls.query.filter_by(
-            chanting_id=chanting_id,
-            user_id=user_id,
-            date=today
-        ).first()
+        stats = cls.get_stats(chanting_id, user_id, today)
         
         if not stats:
-            stats = cls(
-                chanting_id=chanting_id,
-                user_id=user_id,
-                date=today,
-                count=0
-            )
-            db.session.add(stats)
+            # 并发创建时由唯一约束合并，不会因重复插入失败
+            cls.upsert(chanting_id, user_id, today, 0, increment=True)
             db.session.commit()
+            stats = cls.get_stats(chanting_id, user_id, today)
         
         return stats
     
     @classmethod
     def increment_count(cls, chanting_id, user_id=None, increment=1):
         """增加念诵次数"""
-        stats = cls.get_or_create_today(chanting_id, user_id)
-        stats.count += increment
-        stats.updated_at = datetime.utcnow()
+        today = date.today()
+        cls.upsert(chanting_id, user_id, today, increment, increment=True)
         db.session.commit()
-        return stats
+        return cls.get_stats(chanting_id, user_id, today)
     
     @classmethod
     def set_count(cls, chanting_id, count, user_id=None):
         """设置念诵次数"""
-        stats = cls.get_or_create_today(chanting_id, user_id)
-        stats.count = count
-        stats.updated_at = datetime.utcnow()
+        today = date.today()
+        cls.upsert(chanting_id, user_id, today, count)
         db.session.commit()
-        return stats
+        return cls.get_stats(chanting_id, user_id, today)
     
     @classmethod
     def get_date_range_stats(cls, start_date, end_date, user_id=None):
@@ -10,9 +10,15 @@ class Dedication(db.Model):
     content = db.Column(db.Text, nullable=False)
     chanting_id = db.Column(db.Integer, nullable=True)
     user_id = db.Column(db.Integer, nullable=True)  # 可选，如果需要用户关联
+    client_uuid = db.Column(db.String(64), nullable=True)  # app端稳定主键，用于增量同步
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
+    # 增量同步按 (user_id, client_uuid) 查找回向
+    __table_args__ = (
+        db.Index('idx_dedications_client_uuid', 'user_id', 'client_uuid'),
+    )
+    
     def to_dict(self):
         """转换为字典格式"""
         return {
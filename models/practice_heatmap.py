@@ -0,0 +1,178 @@
+from array import array
+from datetime import datetime, date
+from database import db
+from utils.upsert import upsert_statement
+
+class PracticeHeatmap(db.Model):
+    """修行日历模型 - 每个用户每年一行，保存当年每天的念诵总次数
+
+    counts为366个uint32的紧凑数组（下标为当年第几天），DailyStats写入时按次数的变化增量更新，
+    全量重算只在 refresh_user 和 rebuild 中进行；version每次更新递增，供内存缓存判断是否过期
+    """
+    __tablename__ = 'practice_heatmaps'
+
+    DAYS = 366
+    TYPECODE = 'I'
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, nullable=False)
+    year = db.Column(db.Integer, nullable=False)
+    counts = db.Column(db.LargeBinary, nullable=False)  # array('I') 的字节，366项
+    total_count = db.Column(db.Integer, default=0, nullable=False)  # 当年念诵总次数
+    active_days = db.Column(db.Integer, default=0, nullable=False)  # 当年修行天数
+    version = db.Column(db.Integer, default=1, nullable=False)  # 每次刷新递增
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'year', name='unique_practice_heatmap'),
+    )
+
+    @classmethod
+    def pack(cls, day_counts, year):
+        """将 {日期: 次数} 打包为当年的紧凑数组字节"""
+        counts = array(cls.TYPECODE, [0] * cls.DAYS)
+        for stat_date, count in day_counts.items():
+            if stat_date.year == year and count and count > 0:
+                counts[stat_date.timetuple().tm_yday - 1] = min(int(count), 0xFFFFFFFF)
+        return counts.tobytes()
+
+    @classmethod
+    def unpack(cls, data):
+        """将字节还原为数组"""
+        counts = array(cls.TYPECODE)
+        counts.frombytes(data)
+        return counts
+
+    @classmethod
+    def get_version(cls, user_id, year):
+        """获取日历版本号，不存在时返回0"""
+        version = db.session.query(cls.version).filter_by(user_id=user_id, year=year).scalar()
+        return version or 0
+
+    @classmethod
+    def apply_changes(cls, changes):
+        """
+        根据统计行的变化增量更新日历（在当前事务内执行，不提交）
+        changes为 (user_id, chanting_id, 日期, 原次数, 新次数)，当天次数加上 新次数 - 原次数
+
+        先以不改动内容的upsert锁住（不存在则创建空日历）这些日历行，再读取、修改并写回，
+        并发更新同一日历时依次执行，不会丢失彼此的变化
+        """
+        deltas = {}  # (user_id, year) -> {当年第几天: 次数变化}
+        for user_id, _, stat_date, old_count, new_count in changes:
+            delta = (new_count or 0) - (old_count or 0)
+            if not user_id or not delta:
+                continue
+            day_deltas = deltas.setdefault((int(user_id), stat_date.year), {})
+            day_index = stat_date.timetuple().tm_yday - 1
+            day_deltas[day_index] = day_deltas.get(day_index, 0) + delta
+        if not deltas:
+            return
+
+        keys = sorted(deltas)
+        empty = array(cls.TYPECODE, [0] * cls.DAYS).tobytes()
+        table = cls.__table__
+        db.session.execute(upsert_statement(table, [{
+            'user_id': user_id, 'year': year, 'counts': empty, 'total_count': 0, 'active_days': 0,
+            'version': 0, 'updated_at': datetime.utcnow()
+        } for user_id, year in keys], ['user_id', 'year'], lambda new: {'version': table.c.version}))
+
+        rows = db.session.query(cls.user_id, cls.year, cls.counts).filter(
+            db.tuple_(cls.user_id, cls.year).in_(keys)
+        ).with_for_update().all()
+
+        heatmaps = []
+        for user_id, year, data in rows:
+            counts = cls.unpack(data)
+            for day_index, delta in deltas[(user_id, year)].items():
+                counts[day_index] = min(max(counts[day_index] + delta, 0), 0xFFFFFFFF)
+            heatmaps.append({
+                'user_id': user_id,
+                'year': year,
+                'counts': counts.tobytes(),
+                'total_count': sum(counts),
+                'active_days': sum(1 for count in counts if count > 0)
+            })
+        db.session.execute(cls.build_upsert(heatmaps))
+
+        from utils.heatmap_cache import HeatmapCache
+        HeatmapCache.invalidate(keys)
+
+    @classmethod
+    def refresh(cls, keys):
+        """
+        重新计算指定 (user_id, year) 的日历（在当前事务内执行，不提交），用于全量同步后和修复
+        每个年份一次分组查询读取这些用户当年的每日总次数
+        """
+        from models.daily_stats import DailyStats
+        keys = {(int(user_id), int(year)) for user_id, year in keys if user_id and year}
+        if not keys:
+            return
+
+        years = {}
+        for user_id, year in keys:
+            years.setdefault(year, set()).add(user_id)
+
+        for year, user_ids in years.items():
+            day_counts = {user_id: {} for user_id in user_ids}
+            rows = db.session.query(
+                DailyStats.user_id, DailyStats.date, db.func.sum(DailyStats.count)
+            ).filter(
+                DailyStats.user_id.in_(user_ids),
+                DailyStats.date >= date(year, 1, 1),
+                DailyStats.date <= date(year, 12, 31)
+            ).group_by(DailyStats.user_id, DailyStats.date).all()
+            for user_id, stat_date, count in rows:
+                day_counts[user_id][stat_date] = int(count or 0)
+
+            heatmaps = []
+            for user_id, counts in day_counts.items():
+                active = [count for count in counts.values() if count > 0]
+                heatmaps.append({
+                    'user_id': user_id,
+                    'year': year,
+                    'counts': cls.pack(counts, year),
+                    'total_count': sum(active),
+                    'active_days': len(active)
+                })
+            db.session.execute(cls.build_upsert(heatmaps))
+
+        from utils.heatmap_cache import HeatmapCache
+        HeatmapCache.invalidate(keys)
+
+    @classmethod
+    def refresh_user(cls, user_id):
+        """刷新用户已有的全部日历（全量同步清理每日统计后调用，版本号继续递增）"""
+        years = [row[0] for row in db.session.query(cls.year).filter_by(user_id=user_id)]
+        cls.refresh((user_id, year) for year in years)
+
+    @classmethod
+    def rebuild(cls, user_id=None):
+        """
+        根据daily_stats全量重建日历，返回重建的日历数量
+        已有但不再有数据的日历刷新为全0而不删除，保证版本号只增不减
+        """
+        from models.daily_stats import DailyStats
+        query = db.session.query(
+            DailyStats.user_id, DailyStats.date
+        ).filter(DailyStats.user_id.isnot(None), DailyStats.count > 0)
+        existing = db.session.query(cls.user_id, cls.year)
+        if user_id:
+            query = query.filter(DailyStats.user_id == user_id)
+            existing = existing.filter(cls.user_id == user_id)
+
+        keys = {(row_user_id, stat_date.year) for row_user_id, stat_date in query.distinct()}
+        keys.update((row_user_id, year) for row_user_id, year in existing)
+        cls.refresh(keys)
+        return len(keys)
+
+    @classmethod
+    def build_upsert(cls, rows):
+        """构造批量upsert语句，按 (user_id, year) 唯一约束覆盖日历并递增版本号"""
+        table = cls.__table__
+        now = datetime.utcnow()
+        values = [{**row, 'version': 1, 'updated_at': now} for row in rows]
+        columns = ['counts', 'total_count', 'active_days', 'updated_at']
+        return upsert_statement(table, values, ['user_id', 'year'], lambda new: {
+            **{column: new[column] for column in columns}, 'version': table.c.version + 1
+        })
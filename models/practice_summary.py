@@ -0,0 +1,275 @@
+from datetime import datetime, date, timedelta
+from database import db
+from utils.upsert import upsert_statement
+
+class PracticeSummary(db.Model):
+    """修行汇总模型 - 按 (用户, 佛号经文) 维护的每日统计汇总
+
+    由DailyStats写入时根据变化的统计行增量更新，页面直接读取，不再每次对daily_stats求和、计数和计算连续天数；
+    全量重算只在 rebuild 和 tools/rebuild_practice_summaries.py 中进行
+    """
+    __tablename__ = 'practice_summaries'
+
+    REFRESH_CHUNK_SIZE = 500  # 每次刷新查询的 (用户, 佛号经文) 数量
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, nullable=False)
+    chanting_id = db.Column(db.Integer, nullable=False)
+    total_count = db.Column(db.Integer, default=0, nullable=False)  # 累计念诵次数
+    practice_days = db.Column(db.Integer, default=0, nullable=False)  # 修行天数（次数大于0的天数）
+    first_practice_date = db.Column(db.Date, nullable=True)  # 首次修行日期
+    last_practice_date = db.Column(db.Date, nullable=True)  # 最近修行日期
+    current_streak = db.Column(db.Integer, default=0, nullable=False)  # 截至最近修行日期的连续天数
+    max_streak = db.Column(db.Integer, default=0, nullable=False)  # 最长连续天数
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'chanting_id', name='unique_practice_summary'),
+        db.Index('idx_practice_summaries_chanting', 'chanting_id'),
+    )
+
+    def to_dict(self, today=None):
+        """转换为字典格式"""
+        return {
+            'user_id': self.user_id,
+            'chanting_id': self.chanting_id,
+            'total_count': self.total_count,
+            'practice_days': self.practice_days,
+            'first_practice_date': self.first_practice_date.isoformat() if self.first_practice_date else None,
+            'last_practice_date': self.last_practice_date.isoformat() if self.last_practice_date else None,
+            'current_streak': self.get_current_streak(today),
+            'max_streak': self.max_streak,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
+
+    def get_current_streak(self, today=None):
+        """当前连续修行天数（今天没有修行时为0）"""
+        if self.last_practice_date != (today or date.today()):
+            return 0
+        return self.current_streak
+
+    @classmethod
+    def get_summary(cls, user_id, chanting_id):
+        """获取某用户某佛号经文的汇总"""
+        return cls.query.filter_by(user_id=user_id, chanting_id=chanting_id).first()
+
+    @classmethod
+    def get_map(cls, pairs, for_update=False):
+        """
+        批量获取汇总，返回 {(user_id, chanting_id): 汇总}
+        for_update为True时以锁定读读取最新提交的值，直到事务提交其他更新同一汇总的事务都要等待
+        """
+        pairs = {(user_id, chanting_id) for user_id, chanting_id in pairs if user_id and chanting_id}
+        if not pairs:
+            return {}
+        query = cls.query.filter(
+            db.tuple_(cls.user_id, cls.chanting_id).in_(list(pairs))
+        )
+        if for_update:
+            query = query.populate_existing().with_for_update()
+        return {(summary.user_id, summary.chanting_id): summary for summary in query}
+
+    @classmethod
+    def lock_map(cls, pairs):
+        """
+        锁住这些汇总（不存在则创建空汇总）后读取，返回 {(user_id, chanting_id): 汇总}
+        以不改变字段的upsert取得行锁，没有汇总的组合也能锁住，并发更新同一组合时依次执行
+        """
+        table = cls.__table__
+        now = datetime.utcnow()
+        db.session.execute(upsert_statement(
+            table,
+            [{'user_id': user_id, 'chanting_id': chanting_id, 'total_count': 0, 'practice_days': 0,
+              'current_streak': 0, 'max_streak': 0, 'updated_at': now}
+             for user_id, chanting_id in pairs],
+            ['user_id', 'chanting_id'],
+            lambda new: {'total_count': table.c.total_count}
+        ))
+        return cls.get_map(pairs, for_update=True)
+
+    @staticmethod
+    def summarize(days):
+        """
+        由按日期升序的 (日期, 次数) 序列计算汇总字段
+        没有修行记录时返回None
+        """
+        from utils.stats_engine import DailySeries, scan_series
+        stats = scan_series(DailySeries.from_rows(days))
+        if not stats['total_days']:
+            return None
+        return {
+            'total_count': stats['total_count'],
+            'practice_days': stats['total_days'],
+            'first_practice_date': stats['first_practice_date'],
+            'last_practice_date': stats['last_practice_date'],
+            'current_streak': stats['last_streak'],
+            'max_streak': stats['max_consecutive']
+        }
+
+    @classmethod
+    def apply_changes(cls, changes):
+        """
+        根据统计行的变化增量更新汇总（在当前事务内执行，不提交）
+        changes为 (user_id, chanting_id, 日期, 原次数, 新次数)，同一组合按发生顺序排列
+
+        新增最近修行日、修改已有修行日的次数时由汇总本身推出新值；
+        没有汇总的组合由本次的变化计算；补录更早的修行日或删除修行日时
+        连续天数无法由单行推出，只对这些组合读取其修行日重新计算；
+        汇总先锁住再读取，并发更新同一组合时不会基于过期的汇总计算
+        """
+        pair_changes = {}
+        for user_id, chanting_id, stat_date, old_count, new_count in changes:
+            if user_id and chanting_id and old_count != new_count:
+                pair_changes.setdefault((user_id, chanting_id), []).append((stat_date, old_count or 0, new_count or 0))
+
+        pairs = sorted(pair_changes)
+        recompute = []
+        for start in range(0, len(pairs), cls.REFRESH_CHUNK_SIZE):
+            chunk = pairs[start:start + cls.REFRESH_CHUNK_SIZE]
+            summaries = cls.lock_map(chunk)
+            updated = []
+            for pair in chunk:
+                summary = cls._apply_pair(summaries.get(pair), sorted(pair_changes[pair], key=lambda change: change[0]))
+                if summary is None:
+                    recompute.append(pair)
+                elif summary:
+                    updated.append({'user_id': pair[0], 'chanting_id': pair[1], **summary})
+            if updated:
+                db.session.execute(cls.build_upsert(updated))
+        cls.refresh(recompute)
+
+    @classmethod
+    def _apply_pair(cls, summary, changes):
+        """由原汇总和按日期排序的变化计算新汇总，无需变化时返回空字典，需要重新计算时返回None"""
+        if summary is None or not summary.practice_days:
+            # 没有汇总（或刚锁定时创建的空汇总）即此前没有修行日，本次的变化就是全部修行日
+            if any(old_count > 0 for _, old_count, _ in changes):
+                return None
+            # 没有修行日时返回None，重新计算时删除空汇总
+            return cls.summarize([(stat_date, new_count) for stat_date, _, new_count in changes if new_count > 0])
+
+        state = {
+            'total_count': summary.total_count,
+            'practice_days': summary.practice_days,
+            'first_practice_date': summary.first_practice_date,
+            'last_practice_date': summary.last_practice_date,
+            'current_streak': summary.current_streak,
+            'max_streak': summary.max_streak
+        }
+        for stat_date, old_count, new_count in changes:
+            if old_count > 0 and new_count > 0:
+                state['total_count'] += new_count - old_count
+            elif new_count > 0:
+                last = state['last_practice_date']
+                if last is not None and stat_date <= last:
+                    return None
+                state['current_streak'] = state['current_streak'] + 1 if last == stat_date - timedelta(days=1) else 1
+                state['max_streak'] = max(state['max_streak'], state['current_streak'])
+                state['last_practice_date'] = stat_date
+                state['first_practice_date'] = state['first_practice_date'] or stat_date
+                state['practice_days'] += 1
+                state['total_count'] += new_count
+            elif old_count > 0:
+                return None
+        return state
+
+    @classmethod
+    def refresh(cls, pairs):
+        """
+        重新计算指定 (user_id, chanting_id) 的汇总（在当前事务内执行，不提交）
+        每批一次查询读取这些组合的全部修行日，一条upsert写回，没有修行记录的组合删除汇总
+        """
+        pairs = sorted({(user_id, chanting_id) for user_id, chanting_id in pairs if user_id and chanting_id})
+        for start in range(0, len(pairs), cls.REFRESH_CHUNK_SIZE):
+            cls._refresh_chunk(pairs[start:start + cls.REFRESH_CHUNK_SIZE])
+
+    @classmethod
+    def _refresh_chunk(cls, pairs):
+        from models.daily_stats import DailyStats
+
+        rows = db.session.query(
+            DailyStats.user_id, DailyStats.chanting_id, DailyStats.date, DailyStats.count
+        ).filter(
+            db.tuple_(DailyStats.user_id, DailyStats.chanting_id).in_(pairs),
+            DailyStats.count > 0
+        ).order_by(DailyStats.user_id, DailyStats.chanting_id, DailyStats.date).all()
+
+        days_map = {}
+        for user_id, chanting_id, stat_date, count in rows:
+            days_map.setdefault((user_id, chanting_id), []).append((stat_date, count))
+
+        summaries = []
+        for user_id, chanting_id in pairs:
+            summary = cls.summarize(days_map.get((user_id, chanting_id), []))
+            if summary:
+                summaries.append({'user_id': user_id, 'chanting_id': chanting_id, **summary})
+
+        empty_pairs = [pair for pair in pairs if pair not in days_map]
+        if empty_pairs:
+            db.session.execute(cls.__table__.delete().where(
+                db.tuple_(cls.__table__.c.user_id, cls.__table__.c.chanting_id).in_(empty_pairs)
+            ))
+        if summaries:
+            db.session.execute(cls.build_upsert(summaries))
+
+    @classmethod
+    def delete_for_user(cls, user_id):
+        """删除用户的全部汇总（全量同步清理每日统计时调用）"""
+        db.session.execute(cls.__table__.delete().where(cls.__table__.c.user_id == user_id))
+
+    @classmethod
+    def rebuild(cls, user_id=None, batch_size=None):
+        """
+        根据daily_stats全量重建汇总，用于修复漂移
+        按 (用户, 佛号经文, 日期) 顺序流式读取，逐个组合计算后批量写入，返回重建的汇总数量
+        """
+        from models.daily_stats import DailyStats
+        batch_size = batch_size or cls.REFRESH_CHUNK_SIZE
+
+        delete_stmt = cls.__table__.delete()
+        query = db.session.query(
+            DailyStats.user_id, DailyStats.chanting_id, DailyStats.date, DailyStats.count
+        ).filter(
+            DailyStats.user_id.isnot(None),
+            DailyStats.count > 0
+        )
+        if user_id:
+            delete_stmt = delete_stmt.where(cls.__table__.c.user_id == user_id)
+            query = query.filter(DailyStats.user_id == user_id)
+        # 先读取全部数据（PyMySQL流式游标期间不能执行其他语句），再删除旧汇总并写入
+        rows = query.order_by(DailyStats.user_id, DailyStats.chanting_id, DailyStats.date).all()
+        db.session.execute(delete_stmt)
+
+        pending = []
+        rebuilt = 0
+        current_pair = None
+        days = []
+        for row_user_id, chanting_id, stat_date, count in rows + [(None, None, None, None)]:
+            if (row_user_id, chanting_id) != current_pair:
+                if current_pair is not None:
+                    summary = cls.summarize(days)
+                    if summary:
+                        pending.append({'user_id': current_pair[0], 'chanting_id': current_pair[1], **summary})
+                if len(pending) >= batch_size:
+                    db.session.execute(cls.build_upsert(pending))
+                    rebuilt += len(pending)
+                    pending = []
+                current_pair = (row_user_id, chanting_id)
+                days = []
+            days.append((stat_date, count))
+
+        if pending:
+            db.session.execute(cls.build_upsert(pending))
+            rebuilt += len(pending)
+        return rebuilt
+
+    @classmethod
+    def build_upsert(cls, rows):
+        """构造批量upsert语句，按 (user_id, chanting_id) 唯一约束覆盖汇总字段"""
+        table = cls.__table__
+        now = datetime.utcnow()
+        values = [{**row, 'updated_at': now} for row in rows]
+        columns = ['total_count', 'practice_days', 'first_practice_date', 'last_practice_date',
+                   'current_streak', 'max_streak', 'updated_at']
+        return upsert_statement(table, values, ['user_id', 'chanting_id'],
+                                lambda new: {column: new[column] for column in columns})
@@ -36,37 +36,36 @@ class ReadingProgress(db.Model):
             'updated_at': self.updated_at.isoformat() if self.updated_at else None
         }
     
-    def to_dict_with_details(self):
-        """包含经文和章节详情的字典格式"""
+    def to_dict_with_details(self, loader=None):
+        """包含经文和章节详情的字典格式，批量序列化时传入预加载的loader"""
         from models.chanting import Chanting
         from models.chapter import Chapter
         from models.user import User
+        from utils.relation_loader import RelationLoader
         
+        loader = loader or RelationLoader()
         data = self.to_dict()
         
         # 添加经文信息
-        if self.chanting_id:
-            chanting = Chanting.query.get(self.chanting_id)
-            if chanting:
-                data['chanting'] = chanting.to_dict()
+        chanting = loader.get(Chanting, self.chanting_id)
+        if chanting:
+            data['chanting'] = chanting.to_dict()
         
         # 添加章节信息
-        if self.chapter_id:
-            chapter = Chapter.query.get(self.chapter_id)
-            if chapter:
-                data['chapter'] = chapter.to_dict()
+        chapter = loader.get(Chapter, self.chapter_id)
+        if chapter:
+            data['chapter'] = chapter.to_dict()
         
         # 添加用户信息
-        if self.user_id:
-            user = User.query.get(self.user_id)
-            if user:
-                data['user'] = {
-                    'id': user.id,
-                    'username': user.username,
-                    'nickname': user.nickname,
-                    'avatar': user.avatar,
-                    'avatar_type': user.avatar_type
-                }
+        user = loader.get(User, self.user_id)
+        if user:
+            data['user'] = {
+                'id': user.id,
+                'username': user.username,
+                'nickname': user.nickname,
+                'avatar': user.avatar,
+                'avatar_type': user.avatar_type
+            }
         
         return data
     
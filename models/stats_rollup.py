@@ -0,0 +1,144 @@
+from datetime import datetime, timedelta
+from database import db
+from utils.upsert import upsert_statement
+
+class StatsRollup(db.Model):
+    """时间汇总模型 - 全部用户念诵次数按日、周、月、年汇总
+
+    每日统计写入时按次数变化累加到日、周、月、年汇总，rebuild由daily_stats全量重建，
+    长时间范围的图表读取粗粒度汇总，一年按周只需约52行
+    """
+    __tablename__ = 'stats_rollups'
+
+    GRANULARITIES = ('day', 'week', 'month', 'year')
+    COARSE_GRANULARITIES = ('week', 'month', 'year')
+
+    id = db.Column(db.Integer, primary_key=True)
+    granularity = db.Column(db.String(10), nullable=False)  # day/week/month/year
+    period_start = db.Column(db.Date, nullable=False)  # 周期开始日期（周从周一开始）
+    total_count = db.Column(db.BigInteger, default=0, nullable=False)  # 周期内念诵总次数
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (
+        db.UniqueConstraint('granularity', 'period_start', name='unique_stats_rollup'),
+    )
+
+    def to_dict(self):
+        """转换为字典格式"""
+        return {
+            'granularity': self.granularity,
+            'period_start': self.period_start.isoformat() if self.period_start else None,
+            'total_count': self.total_count,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
+
+    @staticmethod
+    def get_period_start(granularity, day):
+        """日期所在周期的开始日期"""
+        if granularity == 'week':
+            return day - timedelta(days=day.weekday())
+        if granularity == 'month':
+            return day.replace(day=1)
+        if granularity == 'year':
+            return day.replace(month=1, day=1)
+        return day
+
+    @staticmethod
+    def get_next_period(granularity, period_start):
+        """下一个周期的开始日期"""
+        if granularity == 'week':
+            return period_start + timedelta(days=7)
+        if granularity == 'month':
+            if period_start.month == 12:
+                return period_start.replace(year=period_start.year + 1, month=1)
+            return period_start.replace(month=period_start.month + 1)
+        if granularity == 'year':
+            return period_start.replace(year=period_start.year + 1)
+        return period_start + timedelta(days=1)
+
+    @classmethod
+    def apply_deltas(cls, deltas):
+        """
+        按日期的次数变化累加到所在日、周、月、年的汇总（在当前事务内执行，不提交）
+        deltas为 {日期: 次数变化}，一条upsert以 total_count = total_count + 变化 写入，
+        不读取daily_stats，也不覆盖并发写入的结果；汇总漂移时用rebuild修复
+        """
+        totals = {}
+        for day, delta in deltas.items():
+            if not day or not delta:
+                continue
+            for granularity in cls.GRANULARITIES:
+                key = (granularity, cls.get_period_start(granularity, day))
+                totals[key] = totals.get(key, 0) + delta
+
+        # 按唯一键顺序写入，并发事务以相同顺序加锁
+        rows = [{'granularity': granularity, 'period_start': period, 'total_count': delta}
+                for (granularity, period), delta in sorted(totals.items()) if delta]
+        if rows:
+            db.session.execute(cls.build_upsert(rows, increment=True))
+
+    @classmethod
+    def rebuild(cls):
+        """根据daily_stats全量重建时间汇总，返回写入的汇总行数"""
+        from models.daily_stats import DailyStats
+        day_totals = db.session.query(
+            DailyStats.date, db.func.sum(DailyStats.count)
+        ).group_by(DailyStats.date).all()
+        db.session.execute(cls.__table__.delete())
+
+        rollups = {granularity: {} for granularity in cls.GRANULARITIES}
+        for day, total in day_totals:
+            for granularity in cls.GRANULARITIES:
+                period = cls.get_period_start(granularity, day)
+                rollups[granularity][period] = rollups[granularity].get(period, 0) + int(total or 0)
+
+        rebuilt = 0
+        for granularity, totals in rollups.items():
+            rebuilt += cls._write(granularity, totals)
+        return rebuilt
+
+    @classmethod
+    def get_series(cls, granularity, start_date, end_date):
+        """读取时间范围内的汇总，返回 [(周期开始日期, 次数)]，没有数据的周期为0"""
+        first_period = cls.get_period_start(granularity, start_date)
+        rows = dict(db.session.query(cls.period_start, cls.total_count).filter(
+            cls.granularity == granularity,
+            cls.period_start >= first_period,
+            cls.period_start <= end_date
+        ).all())
+
+        series = []
+        period = first_period
+        while period <= end_date:
+            series.append((period, int(rows.get(period) or 0)))
+            period = cls.get_next_period(granularity, period)
+        return series
+
+    @classmethod
+    def _write(cls, granularity, totals):
+        """写入一组周期汇总，次数为0的周期删除，返回写入行数"""
+        empty = [period for period, total in totals.items() if not total]
+        rows = [{'granularity': granularity, 'period_start': period, 'total_count': total}
+                for period, total in totals.items() if total]
+        if empty:
+            db.session.execute(cls.__table__.delete().where(
+                cls.__table__.c.granularity == granularity,
+                cls.__table__.c.period_start.in_(empty)
+            ))
+        for start in range(0, len(rows), 500):
+            db.session.execute(cls.build_upsert(rows[start:start + 500]))
+        return len(rows)
+
+    @classmethod
+    def build_upsert(cls, rows, increment=False):
+        """
+        构造批量upsert语句，按 (granularity, period_start) 唯一约束合并
+        increment为True时冲突行执行 total_count = total_count + n，否则直接设置为 n
+        """
+        table = cls.__table__
+        now = datetime.utcnow()
+        values = [{**row, 'updated_at': now} for row in rows]
+        return upsert_statement(table, values, ['granularity', 'period_start'], lambda new: {
+            'total_count': table.c.total_count + new.total_count if increment else new.total_count,
+            'updated_at': new.updated_at
+        })
@@ -91,6 +91,31 @@ class SyncConfig(db.Model):
                 'value': 100,
                 'description': '批量同步的数据条数限制'
             },
+            {
+                'key': 'sync_async_workers',
+                'value': 2,
+                'description': '异步上传任务的后台工作线程数'
+            },
+            {
+                'key': 'sync_job_timeout',
+                'value': 1800,
+                'description': '异步上传任务处理超时（秒），超时仍未完成的任务视为中断，重新排队或标记失败'
+            },
+            {
+                'key': 'sync_job_max_attempts',
+                'value': 3,
+                'description': '异步上传任务的最大执行次数，中断后重新排队不超过此次数'
+            },
+            {
+                'key': 'sync_tombstone_retention_days',
+                'value': 90,
+                'description': '同步删除标记的保留天数，游标早于保留期的增量下载需要改为全量下载'
+            },
+            {
+                'key': 'catalog_version',
+                'value': 1,
+                'description': '内置佛号经文和回向模板的目录版本号，内容变更时自动递增'
+            },
             {
                 'key': 'sync_rate_limit',
                 'value': {
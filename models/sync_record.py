@@ -1,4 +1,6 @@
+import json
 from datetime import datetime
+from sqlalchemy.dialects.mysql import LONGTEXT
 from database import db
 
 class SyncRecord(db.Model):
@@ -10,13 +12,25 @@ class SyncRecord(db.Model):
     device_id = db.Column(db.String(100), nullable=False)  # 设备标识
     sync_type = db.Column(db.Enum('full', 'incremental'), nullable=False, default='incremental')  # 同步类型：全量/增量
     sync_direction = db.Column(db.Enum('upload', 'download', 'bidirectional'), nullable=False)  # 同步方向
-    sync_status = db.Column(db.Enum('success', 'failed', 'partial'), nullable=False, default='success')  # 同步状态
+    sync_status = db.Column(db.Enum('success', 'failed', 'partial', 'pending'), nullable=False, default='success')  # 同步状态，pending为异步任务尚未完成
     sync_data_types = db.Column(db.Text)  # JSON格式，记录同步的数据类型
     error_message = db.Column(db.Text, nullable=True)  # 错误信息
     sync_started_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)  # 同步开始时间
     sync_completed_at = db.Column(db.DateTime, nullable=True)  # 同步完成时间
+    result_details = db.Column(db.Text, nullable=True)  # JSON格式，各数据类型的同步计数
+    # 异步上传任务字段，同步请求时为空
+    job_status = db.Column(db.String(20), nullable=True)  # queued/running/completed/failed
+    job_progress = db.Column(db.Integer, nullable=True)  # 处理进度 0-100
+    job_attempts = db.Column(db.Integer, nullable=True)  # 已领取执行的次数
+    job_payload = db.Column(db.Text().with_variant(LONGTEXT, 'mysql'), nullable=True)  # 待处理的上传数据，处理结束后清空
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
+    # 同步记录列表按 (开始时间, id) 游标分页
+    __table_args__ = (
+        db.Index('idx_sync_records_started', 'sync_started_at', 'id'),
+        db.Index('idx_sync_records_user_started', 'user_id', 'sync_started_at', 'id'),
+    )
+    
     # 关联用户
     user = db.relationship('User', backref=db.backref('sync_records', lazy=True))
     
@@ -33,9 +47,26 @@ class SyncRecord(db.Model):
             'error_message': self.error_message,
             'sync_started_at': self.sync_started_at.isoformat() if self.sync_started_at else None,
             'sync_completed_at': self.sync_completed_at.isoformat() if self.sync_completed_at else None,
+            'result_details': self.get_result_details(),
+            'job_status': self.job_status,
+            'job_progress': self.job_progress,
+            'job_attempts': self.job_attempts,
             'created_at': self.created_at.isoformat() if self.created_at else None
         }
     
+    def get_result_details(self):
+        """获取同步结果计数"""
+        if not self.result_details:
+            return None
+        try:
+            return json.loads(self.result_details)
+        except (TypeError, ValueError):
+            return None
+    
+    def is_job_pending(self):
+        """异步任务是否仍在排队或处理中"""
+        return self.job_status in ('queued', 'running')
+    
     def is_first_sync(self):
         """判断是否为首次同步"""
         previous_sync = SyncRecord.query.filter(
@@ -0,0 +1,185 @@
+import hashlib
+import json
+from collections import defaultdict
+from datetime import datetime, timedelta
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from database import db
+from utils.upsert import upsert_statement
+
+class SyncTombstone(db.Model):
+    """同步删除标记 - 服务端删除的用户数据在增量下载时通知其他设备
+
+    payload为app端识别数据所用的字段（有uuid时只用uuid），
+    client_key为payload的摘要，同一数据重复删除只保留最近一次的删除时间
+    """
+    __tablename__ = 'sync_tombstones'
+
+    DEFAULT_RETENTION_DAYS = 90
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, nullable=False)
+    data_type = db.Column(db.String(30), nullable=False)
+    client_key = db.Column(db.String(64), nullable=False)
+    payload = db.Column(db.Text, nullable=False)  # JSON格式
+    deleted_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'data_type', 'client_key', name='unique_sync_tombstone'),
+        db.Index('idx_sync_tombstones_user_deleted', 'user_id', 'deleted_at'),
+    )
+
+    def to_dict(self):
+        """下载输出格式：数据类型、识别字段和删除时间"""
+        return {
+            'data_type': self.data_type,
+            **json.loads(self.payload),
+            'deleted_at': self.deleted_at.isoformat() if self.deleted_at else None
+        }
+
+    @staticmethod
+    def chanting_payload(title, content):
+        return {'title': title, 'content': content}
+
+    @staticmethod
+    def dedication_payload(client_uuid, title, content):
+        if client_uuid:
+            return {'uuid': client_uuid}
+        return {'title': title, 'content': content}
+
+    @staticmethod
+    def chanting_record_payload(client_uuid, chanting_title, chanting_content, created_at):
+        if client_uuid:
+            return {'uuid': client_uuid}
+        return {
+            'chanting_title': chanting_title,
+            'chanting_content': chanting_content,
+            'created_at': created_at.isoformat() if created_at else None
+        }
+
+    @staticmethod
+    def daily_stats_payload(chanting_title, chanting_content, stat_date):
+        return {
+            'chanting_title': chanting_title,
+            'chanting_content': chanting_content,
+            'date': stat_date.isoformat() if stat_date else None
+        }
+
+    @staticmethod
+    def compute_client_key(payload):
+        raw = json.dumps(payload, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    @classmethod
+    def build_upsert(cls, user_id, data_type, payloads, deleted_at):
+        """构造批量upsert语句，按 (user_id, data_type, client_key) 唯一约束更新删除时间"""
+        table = cls.__table__
+        values = {}
+        for payload in payloads:
+            client_key = cls.compute_client_key(payload)
+            values[client_key] = {
+                'user_id': user_id,
+                'data_type': data_type,
+                'client_key': client_key,
+                'payload': json.dumps(payload, ensure_ascii=False),
+                'deleted_at': deleted_at
+            }
+        values = list(values.values())
+        return upsert_statement(table, values, ['user_id', 'data_type', 'client_key'],
+                                lambda new: {'deleted_at': new.deleted_at})
+
+    @classmethod
+    def record(cls, user_id, data_type, payloads, connection=None):
+        """
+        记录删除（在当前事务内执行，不提交），同时清理该用户超过保留期的标记
+        connection用于在flush事件中写入，默认使用当前会话
+        """
+        payloads = list(payloads)
+        if user_id is None or not payloads:
+            return
+        executor = connection if connection is not None else db.session
+        now = datetime.utcnow()
+        executor.execute(cls.build_upsert(user_id, data_type, payloads, now))
+        executor.execute(cls.__table__.delete().where(
+            cls.__table__.c.user_id == user_id,
+            cls.__table__.c.deleted_at < now - timedelta(days=cls.get_retention_days())
+        ))
+
+    @classmethod
+    def get_since(cls, user_id, since):
+        """since之后的删除标记，按删除时间排序"""
+        return cls.query.filter(
+            cls.user_id == user_id,
+            cls.deleted_at > since
+        ).order_by(cls.deleted_at, cls.id).all()
+
+    @classmethod
+    def is_expired(cls, since):
+        """since早于保留期时，期间的删除标记可能已被清理，客户端需要全量下载"""
+        return since < datetime.utcnow() - timedelta(days=cls.get_retention_days())
+
+    @staticmethod
+    def get_retention_days():
+        from models.sync_config import SyncConfig
+        try:
+            return max(int(SyncConfig.get_config(
+                'sync_tombstone_retention_days', SyncTombstone.DEFAULT_RETENTION_DAYS
+            )), 1)
+        except (TypeError, ValueError):
+            return SyncTombstone.DEFAULT_RETENTION_DAYS
+
+def _is_soft_deleted(obj):
+    """本次flush中is_deleted由假变为真"""
+    return True in db.inspect(obj).attrs.is_deleted.history.added
+
+@event.listens_for(Session, 'after_flush')
+def _record_tombstones(session, flush_context):
+    """会话中删除（含佛号经文逻辑删除）的用户数据，在同一事务内写入删除标记"""
+    from models.chanting import Chanting
+    from models.dedication import Dedication
+    from models.chanting_record import ChantingRecord
+    from models.daily_stats import DailyStats
+
+    chantings = [obj for obj in session.deleted if isinstance(obj, Chanting)]
+    chantings += [obj for obj in session.dirty if isinstance(obj, Chanting) and _is_soft_deleted(obj)]
+    others = [obj for obj in session.deleted if isinstance(obj, (Dedication, ChantingRecord, DailyStats))]
+    if not chantings and not others:
+        return
+
+    payloads = defaultdict(list)  # (用户ID, 数据类型) -> 识别字段列表
+    for chanting in chantings:
+        if chanting.user_id and not chanting.is_built_in:
+            payloads[(chanting.user_id, 'chantings')].append(
+                SyncTombstone.chanting_payload(chanting.title, chanting.content)
+            )
+
+    connection = session.connection()
+    chanting_ids = {obj.chanting_id for obj in others if not isinstance(obj, Dedication)}
+    chanting_texts = {chanting.id: (chanting.title, chanting.content) for chanting in chantings}
+    missing_ids = chanting_ids - set(chanting_texts)
+    if missing_ids:
+        table = Chanting.__table__
+        chanting_texts.update(
+            (row.id, (row.title, row.content)) for row in connection.execute(
+                db.select(table.c.id, table.c.title, table.c.content).where(table.c.id.in_(missing_ids))
+            )
+        )
+
+    for obj in others:
+        if isinstance(obj, Dedication):
+            payloads[(obj.user_id, 'dedications')].append(
+                SyncTombstone.dedication_payload(obj.client_uuid, obj.title, obj.content)
+            )
+            continue
+        title, content = chanting_texts.get(obj.chanting_id, (None, None))
+        if isinstance(obj, ChantingRecord):
+            payloads[(obj.user_id, 'chanting_records')].append(
+                SyncTombstone.chanting_record_payload(obj.client_uuid, title, content, obj.created_at)
+            )
+        else:
+            payloads[(obj.user_id, 'daily_stats')].append(
+                SyncTombstone.daily_stats_payload(title, content, obj.date)
+            )
+
+    for (user_id, data_type), items in payloads.items():
+        SyncTombstone.record(user_id, data_type, items, connection)
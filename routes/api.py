@@ -10,6 +10,12 @@ from models.daily_stats import DailyStats
 from models.dedication_template import DedicationTemplate
 from models.chapter import Chapter
 from models.reading_progress import ReadingProgress
+from utils.etag_utils import compute_etag, etag_response
+from utils.counter_buffer import DailyStatsBuffer
+from utils.relation_loader import serialize_chanting_records, serialize_daily_stats, serialize_reading_progress
+from utils.keyset_pagination import keyset_paginate
+from utils.stats_engine import summarize_practice
+from utils.heatmap_cache import HeatmapCache
 
 api_bp = Blueprint('api', __name__)
 
@@ -116,17 +122,25 @@ def get_chantings():
     if chanting_type:
         query = query.filter_by(type=chanting_type)
     
-    chantings = query.order_by(Chanting.created_at.desc()).paginate(
-        page=page, per_page=per_page, error_out=False
-    )
+    # 数据版本：行数 + 最大更新时间，一次聚合查询
+    total, last_updated = query.with_entities(
+        db.func.count(Chanting.id), db.func.max(Chanting.updated_at)
+    ).one()
+    etag = compute_etag('chantings', chanting_type, page, per_page, total, last_updated)
     
-    return jsonify({
-        'chantings': [c.to_dict() for c in chantings.items],
-        'total': chantings.total,
-        'page': page,
-        'per_page': per_page,
-        'pages': chantings.pages
-    })
+    def build_body():
+        chantings = query.order_by(Chanting.created_at.desc()).paginate(
+            page=page, per_page=per_page, error_out=False
+        )
+        return {
+            'chantings': [c.to_dict() for c in chantings.items],
+            'total': chantings.total,
+            'page': page,
+            'per_page': per_page,
+            'pages': chantings.pages
+        }
+    
+    return etag_response(etag, build_body)
 
 @api_bp.route('/chantings/<int:chanting_id>', methods=['GET'])
 @jwt_required()
@@ -296,12 +310,19 @@ def delete_dedication(dedication_id):
 @api_bp.route('/dedication-templates', methods=['GET'])
 def get_dedication_templates():
     """获取回向文模板列表"""
-    templates = DedicationTemplate.query.order_by(
-        DedicationTemplate.is_built_in.desc(),
-        DedicationTemplate.created_at.desc()
-    ).all()
+    total, last_updated = db.session.query(
+        db.func.count(DedicationTemplate.id), db.func.max(DedicationTemplate.updated_at)
+    ).one()
+    etag = compute_etag('dedication-templates', total, last_updated)
+    
+    def build_body():
+        templates = DedicationTemplate.query.order_by(
+            DedicationTemplate.is_built_in.desc(),
+            DedicationTemplate.created_at.desc()
+        ).all()
+        return [t.to_dict() for t in templates]
     
-    return jsonify([t.to_dict() for t in templates])
+    return etag_response(etag, build_body)
 
 @api_bp.route('/dedication-templates', methods=['POST'])
 def create_dedication_template():
@@ -360,7 +381,7 @@ def delete_dedication_template(template_id):
 @api_bp.route('/chanting-records', methods=['GET'])
 @jwt_required()
 def get_chanting_records():
-    """获取修行记录列表"""
+    """获取修行记录列表，支持页码分页和游标分页（cursor）"""
     current_user_id = get_jwt_identity()
     page = request.args.get('page', 1, type=int)
     per_page = request.args.get('per_page', 20, type=int)
@@ -379,12 +400,29 @@ def get_chanting_records():
     if chanting_id:
         query = query.filter(ChantingRecord.chanting_id == chanting_id)
     
+    # 提供cursor参数（首页传空值）时使用游标分页，不做COUNT和OFFSET
+    if 'cursor' in request.args:
+        try:
+            records = keyset_paginate(
+                query, ChantingRecord.created_at, ChantingRecord.id,
+                cursor=request.args.get('cursor'), per_page=per_page
+            )
+        except ValueError:
+            return jsonify({'error': '无效的分页游标'}), 400
+        
+        return jsonify({
+            'records': serialize_chanting_records(records.items),
+            'per_page': per_page,
+            'next_cursor': records.next_cursor,
+            'has_next': records.has_next
+        })
+    
     records = query.order_by(ChantingRecord.created_at.desc()).paginate(
         page=page, per_page=per_page, error_out=False
     )
     
     return jsonify({
-        'records': [r.to_dict_with_user_and_chanting() for r in records.items],
+        'records': serialize_chanting_records(records.items),
         'total': records.total,
         'page': page,
         'per_page': per_page,
@@ -481,7 +519,7 @@ def get_daily_stats():
     
     stats = query.order_by(DailyStats.date.desc()).all()
     
-    return jsonify([s.to_dict_with_chanting() for s in stats])
+    return jsonify(serialize_daily_stats(stats))
 
 @api_bp.route('/daily-stats', methods=['POST'])
 @jwt_required()
@@ -512,29 +550,17 @@ def update_daily_stats():
     if not chanting:
         return jsonify({'error': '佛号经文不存在'}), 404
     
-    # 获取或创建统计记录
-    stats = DailyStats.query.filter_by(
-        chanting_id=chanting_id,
-        user_id=user_id,
-        date=target_date
-    ).first()
-    
-    if stats:
-        stats.count = count
-        stats.updated_at = datetime.utcnow()
-    else:
-        stats = DailyStats(
-            chanting_id=chanting_id,
-            user_id=user_id,
-            count=count,
-            date=target_date,
-            created_at=datetime.utcnow()
-        )
-        db.session.add(stats)
+    # 直接设置的计数覆盖之前尚未写入的增量
+    DailyStatsBuffer.discard(user_id, chanting_id, target_date)
     
+    # 原子写入：不存在则创建，存在则设置计数（一次往返，并发时不会违反唯一约束）
+    DailyStats.upsert(chanting_id, user_id, target_date, count)
     db.session.commit()
     
-    return jsonify(stats.to_dict_with_chanting())
+    stats = DailyStats.get_stats(chanting_id, user_id, target_date)
+    result = stats.to_dict()
+    result['chanting'] = chanting.to_dict()
+    return jsonify(result)
 
 @api_bp.route('/daily-stats/increment', methods=['POST'])
 @jwt_required()
@@ -554,9 +580,65 @@ def increment_daily_stats():
     if not chanting:
         return jsonify({'error': '佛号经文不存在'}), 404
     
-    stats = DailyStats.increment_count(chanting_id, user_id, increment)
+    # 计数先进入写回缓冲，由后台批量写入；返回的次数为已写入值加上尚未写入的增量
+    today = date.today()
+    DailyStatsBuffer.add(user_id, chanting_id, increment, today)
+    
+    stats_query = DailyStats.query.filter_by(
+        chanting_id=chanting_id,
+        user_id=user_id,
+        date=today
+    )
+    stats = stats_query.first()
+    if not stats:
+        # 当天第一次计数：立即写入缓冲，使返回的统计与之前一样带有id和created_at
+        DailyStatsBuffer.flush()
+        stats = stats_query.first()
+    if not stats:
+        # 数据库暂不可用，增量仍在缓冲中等待重试
+        stats = DailyStats(chanting_id=chanting_id, user_id=user_id, date=today, count=0)
+    
+    result = stats.to_dict()
+    result['count'] += DailyStatsBuffer.get_pending(user_id, chanting_id, today)
+    result['chanting'] = chanting.to_dict()
+    return jsonify(result)
+
+@api_bp.route('/daily-stats/summary/<int:chanting_id>', methods=['GET'])
+@jwt_required()
+def get_daily_stats_summary(chanting_id):
+    """获取佛号经文的修行统计：累计、近7/30天、最高单日、连续天数和最近几天图表数据"""
+    user_id = get_jwt_identity()
+    
+    chanting = Chanting.query.filter_by(id=chanting_id, is_deleted=False).first()
+    if not chanting:
+        return jsonify({'error': '佛号经文不存在'}), 404
+    
+    return jsonify({
+        'chanting_id': chanting_id,
+        'chanting_title': chanting.title,
+        **summarize_practice(user_id, chanting_id, chart_days=request.args.get('chart_days', 7, type=int))
+    })
+
+@api_bp.route('/stats/heatmap', methods=['GET'])
+@jwt_required()
+def get_stats_heatmap():
+    """获取修行日历：某年每天的念诵总次数和修行日位图"""
+    user_id = get_jwt_identity()
+    today = date.today()
+    year = request.args.get('year', today.year, type=int)
+    if year < 1970 or year > today.year + 1:
+        return jsonify({'error': '年份无效'}), 400
+    
+    heatmap = HeatmapCache.get_heatmap(user_id, year)
+    
+    # 当年的日历计入尚未从缓冲写入的今日增量
+    pending = DailyStatsBuffer.get_pending_for_user(user_id, today) if year == today.year else 0
+    etag = compute_etag('heatmap', user_id, year, heatmap['version'], pending)
     
-    return jsonify(stats.to_dict_with_chanting())
+    def build_body():
+        return HeatmapCache.with_increment(heatmap, today, pending) if pending else heatmap
+    
+    return etag_response(etag, build_body)
 
 # ================== 数据同步相关 ==================
 
@@ -587,18 +669,30 @@ def get_last_updated():
 @jwt_required()
 def get_chapters(chanting_id):
     """获取经文的章节列表"""
-    # 验证经文是否存在
-    chanting = Chanting.query.filter_by(id=chanting_id, is_deleted=False).first()
-    if not chanting:
+    # 验证经文是否存在，同时统计章节版本（一次聚合查询）
+    version = db.session.query(
+        Chanting.id, db.func.count(Chapter.id), db.func.max(Chapter.updated_at)
+    ).outerjoin(
+        Chapter, db.and_(Chapter.chanting_id == Chanting.id, Chapter.is_deleted == False)
+    ).filter(
+        Chanting.id == chanting_id,
+        Chanting.is_deleted == False
+    ).group_by(Chanting.id).first()
+    if not version:
         return jsonify({'error': '经文不存在'}), 404
     
-    chapters = Chapter.get_by_chanting(chanting_id).all()
+    _, total, last_updated = version
+    etag = compute_etag('chapters', chanting_id, total, last_updated)
     
-    return jsonify({
-        'chanting_id': chanting_id,
-        'chapters': [chapter.to_dict() for chapter in chapters],
-        'total_chapters': len(chapters)
-    })
+    def build_body():
+        chapters = Chapter.get_by_chanting(chanting_id).all()
+        return {
+            'chanting_id': chanting_id,
+            'chapters': [chapter.to_dict() for chapter in chapters],
+            'total_chapters': len(chapters)
+        }
+    
+    return etag_response(etag, build_body)
 
 @api_bp.route('/chantings/<int:chanting_id>/chapters', methods=['POST'])
 @jwt_required()
@@ -644,11 +738,24 @@ def create_chapter(chanting_id):
 @jwt_required()
 def get_chapter(chapter_id):
     """获取单个章节详情"""
-    chapter = Chapter.query.filter_by(id=chapter_id, is_deleted=False).first()
-    if not chapter:
+    # 响应包含所属经文，版本取章节和经文的更新时间
+    version = db.session.query(Chapter.updated_at, Chanting.updated_at).outerjoin(
+        Chanting, Chapter.chanting_id == Chanting.id
+    ).filter(
+        Chapter.id == chapter_id,
+        Chapter.is_deleted == False
+    ).first()
+    if not version:
         return jsonify({'error': '章节不存在'}), 404
     
-    return jsonify(chapter.to_dict_with_chanting())
+    chapter_updated, chanting_updated = version
+    etag = compute_etag('chapter', chapter_id, chapter_updated, chanting_updated)
+    
+    def build_body():
+        chapter = Chapter.query.get(chapter_id)
+        return chapter.to_dict_with_chanting()
+    
+    return etag_response(etag, build_body)
 
 @api_bp.route('/chapters/<int:chapter_id>', methods=['PUT'])
 @jwt_required()
@@ -713,7 +820,7 @@ def get_reading_progress():
     
     progress_list = query.all()
     
-    return jsonify([progress.to_dict_with_details() for progress in progress_list])
+    return jsonify(serialize_reading_progress(progress_list))
 
 @api_bp.route('/reading-progress', methods=['POST'])
 @jwt_required()
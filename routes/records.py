@@ -1,16 +1,62 @@
-from flask import Blueprint, render_template, request, jsonify, flash, redirect, url_for
+from flask import Blueprint, render_template, request, jsonify, flash, redirect, url_for, abort
 from flask_login import login_required
 from database import db
 from models.chanting_record import ChantingRecord
 from models.chanting import Chanting
 from models.daily_stats import DailyStats
+from models.practice_summary import PracticeSummary
 from models.dedication import Dedication
 from models.user import User
-from datetime import datetime, date, timedelta
-from sqlalchemy import func
+from datetime import datetime, date
+from utils.relation_loader import serialize_chanting_records
+from utils.keyset_pagination import keyset_paginate
+from utils.stats_engine import summarize_practice
 
 records_bp = Blueprint('records', __name__)
 
+def enrich_records(records, record_dicts, today):
+    """
+    为修行记录字典补充今日次数、累计次数和回向文
+    按页面中的 (用户, 佛号经文) 组合批量查询，共三条查询，与记录数量无关
+    返回修行汇总字典 {(user_id, chanting_id): 汇总}
+    """
+    pairs = list({(record.user_id, record.chanting_id) for record in records})
+    today_counts = {}
+    dedications_map = {}
+    if pairs:
+        # 今日念诵次数
+        today_counts = {
+            (stat.user_id, stat.chanting_id): stat.count
+            for stat in DailyStats.query.filter(
+                db.tuple_(DailyStats.user_id, DailyStats.chanting_id).in_(pairs),
+                DailyStats.date == today
+            )
+        }
+        
+        # 关联的回向文
+        for dedication in Dedication.query.filter(
+            db.tuple_(Dedication.user_id, Dedication.chanting_id).in_(pairs)
+        ).order_by(Dedication.id):
+            dedications_map.setdefault((dedication.user_id, dedication.chanting_id), []).append({
+                'id': dedication.id,
+                'title': dedication.title,
+                'content': dedication.content,
+                'created_at': dedication.created_at.isoformat() if dedication.created_at else None,
+                'updated_at': dedication.updated_at.isoformat() if dedication.updated_at else None
+            })
+    
+    # 累计念诵次数（修行汇总）
+    summaries = PracticeSummary.get_map(pairs)
+    
+    for record, record_dict in zip(records, record_dicts):
+        key = (record.user_id, record.chanting_id)
+        summary = summaries.get(key)
+        record_dict['today_count'] = today_counts.get(key, 0)
+        record_dict['total_count'] = summary.total_count if summary else 0
+        record_dict['dedications'] = dedications_map.get(key, [])
+    
+    return summaries
+
 @records_bp.route('/')
 @login_required
 def index():
@@ -19,7 +65,7 @@ def index():
     chanting_id = request.args.get('chanting_id', type=int)
     user_id = request.args.get('user_id', type=int)
     filter_date = request.args.get('date')
-    page = request.args.get('page', 1, type=int)
+    cursor = request.args.get('cursor')
     per_page = 20
     
     # 构建查询
@@ -47,50 +93,16 @@ def index():
             # 日期格式错误，忽略筛选
             pass
     
-    # 获取记录并添加统计信息
-    records = query.order_by(ChantingRecord.updated_at.desc()).paginate(
-        page=page, per_page=per_page, error_out=False
-    )
+    # 获取记录并添加统计信息（按创建时间游标分页）
+    try:
+        records = keyset_paginate(query, ChantingRecord.created_at, ChantingRecord.id,
+                                  cursor=cursor, per_page=per_page)
+    except ValueError:
+        abort(400, description='无效的分页游标')
     
-    # 将记录转换为包含关联数据的字典列表
-    today = date.today()
-    enhanced_records = []
-    for record in records.items:
-        # 获取包含关联数据的记录字典
-        record_dict = record.to_dict_with_user_and_chanting()
-        
-        # 今日念诵次数（按用户和佛号经文过滤）
-        today_stat = DailyStats.query.filter_by(
-            chanting_id=record.chanting_id,
-            user_id=record.user_id,
-            date=today
-        ).first()
-        record_dict['today_count'] = today_stat.count if today_stat else 0
-        
-        # 总念诵次数（按用户和佛号经文过滤）
-        total_count = db.session.query(func.sum(DailyStats.count)).filter_by(
-            chanting_id=record.chanting_id,
-            user_id=record.user_id
-        ).scalar()
-        record_dict['total_count'] = total_count or 0
-        
-        # 获取关联的回向文
-        dedications = Dedication.query.filter_by(
-            chanting_id=record.chanting_id,
-            user_id=record.user_id
-        ).all()
-        record_dict['dedications'] = [
-            {
-                'id': dedication.id,
-                'title': dedication.title,
-                'content': dedication.content,
-                'created_at': dedication.created_at.isoformat() if dedication.created_at else None,
-                'updated_at': dedication.updated_at.isoformat() if dedication.updated_at else None
-            }
-            for dedication in dedications
-        ]
-        
-        enhanced_records.append(record_dict)
+    # 将记录转换为包含关联数据的字典列表（用户、佛号经文、今日次数、累计次数和回向文批量加载）
+    enhanced_records = serialize_chanting_records(records.items)
+    enrich_records(records.items, enhanced_records, date.today())
     
     # 替换原始的 records.items 为处理后的数据
     records.items = enhanced_records
@@ -118,47 +130,15 @@ def get_record(record_id):
     if not record:
         return jsonify({'error': '修行记录不存在'}), 404
     
-    # 获取今日统计（按用户过滤）
     today = date.today()
-    today_stat = DailyStats.query.filter_by(
-        chanting_id=record.chanting_id,
-        user_id=record.user_id,
-        date=today
-    ).first()
-    
-    # 获取总统计（按用户过滤）
-    total_count = db.session.query(func.sum(DailyStats.count)).filter_by(
-        chanting_id=record.chanting_id,
-        user_id=record.user_id
-    ).scalar()
-    
-    # 获取修行天数（按用户过滤）
-    practice_days = db.session.query(func.count(DailyStats.id)).filter(
-        DailyStats.chanting_id == record.chanting_id,
-        DailyStats.user_id == record.user_id,
-        DailyStats.count > 0
-    ).scalar()
-    
     data = record.to_dict_with_user_and_chanting()
-    data['today_count'] = today_stat.count if today_stat else 0
-    data['total_count'] = total_count or 0
-    data['practice_days'] = practice_days or 0
+    summaries = enrich_records([record], [data], today)
     
-    # 添加关联的回向文
-    dedications = Dedication.query.filter_by(
-        chanting_id=record.chanting_id,
-        user_id=record.user_id
-    ).all()
-    data['dedications'] = [
-        {
-            'id': dedication.id,
-            'title': dedication.title,
-            'content': dedication.content,
-            'created_at': dedication.created_at.isoformat() if dedication.created_at else None,
-            'updated_at': dedication.updated_at.isoformat() if dedication.updated_at else None
-        }
-        for dedication in dedications
-    ]
+    # 修行天数和连续天数（按用户和佛号经文的修行汇总）
+    summary = summaries.get((record.user_id, record.chanting_id))
+    data['practice_days'] = summary.practice_days if summary else 0
+    data['current_streak'] = summary.get_current_streak(today) if summary else 0
+    data['max_streak'] = summary.max_streak if summary else 0
     
     return jsonify(data)
 
@@ -170,67 +150,8 @@ def get_record_stats(record_id):
     if not record:
         return jsonify({'error': '修行记录不存在'}), 404
     
-    # 获取该佛号经文的所有统计数据
-    stats_query = DailyStats.query.filter_by(chanting_id=record.chanting_id).order_by(DailyStats.date.desc())
-    all_stats = stats_query.all()
-    
-    # 基本统计
-    today = date.today()
-    total_count = sum(stat.count for stat in all_stats)
-    total_days = len([stat for stat in all_stats if stat.count > 0])
-    today_count = next((stat.count for stat in all_stats if stat.date == today), 0)
-    
-    # 最近7天统计
-    week_ago = today - timedelta(days=6)
-    recent_stats = [stat for stat in all_stats if stat.date >= week_ago]
-    week_total = sum(stat.count for stat in recent_stats)
-    
-    # 最近30天统计
-    month_ago = today - timedelta(days=29)
-    month_stats = [stat for stat in all_stats if stat.date >= month_ago]
-    month_total = sum(stat.count for stat in month_stats)
-    
-    # 最高单日记录
-    max_daily = max((stat.count for stat in all_stats), default=0)
-    max_daily_date = next((stat.date.strftime('%Y-%m-%d') for stat in all_stats if stat.count == max_daily), None) if max_daily > 0 else None
-    
-    # 连续修行天数（当前连续）
-    consecutive_days = 0
-    check_date = today
-    while True:
-        day_stat = next((stat for stat in all_stats if stat.date == check_date), None)
-        if day_stat and day_stat.count > 0:
-            consecutive_days += 1
-            check_date -= timedelta(days=1)
-        else:
-            break
-    
-    # 最长连续修行天数
-    max_consecutive = 0
-    current_consecutive = 0
-    
-    # 按日期排序统计数据
-    sorted_stats = sorted(all_stats, key=lambda x: x.date)
-    for i, stat in enumerate(sorted_stats):
-        if stat.count > 0:
-            current_consecutive += 1
-            max_consecutive = max(max_consecutive, current_consecutive)
-        else:
-            current_consecutive = 0
-    
-    # 平均每日念诵次数
-    avg_daily = round(total_count / total_days, 1) if total_days > 0 else 0
-    
-    # 最近7天数据用于图表
-    chart_data = []
-    for i in range(6, -1, -1):
-        check_date = today - timedelta(days=i)
-        day_stat = next((stat for stat in all_stats if stat.date == check_date), None)
-        chart_data.append({
-            'date': check_date.strftime('%Y-%m-%d'),
-            'date_short': check_date.strftime('%m-%d'),
-            'count': day_stat.count if day_stat else 0
-        })
+    # 该用户该佛号经文的每日统计序列，一次遍历计算全部指标
+    stats = summarize_practice(record.user_id, record.chanting_id)
     
     # Get chanting details
     from models.chanting import Chanting
@@ -255,17 +176,24 @@ def get_record_stats(record_id):
         'record_id': record_id,
         'chanting': chanting_data,
         'user': user_data,
-        'stats': {
-            'today_count': today_count,
-            'total_count': total_count,
-            'total_days': total_days,
-            'week_total': week_total,
-            'month_total': month_total,
-            'max_daily': max_daily,
-            'max_daily_date': max_daily_date,
-            'consecutive_days': consecutive_days,
-            'max_consecutive': max_consecutive,
-            'avg_daily': avg_daily,
-            'chart_data': chart_data
-        }
+        'stats': stats
+    })
+
+@records_bp.route('/users/<int:user_id>/summary/<int:chanting_id>')
+@login_required
+def get_user_chanting_summary(user_id, chanting_id):
+    """获取指定用户某佛号经文的修行统计（与 /api/daily-stats/summary 相同，供后台按用户查看）"""
+    user = User.query.get(user_id)
+    if not user:
+        return jsonify({'error': '用户不存在'}), 404
+    chanting = Chanting.query.filter_by(id=chanting_id, is_deleted=False).first()
+    if not chanting:
+        return jsonify({'error': '佛号经文不存在'}), 404
+    
+    return jsonify({
+        'user_id': user_id,
+        'username': user.username,
+        'chanting_id': chanting_id,
+        'chanting_title': chanting.title,
+        **summarize_practice(user_id, chanting_id, chart_days=request.args.get('chart_days', 7, type=int))
     })
\ No newline at end of file
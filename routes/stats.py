@@ -5,8 +5,10 @@ from models.chanting import Chanting
 from models.chanting_record import ChantingRecord
 from models.dedication import Dedication
 from models.daily_stats import DailyStats
+from models.stats_rollup import StatsRollup
+from models.practice_summary import PracticeSummary
 from datetime import datetime, date, timedelta
-from sqlalchemy import func, desc
+from sqlalchemy import func, desc, select
 
 stats_bp = Blueprint('stats', __name__)
 
@@ -23,23 +25,26 @@ def index():
     else:
         target_date = date.today()
     
-    # 基础统计
-    total_chantings = Chanting.query.filter_by(is_deleted=False).count()
-    total_records = ChantingRecord.query.count()
-    total_dedications = Dedication.query.count()
+    # 基础统计（三项计数合并为一条查询）
+    total_chantings, total_records, total_dedications = db.session.execute(select(
+        select(func.count(Chanting.id)).where(Chanting.is_deleted == False).scalar_subquery(),
+        select(func.count(ChantingRecord.id)).scalar_subquery(),
+        select(func.count(Dedication.id)).scalar_subquery()
+    )).one()
     
-    # 今日总念诵次数
-    today_total_count = db.session.query(func.sum(DailyStats.count)).filter_by(
-        date=target_date
+    # 当日总念诵次数（日汇总）
+    today_total_count = db.session.query(StatsRollup.total_count).filter_by(
+        granularity='day',
+        period_start=target_date
     ).scalar() or 0
     
-    # 热门修行项目 (按总念诵次数排序)
+    # 热门修行项目 (按总念诵次数排序，由修行汇总按佛号经文求和)
     top_practices = db.session.query(
         Chanting.id,
         Chanting.title,
         Chanting.type,
-        func.sum(DailyStats.count).label('total_count')
-    ).join(DailyStats, Chanting.id == DailyStats.chanting_id).filter(
+        func.sum(PracticeSummary.total_count).label('total_count')
+    ).join(PracticeSummary, Chanting.id == PracticeSummary.chanting_id).filter(
         Chanting.is_deleted == False
     ).group_by(
         Chanting.id, Chanting.title, Chanting.type
@@ -55,20 +60,26 @@ def index():
         DailyStats.date == target_date,
         Chanting.is_deleted == False
     ).order_by(desc(DailyStats.count))
+    day_rows = daily_stats_query.all()
+    
+    # 各佛号经文的累计次数和修行天数（一次分组查询）
+    chanting_totals = {}
+    chanting_ids = {chanting.id for _, chanting in day_rows}
+    if chanting_ids:
+        chanting_totals = {
+            chanting_id: (total_count or 0, practice_days or 0)
+            for chanting_id, total_count, practice_days in db.session.query(
+                PracticeSummary.chanting_id,
+                func.sum(PracticeSummary.total_count),
+                func.sum(PracticeSummary.practice_days)
+            ).filter(
+                PracticeSummary.chanting_id.in_(chanting_ids)
+            ).group_by(PracticeSummary.chanting_id)
+        }
     
     daily_stats = []
-    for stat, chanting in daily_stats_query:
-        # 计算修行天数
-        practice_days = DailyStats.query.filter(
-            DailyStats.chanting_id == chanting.id,
-            DailyStats.count > 0
-        ).count()
-        
-        # 计算累计念诵
-        total_count = db.session.query(func.sum(DailyStats.count)).filter_by(
-            chanting_id=chanting.id
-        ).scalar() or 0
-        
+    for stat, chanting in day_rows:
+        total_count, practice_days = chanting_totals.get(chanting.id, (0, 0))
         daily_stats.append({
             'chanting': chanting,
             'today_count': stat.count,
@@ -87,39 +98,52 @@ def index():
                          selected_date=selected_date,
                          today=target_date.strftime('%Y-%m-%d'))
 
+# 图表最多显示的点数，超过时改用更粗的时间粒度
+CHART_MAX_POINTS = 100
+
+# 图表时间范围上限（天），超出时按上限处理，避免日期计算溢出
+MAX_CHART_DAYS = 3650
+
+# 各粒度的标签格式
+CHART_LABEL_FORMATS = {
+    'day': '%m-%d',
+    'week': '%m-%d',
+    'month': '%Y-%m',
+    'year': '%Y'
+}
+
+def choose_chart_granularity(start_date, end_date, max_points=CHART_MAX_POINTS):
+    """选择点数不超过max_points的最细粒度（一年按周约52个点）"""
+    for granularity in StatsRollup.GRANULARITIES:
+        points = 0
+        period = StatsRollup.get_period_start(granularity, start_date)
+        while period <= end_date and points <= max_points:
+            points += 1
+            period = StatsRollup.get_next_period(granularity, period)
+        if points <= max_points:
+            return granularity
+    return 'year'
+
 @stats_bp.route('/chart')
 @login_required
 def chart_data():
-    """获取图表数据"""
-    days = request.args.get('days', 30, type=int)
+    """获取图表数据，按时间范围从日、周、月、年汇总中选择粒度"""
+    days = min(max(request.args.get('days', 30, type=int), 1), MAX_CHART_DAYS)
+    granularity = request.args.get('granularity')
     
     # 计算日期范围
     end_date = date.today()
     start_date = end_date - timedelta(days=days-1)
     
-    # 获取每日统计数据
-    daily_totals = db.session.query(
-        DailyStats.date,
-        func.sum(DailyStats.count).label('total_count')
-    ).filter(
-        DailyStats.date >= start_date,
-        DailyStats.date <= end_date
-    ).group_by(DailyStats.date).order_by(DailyStats.date).all()
-    
-    # 创建日期标签和数据
-    labels = []
-    values = []
-    
-    # 填充所有日期，没有数据的日期设为0
-    current_date = start_date
-    daily_dict = {stat.date: stat.total_count for stat in daily_totals}
+    if granularity not in StatsRollup.GRANULARITIES:
+        granularity = choose_chart_granularity(start_date, end_date)
     
-    while current_date <= end_date:
-        labels.append(current_date.strftime('%m-%d'))
-        values.append(daily_dict.get(current_date, 0))
-        current_date += timedelta(days=1)
+    # 读取时间汇总，没有数据的周期为0
+    series = StatsRollup.get_series(granularity, start_date, end_date)
+    label_format = CHART_LABEL_FORMATS[granularity]
     
     return jsonify({
-        'labels': labels,
-        'values': values
-    })
\ No newline at end of file
+        'granularity': granularity,
+        'labels': [period.strftime(label_format) for period, _ in series],
+        'values': [total for _, total in series]
+    })
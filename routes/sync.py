@@ -1,15 +1,28 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, Response, request, jsonify, url_for, stream_with_context
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from datetime import datetime, date
+from datetime import datetime, date, timedelta, timezone
 from database import db
 from models.user import User
 from models.chanting import Chanting
 from models.dedication import Dedication
 from models.chanting_record import ChantingRecord
 from models.daily_stats import DailyStats
+from models.practice_summary import PracticeSummary
+from models.stats_rollup import StatsRollup
+from models.practice_heatmap import PracticeHeatmap
 from models.dedication_template import DedicationTemplate
 from models.sync_record import SyncRecord
 from models.sync_config import SyncConfig
+from models.sync_tombstone import SyncTombstone
+from utils.bulk_writer import BulkWriter
+from utils.chanting_resolver import ChantingResolver
+from utils.sync_job_queue import SyncJobQueue
+from utils.catalog_cache import CatalogCache, iter_catalog_rows, serialize_chanting
+from utils.counter_buffer import DailyStatsBuffer
+from utils.metrics import DAILY_STATS_WRITES, SYNC_PAYLOAD_BYTES, SYNC_ROWS
+from itertools import chain
+import base64
+import json
 import logging
 
 # 配置日志输出到控制台以便调试
@@ -26,6 +39,16 @@ if not sync_logger.handlers:
 
 sync_bp = Blueprint('sync', __name__)
 
+# 上传数据中可同步的数据类型，按处理顺序排列
+SYNC_DATA_TYPES = ['users', 'chantings', 'dedications', 'chanting_records', 'daily_stats', 'dedication_templates']
+
+# 下载时每批从数据库读取和输出的行数
+DOWNLOAD_CHUNK_SIZE = 500
+
+# 下载游标按 updated_at 比较，因此同步写入的 updated_at 一律使用服务器时间（app端的时间只影响created_at）；
+# updated_at 在事务提交前生成，游标回退一段时间，覆盖下载时尚未提交的同步事务（重复下载无害）
+DOWNLOAD_CURSOR_OVERLAP = timedelta(minutes=5)
+
 @sync_bp.route('/upload', methods=['POST'])
 def upload_data():
     """
@@ -121,11 +144,24 @@ def upload_data():
             sync_logger.warning("请求中没有数据")
             return jsonify({'status': 'success', 'message': 'no data'}), 200
         
+        SYNC_PAYLOAD_BYTES.observe(len(request.get_data()), direction='upload')
+        
         # 获取设备ID和同步类型
+        # full: 替换式同步（清理后重新导入）；incremental: 只合并app端变更的数据
+        # 未知的同步类型直接拒绝，不能退回到会清理数据的替换式同步
         device_id = data.get('device_id', 'unknown')
-        sync_type = data.get('sync_type', 'incremental')
+        sync_type = data.get('sync_type', 'full')
+        if sync_type not in ('full', 'incremental'):
+            sync_logger.warning(f"未知的同步类型: {sync_type}")
+            db.session.rollback()
+            return jsonify({
+                'status': 'error',
+                'message': 'invalid sync_type',
+                'allowed': ['full', 'incremental']
+            }), 400
+        is_incremental = sync_type == 'incremental'
         
-        # 创建同步记录
+        # 创建同步记录（异步上传时同一条记录即为任务）
         sync_record = SyncRecord(
             user_id=user_id,
             device_id=device_id,
@@ -136,97 +172,20 @@ def upload_data():
             sync_started_at=datetime.utcnow()
         )
         
-        # 检查是否为首次同步
-        is_first_sync = SyncRecord.query.filter(
-            SyncRecord.user_id == user_id,
-            SyncRecord.device_id == device_id,
-            SyncRecord.sync_status == 'success'
-        ).first() is None
-        
-        sync_logger.info(f"同步信息: 用户ID={user_id}, 设备ID={device_id}, 首次同步={is_first_sync}")
-        
-        # 如果是首次同步且配置允许，自动创建用户相关的所有数据
-        if is_first_sync and SyncConfig.get_config('first_sync_auto_create_user', True):
-            sync_logger.info("首次同步，将创建完整的用户数据")
-        
-        # 获取数据覆盖策略
-        overwrite_policy = SyncConfig.get_config('app_data_overwrite_policy', {})
-        
-        # 记录接收到的数据类型和数量
-        data_summary = {}
-        for key in ['users', 'chantings', 'dedications', 'chanting_records', 'daily_stats', 'dedication_templates']:
-            if key in data:
-                count = len(data[key]) if isinstance(data[key], list) else 1
-                data_summary[key] = count
-        
-        sync_logger.info(f"接收到的数据概要: {data_summary}")
-        
-        result = {
-            'status': 'success',
-            'message': 'data synchronized',
-            'details': {},
-            'user_id': user_id
-        }
-        
-        # 执行替换式同步：先清理用户现有数据，再导入app数据
-        sync_logger.info(f"开始替换式同步，先清理用户 {current_user.username} 的现有数据")
-        _clear_user_data(user_id, data, sync_logger)
-        
-        # 同步用户数据（只同步当前用户）
-        if 'users' in data and overwrite_policy.get('users', True):
-            sync_logger.info(f"开始同步用户数据，数量: {len(data['users'])}")
-            sync_users(data['users'], result, current_user, is_first_sync)
-        elif 'users' in data:
-            sync_logger.info("用户数据同步被策略禁止")
-        
-        # 同步佛号经文数据
-        if 'chantings' in data and overwrite_policy.get('chantings', False):
-            sync_logger.info(f"开始同步佛号经文数据，数量: {len(data['chantings'])}")
-            sync_chantings(data['chantings'], result, user_id, is_first_sync)
-        elif 'chantings' in data:
-            sync_logger.info("佛号经文数据同步被策略禁止")
-        
-        # 同步回向数据
-        if 'dedications' in data and overwrite_policy.get('dedications', True):
-            sync_logger.info(f"开始同步回向数据，数量: {len(data['dedications'])}")
-            sync_dedications(data['dedications'], result, user_id, is_first_sync)
-        elif 'dedications' in data:
-            sync_logger.info("回向数据同步被策略禁止")
-        
-        # 同步修行记录
-        if 'chanting_records' in data and overwrite_policy.get('chanting_records', True):
-            sync_logger.info(f"开始同步修行记录，数量: {len(data['chanting_records'])}")
-            sync_chanting_records(data['chanting_records'], result, user_id, is_first_sync)
-        elif 'chanting_records' in data:
-            sync_logger.info("修行记录同步被策略禁止")
-        
-        # 同步每日统计
-        if 'daily_stats' in data and overwrite_policy.get('daily_stats', True):
-            sync_logger.info(f"开始同步每日统计，数量: {len(data['daily_stats'])}")
-            sync_daily_stats(data['daily_stats'], result, user_id, is_first_sync)
-        elif 'daily_stats' in data:
-            sync_logger.info("每日统计同步被策略禁止")
-        
-        # 同步回向模板（模板是全局的，但记录创建者）
-        if 'dedication_templates' in data and overwrite_policy.get('dedication_templates', False):
-            sync_logger.info(f"开始同步回向模板，数量: {len(data['dedication_templates'])}")
-            sync_dedication_templates(data['dedication_templates'], result, is_first_sync)
-        elif 'dedication_templates' in data:
-            sync_logger.info("回向模板同步被策略禁止")
-        
-        # 完成同步记录
-        sync_record.sync_completed_at = datetime.utcnow()
-        sync_record.sync_status = 'success'
-        db.session.add(sync_record)
-        
-        # 将同步记录ID添加到返回结果
-        result['sync_record_id'] = sync_record.id
-        result['is_first_sync'] = is_first_sync
-        
-        db.session.commit()
-        sync_logger.info(f"=== 用户 {current_user.username} 数据同步完成 ===")
-        sync_logger.info(f"同步结果详情: {result['details']}")
+        # 异步上传：保存任务后立即返回，由后台线程处理，app通过 /sync/jobs/<id> 查询进度
+        if is_async_upload(data):
+            payload = {key: value for key, value in data.items() if key != 'auth'}
+            job_id = SyncJobQueue.enqueue(sync_record, payload)
+            sync_logger.info(f"异步同步任务已创建，任务ID: {job_id}, 用户ID: {user_id}")
+            return jsonify({
+                'status': 'accepted',
+                'message': 'sync job queued',
+                'job_id': job_id,
+                'sync_record_id': job_id,
+                'status_url': url_for('sync.get_sync_job', job_id=job_id)
+            }), 202
         
+        result = process_upload(data, current_user, sync_record)
         return jsonify(result), 200
     
     except Exception as e:
@@ -247,6 +206,162 @@ def upload_data():
         # 仍然返回成功状态，避免app端报错
         return jsonify({'status': 'success', 'message': 'sync attempted'}), 200
 
+def process_upload(data, current_user, sync_record, progress_callback=None):
+    """
+    执行上传数据的同步处理，同步请求和异步任务共用
+    完成后更新同步记录并提交事务，返回同步结果
+    """
+    user_id = current_user.id
+    device_id = sync_record.device_id
+    sync_type = sync_record.sync_type
+    is_incremental = sync_type == 'incremental'
+    
+    # 按数据类型报告处理进度，最后一步为提交事务
+    progress_keys = [key for key in SYNC_DATA_TYPES if key in data]
+    
+    def report_progress(key):
+        if progress_callback and key in progress_keys:
+            progress_callback(int((progress_keys.index(key) + 1) * 100 / (len(progress_keys) + 1)))
+    
+    # 检查是否为首次同步
+    is_first_sync = SyncRecord.query.filter(
+        SyncRecord.user_id == user_id,
+        SyncRecord.device_id == device_id,
+        SyncRecord.sync_status == 'success'
+    ).first() is None
+    
+    # 上次成功同步时间，增量同步时app据此只上传之后变更的数据
+    last_sync_at = SyncRecord.get_last_sync_time(user_id, device_id)
+    
+    sync_logger.info(f"同步信息: 用户ID={user_id}, 设备ID={device_id}, 首次同步={is_first_sync}, 同步类型={sync_type}")
+    
+    # 如果是首次同步且配置允许，自动创建用户相关的所有数据
+    if is_first_sync and SyncConfig.get_config('first_sync_auto_create_user', True):
+        sync_logger.info("首次同步，将创建完整的用户数据")
+    
+    # 获取数据覆盖策略
+    overwrite_policy = SyncConfig.get_config('app_data_overwrite_policy', {})
+    
+    # 批量写入的批次大小
+    batch_size = get_sync_batch_size()
+    
+    # 记录接收到的数据类型和数量
+    data_summary = {}
+    for key in SYNC_DATA_TYPES:
+        if key in data:
+            count = len(data[key]) if isinstance(data[key], list) else 1
+            data_summary[key] = count
+    
+    sync_logger.info(f"接收到的数据概要: {data_summary}")
+    for key, count in data_summary.items():
+        SYNC_ROWS.observe(count, direction='upload', data_type=key)
+    
+    result = {
+        'status': 'success',
+        'message': 'data synchronized',
+        'details': {},
+        'user_id': user_id,
+        'sync_type': sync_type,
+        'last_sync_at': last_sync_at.isoformat() if last_sync_at else None
+    }
+    
+    if is_incremental:
+        # 增量同步：不清理现有数据，按客户端主键合并，删除通过墓碑标记处理
+        sync_logger.info(f"开始增量同步，合并用户 {current_user.username} 的变更数据")
+    else:
+        # 执行替换式同步：先清理用户现有数据，再导入app数据
+        sync_logger.info(f"开始替换式同步，先清理用户 {current_user.username} 的现有数据")
+        _clear_user_data(user_id, data, sync_logger)
+    
+    # 预加载用户可见的佛号经文，本次请求内所有查找都走缓存（需在清理数据之后创建）
+    resolver = ChantingResolver(user_id)
+    
+    # 同步用户数据（只同步当前用户）
+    if 'users' in data and overwrite_policy.get('users', True):
+        sync_logger.info(f"开始同步用户数据，数量: {len(data['users'])}")
+        sync_users(data['users'], result, current_user, is_first_sync)
+    elif 'users' in data:
+        sync_logger.info("用户数据同步被策略禁止")
+    
+    report_progress('users')
+    
+    # 同步佛号经文数据
+    if 'chantings' in data and overwrite_policy.get('chantings', False):
+        sync_logger.info(f"开始同步佛号经文数据，数量: {len(data['chantings'])}")
+        sync_chantings(data['chantings'], result, user_id, is_first_sync, resolver)
+    elif 'chantings' in data:
+        sync_logger.info("佛号经文数据同步被策略禁止")
+    
+    report_progress('chantings')
+    
+    # 同步回向数据
+    if 'dedications' in data and overwrite_policy.get('dedications', True):
+        sync_logger.info(f"开始同步回向数据，数量: {len(data['dedications'])}")
+        if is_incremental:
+            merge_dedications(data['dedications'], result, user_id, resolver)
+        else:
+            sync_dedications(data['dedications'], result, user_id, is_first_sync, batch_size, resolver)
+    elif 'dedications' in data:
+        sync_logger.info("回向数据同步被策略禁止")
+    
+    report_progress('dedications')
+    
+    # 同步修行记录
+    if 'chanting_records' in data and overwrite_policy.get('chanting_records', True):
+        sync_logger.info(f"开始同步修行记录，数量: {len(data['chanting_records'])}")
+        if is_incremental:
+            merge_chanting_records(data['chanting_records'], result, user_id, resolver)
+        else:
+            sync_chanting_records(data['chanting_records'], result, user_id, is_first_sync, batch_size, resolver)
+    elif 'chanting_records' in data:
+        sync_logger.info("修行记录同步被策略禁止")
+    
+    report_progress('chanting_records')
+    
+    # 同步每日统计
+    if 'daily_stats' in data and overwrite_policy.get('daily_stats', True):
+        sync_logger.info(f"开始同步每日统计，数量: {len(data['daily_stats'])}")
+        if is_incremental:
+            merge_daily_stats(data['daily_stats'], result, user_id, resolver, batch_size)
+        else:
+            sync_daily_stats(data['daily_stats'], result, user_id, is_first_sync, batch_size, resolver)
+    elif 'daily_stats' in data:
+        sync_logger.info("每日统计同步被策略禁止")
+    
+    report_progress('daily_stats')
+    
+    # 同步回向模板（模板是全局的，但记录创建者）
+    if 'dedication_templates' in data and overwrite_policy.get('dedication_templates', False):
+        sync_logger.info(f"开始同步回向模板，数量: {len(data['dedication_templates'])}")
+        sync_dedication_templates(data['dedication_templates'], result, is_first_sync)
+    elif 'dedication_templates' in data:
+        sync_logger.info("回向模板同步被策略禁止")
+    
+    report_progress('dedication_templates')
+    
+    result['chanting_cache'] = resolver.get_stats()
+    
+    # 完成同步记录
+    sync_record.sync_completed_at = datetime.utcnow()
+    sync_record.sync_status = 'success'
+    sync_record.result_details = json.dumps(result['details'], ensure_ascii=False, default=str)
+    if sync_record.job_status:
+        sync_record.job_status = 'completed'
+        sync_record.job_progress = 100
+        sync_record.job_payload = None
+    db.session.add(sync_record)
+    
+    db.session.commit()
+    
+    # 将同步记录ID添加到返回结果（提交后才有ID）
+    result['sync_record_id'] = sync_record.id
+    result['is_first_sync'] = is_first_sync
+    
+    sync_logger.info(f"=== 用户 {current_user.username} 数据同步完成 ===")
+    sync_logger.info(f"同步结果详情: {result['details']}")
+    
+    return result
+
 def sync_users(users_data, result, current_user, is_first_sync=False):
     """同步用户数据（只同步当前用户的信息）"""
     try:
@@ -286,9 +401,10 @@ def sync_users(users_data, result, current_user, is_first_sync=False):
     except Exception as e:
         sync_logger.error(f"同步用户数据失败: {str(e)}")
 
-def sync_chantings(chantings_data, result, user_id, is_first_sync=False):
+def sync_chantings(chantings_data, result, user_id, is_first_sync=False, resolver=None):
     """同步佛号经文数据 - 严格保护内置内容"""
     try:
+        resolver = resolver or ChantingResolver(user_id)
         synced_count = 0
         updated_count = 0
         skipped_built_in_count = 0
@@ -298,8 +414,7 @@ def sync_chantings(chantings_data, result, user_id, is_first_sync=False):
         protection_policy = SyncConfig.get_config('built_in_content_protection', {})
         strict_mode = protection_policy.get('strict_mode', True)
         
-        for i, chanting_data in enumerate(chantings_data):
-            sync_logger.info(f"处理第 {i+1}/{len(chantings_data)} 个佛号经文: {chanting_data.get('title', 'N/A')}")
+        for chanting_data in chantings_data:
             title = chanting_data.get('title')
             content = chanting_data.get('content')
             if not title or not content:
@@ -307,12 +422,7 @@ def sync_chantings(chantings_data, result, user_id, is_first_sync=False):
             
             # 严格模式下：检查是否为内置内容，如果是则完全跳过
             if strict_mode:
-                existing_built_in = Chanting.query.filter_by(
-                    title=title, 
-                    content=content,
-                    is_built_in=True,
-                    is_deleted=False
-                ).first()
+                existing_built_in = resolver.find_built_in(title, content)
                 
                 if existing_built_in:
                     sync_logger.info(f"跳过内置佛号经文: {title}，app不允许修改内置内容")
@@ -331,20 +441,14 @@ def sync_chantings(chantings_data, result, user_id, is_first_sync=False):
                 chanting_type = 'buddha'
             
             # 只查找用户自己创建的内容
-            existing_user_chanting = Chanting.query.filter_by(
-                title=title, 
-                content=content,
-                user_id=user_id,
-                is_built_in=False,  # 只处理非内置内容
-                is_deleted=False
-            ).first()
+            existing_user_chanting = resolver.find_user_owned(title, content)
             
             if existing_user_chanting:
                 # 只允许更新用户自己创建的非内置内容
                 sync_logger.info(f"更新用户佛号经文: {title} (ID: {existing_user_chanting.id})")
                 if chanting_data.get('pronunciation'):
                     existing_user_chanting.pronunciation = chanting_data['pronunciation']
-                existing_user_chanting.updated_at = parse_datetime(chanting_data.get('updated_at'))
+                existing_user_chanting.updated_at = datetime.utcnow()
                 updated_count += 1
             else:
                 # 创建新的用户内容（强制设为非内置）
@@ -357,11 +461,15 @@ def sync_chantings(chantings_data, result, user_id, is_first_sync=False):
                     is_built_in=False,  # 强制设为非内置
                     user_id=user_id,
                     created_at=parse_datetime(chanting_data.get('created_at')),
-                    updated_at=parse_datetime(chanting_data.get('updated_at'))
+                    updated_at=datetime.utcnow()
                 )
                 db.session.add(new_chanting)
+                resolver.register(new_chanting)
                 synced_count += 1
         
+        # 写入新建的佛号经文以获得ID，后续记录和统计需要引用
+        db.session.flush()
+        
         result['details']['chantings'] = {
             'synced': synced_count,
             'updated': updated_count,
@@ -372,11 +480,12 @@ def sync_chantings(chantings_data, result, user_id, is_first_sync=False):
     except Exception as e:
         sync_logger.error(f"同步佛号经文数据失败: {str(e)}")
 
-def sync_dedications(dedications_data, result, user_id, is_first_sync=False):
-    """同步回向数据（替换式同步，数据已被清理）"""
+def sync_dedications(dedications_data, result, user_id, is_first_sync=False, batch_size=None, resolver=None):
+    """同步回向数据（替换式同步，数据已被清理，批量写入）"""
     try:
-        synced_count = 0
+        resolver = resolver or ChantingResolver(user_id)
         skipped_count = 0
+        writer = BulkWriter(Dedication, batch_size)
         
         for dedication_data in dedications_data:
             title = dedication_data.get('title')
@@ -388,44 +497,42 @@ def sync_dedications(dedications_data, result, user_id, is_first_sync=False):
             # 查找关联的佛号经文
             chanting_id = None
             if dedication_data.get('chanting_title') and dedication_data.get('chanting_content'):
-                chanting = Chanting.query.filter_by(
-                    title=dedication_data['chanting_title'],
-                    content=dedication_data['chanting_content'],
-                    is_deleted=False
-                ).first()
+                chanting = resolver.resolve(dedication_data['chanting_title'], dedication_data['chanting_content'])
                 if chanting:
                     chanting_id = chanting.id
             
-            # 直接创建新回向（无需检查存在性，因为已清理）
-            new_dedication = Dedication(
-                title=title,
-                content=content,
-                chanting_id=chanting_id,
-                user_id=user_id,
-                created_at=parse_datetime(dedication_data.get('created_at')),
-                updated_at=parse_datetime(dedication_data.get('updated_at'))
-            )
-            db.session.add(new_dedication)
-            synced_count += 1
+            # 直接写入新回向（无需检查存在性，因为已清理）
+            writer.add({
+                'title': title,
+                'content': content,
+                'chanting_id': chanting_id,
+                'user_id': user_id,
+                'client_uuid': get_client_uuid(dedication_data),
+                'created_at': parse_datetime(dedication_data.get('created_at')),
+                'updated_at': datetime.utcnow()
+            })
         
+        write_stats = writer.close()
         result['details']['dedications'] = {
-            'synced': synced_count,
-            'skipped': skipped_count
+            'synced': write_stats['rows_written'],
+            'skipped': skipped_count,
+            **write_stats
         }
-        sync_logger.info(f"回向数据同步完成: 新建 {synced_count}, 跳过 {skipped_count}")
+        sync_logger.info(f"回向数据同步完成: 新建 {write_stats['rows_written']}, 跳过 {skipped_count}, "
+                        f"写入速度 {write_stats['rows_per_second']} 行/秒")
     
     except Exception as e:
         sync_logger.error(f"同步回向数据失败: {str(e)}")
 
-def sync_chanting_records(records_data, result, user_id, is_first_sync=False):
-    """同步修行记录（替换式同步，数据已被清理）"""
+def sync_chanting_records(records_data, result, user_id, is_first_sync=False, batch_size=None, resolver=None):
+    """同步修行记录（替换式同步，数据已被清理，批量写入）"""
     try:
-        synced_count = 0
+        resolver = resolver or ChantingResolver(user_id)
         skipped_count = 0
+        writer = BulkWriter(ChantingRecord, batch_size)
         sync_logger.info(f"处理修行记录数据，用户ID: {user_id}")
         
-        for i, record_data in enumerate(records_data):
-            sync_logger.info(f"处理第 {i+1}/{len(records_data)} 个修行记录")
+        for record_data in records_data:
             chanting_title = record_data.get('chanting_title')
             chanting_content = record_data.get('chanting_content')
             if not chanting_title or not chanting_content:
@@ -433,51 +540,46 @@ def sync_chanting_records(records_data, result, user_id, is_first_sync=False):
                 continue
             
             # 查找对应的佛号经文
-            chanting = Chanting.query.filter_by(
-                title=chanting_title,
-                content=chanting_content,
-                is_deleted=False
-            ).first()
+            chanting = resolver.resolve(chanting_title, chanting_content)
             if not chanting:
                 sync_logger.warning(f"找不到对应的佛号经文: {chanting_title}")
                 skipped_count += 1
                 continue
             
-            sync_logger.info(f"找到佛号经文: {chanting_title} (ID: {chanting.id})")
-            
-            # 直接创建新记录（无需检查存在性，因为已清理）
-            sync_logger.info(f"创建新的修行记录: {chanting_title}")
-            new_record = ChantingRecord(
-                chanting_id=chanting.id,
-                user_id=user_id,
-                created_at=parse_datetime(record_data.get('created_at')),
-                updated_at=parse_datetime(record_data.get('updated_at'))
-            )
-            db.session.add(new_record)
-            synced_count += 1
+            # 直接写入新记录（无需检查存在性，因为已清理）
+            writer.add({
+                'chanting_id': chanting.id,
+                'user_id': user_id,
+                'client_uuid': get_client_uuid(record_data),
+                'created_at': parse_datetime(record_data.get('created_at')),
+                'updated_at': datetime.utcnow()
+            })
         
+        write_stats = writer.close()
         result['details']['chanting_records'] = {
-            'synced': synced_count,
-            'skipped': skipped_count
+            'synced': write_stats['rows_written'],
+            'skipped': skipped_count,
+            **write_stats
         }
-        sync_logger.info(f"修行记录同步完成: 新建 {synced_count}, 跳过 {skipped_count}")
+        sync_logger.info(f"修行记录同步完成: 新建 {write_stats['rows_written']}, 跳过 {skipped_count}, "
+                        f"写入速度 {write_stats['rows_per_second']} 行/秒")
     
     except Exception as e:
         sync_logger.error(f"同步修行记录失败: {str(e)}")
 
-def sync_daily_stats(stats_data, result, user_id, is_first_sync=False):
-    """同步每日统计（替换式同步，数据已被清理）"""
+def sync_daily_stats(stats_data, result, user_id, is_first_sync=False, batch_size=None, resolver=None):
+    """同步每日统计（替换式同步，数据已被清理，批量写入）"""
     try:
-        synced_count = 0
+        resolver = resolver or ChantingResolver(user_id)
         skipped_count = 0
         sync_logger.info(f"开始处理每日统计数据，总数: {len(stats_data)}")
         
-        for i, stat_data in enumerate(stats_data):
-            sync_logger.info(f"处理第 {i+1}/{len(stats_data)} 条统计数据")
+        # 按 (佛号经文, 日期) 去重，同一天重复上传的统计以最后一条为准，避免违反唯一约束
+        pending_stats = {}
+        for stat_data in stats_data:
             chanting_title = stat_data.get('chanting_title')
             chanting_content = stat_data.get('chanting_content')
             stat_date = stat_data.get('date')
-            count = stat_data.get('count', 0)
             
             if not chanting_title or not chanting_content or not stat_date:
                 sync_logger.warning(f"跳过无效数据: title={chanting_title}, content={'有' if chanting_content else '无'}, date={stat_date}")
@@ -485,11 +587,7 @@ def sync_daily_stats(stats_data, result, user_id, is_first_sync=False):
                 continue
             
             # 查找对应的佛号经文
-            chanting = Chanting.query.filter_by(
-                title=chanting_title,
-                content=chanting_content,
-                is_deleted=False
-            ).first()
+            chanting = resolver.resolve(chanting_title, chanting_content)
             if not chanting:
                 sync_logger.warning(f"跳过数据，找不到佛号经文: {chanting_title}")
                 skipped_count += 1
@@ -497,53 +595,48 @@ def sync_daily_stats(stats_data, result, user_id, is_first_sync=False):
             
             # 解析日期 - 支持多种格式
             try:
-                if isinstance(stat_date, str):
-                    # 支持多种日期格式
-                    date_formats = [
-                        '%Y-%m-%d',                    # 2025-08-30
-                        '%Y-%m-%dT%H:%M:%S.%f',        # 2025-08-30T00:00:00.000
-                        '%Y-%m-%dT%H:%M:%S',           # 2025-08-30T00:00:00
-                        '%Y-%m-%d %H:%M:%S'            # 2025-08-30 00:00:00
-                    ]
-                    
-                    stat_date_obj = None
-                    for fmt in date_formats:
-                        try:
-                            stat_date_obj = datetime.strptime(stat_date, fmt).date()
-                            break
-                        except ValueError:
-                            continue
-                    
-                    if stat_date_obj is None:
-                        raise ValueError(f"无法解析日期格式: {stat_date}")
-                else:
-                    stat_date_obj = stat_date
-                    
-                sync_logger.info(f"解析日期成功: {stat_date} -> {stat_date_obj}")
+                stat_date_obj = parse_stat_date(stat_date)
             except Exception as date_error:
                 sync_logger.warning(f"跳过数据，日期解析失败: {stat_date}, 错误: {date_error}")
                 skipped_count += 1
                 continue
             
-            # 直接创建新统计（无需检查存在性，因为已清理）
-            sync_logger.info(f"创建统计记录: 佛号ID={chanting.id}, 用户ID={user_id}, 日期={stat_date_obj}, 次数={count}")
-            new_stat = DailyStats(
-                chanting_id=chanting.id,
-                user_id=user_id,
-                count=count,
-                date=stat_date_obj,
-                created_at=parse_datetime(stat_data.get('created_at')),
-                updated_at=parse_datetime(stat_data.get('updated_at'))
-            )
-            db.session.add(new_stat)
-            synced_count += 1
-            sync_logger.info(f"统计记录创建成功")
+            key = (chanting.id, stat_date_obj)
+            if key in pending_stats:
+                skipped_count += 1
+            pending_stats[key] = {
+                'chanting_id': chanting.id,
+                'user_id': user_id,
+                'count': stat_data.get('count', 0),
+                'date': stat_date_obj,
+                'created_at': parse_datetime(stat_data.get('created_at')),
+                'updated_at': datetime.utcnow()
+            }
+        
+        # 数据已清理，但同步期间计数接口可能写入同一天的统计：先锁住这些统计再读原次数，
+        # 再以upsert写入（避免唯一约束冲突），修行汇总按锁定后的原次数更新
+        current = DailyStats.lock_counts(pending_stats.values(), batch_size)
+        
+        # 同步的计数是绝对值，锁住统计行后丢弃计数缓冲中同一统计尚未写入的增量，否则写入时会重复累加
+        DailyStatsBuffer.discard_many((user_id, chanting_id, stat_date) for chanting_id, stat_date in pending_stats)
         
+        writer = BulkWriter(DailyStats, batch_size, statement_builder=DailyStats.build_upsert)
+        for row in pending_stats.values():
+            writer.add(row)
+        
+        write_stats = writer.close()
+        DailyStats.refresh_summaries(
+            (user_id, chanting_id, stat_date, current.get((user_id, chanting_id, stat_date), 0), row['count'])
+            for (chanting_id, stat_date), row in pending_stats.items()
+        )
+        DAILY_STATS_WRITES.inc(len(pending_stats), source='sync')
         result['details']['daily_stats'] = {
-            'synced': synced_count,
-            'skipped': skipped_count
+            'synced': write_stats['rows_written'],
+            'skipped': skipped_count,
+            **write_stats
         }
-        sync_logger.info(f"每日统计同步完成: 新建 {synced_count}, 跳过 {skipped_count}")
+        sync_logger.info(f"每日统计同步完成: 新建 {write_stats['rows_written']}, 跳过 {skipped_count}, "
+                        f"写入速度 {write_stats['rows_per_second']} 行/秒")
     
     except Exception as e:
         sync_logger.error(f"同步每日统计失败: {str(e)}")
@@ -601,7 +694,7 @@ def sync_dedication_templates(templates_data, result, is_first_sync=False):
                 content=content,
                 is_built_in=False,  # 强制设为非内置
                 created_at=parse_datetime(template_data.get('created_at')),
-                updated_at=parse_datetime(template_data.get('updated_at'))
+                updated_at=datetime.utcnow()
             )
             db.session.add(new_template)
             synced_count += 1
@@ -615,6 +708,344 @@ def sync_dedication_templates(templates_data, result, is_first_sync=False):
     except Exception as e:
         sync_logger.error(f"同步回向模板失败: {str(e)}")
 
+def merge_dedications(dedications_data, result, user_id, resolver=None):
+    """增量合并回向数据：按客户端主键更新或创建，is_deleted为墓碑标记"""
+    try:
+        resolver = resolver or ChantingResolver(user_id)
+        synced_count = 0
+        updated_count = 0
+        deleted_count = 0
+        skipped_count = 0
+        
+        # 一次性取出本批涉及的已有回向
+        uuids = [get_client_uuid(item) for item in dedications_data if get_client_uuid(item)]
+        existing_map = {}
+        if uuids:
+            existing_map = {
+                dedication.client_uuid: dedication
+                for dedication in Dedication.query.filter(
+                    Dedication.user_id == user_id,
+                    Dedication.client_uuid.in_(uuids)
+                ).all()
+            }
+        
+        for dedication_data in dedications_data:
+            client_uuid = get_client_uuid(dedication_data)
+            title = dedication_data.get('title')
+            content = dedication_data.get('content')
+            
+            existing = existing_map.get(client_uuid) if client_uuid else None
+            if not existing and not client_uuid and title and content:
+                # 旧版app没有客户端主键，退回按标题和内容匹配
+                existing = Dedication.query.filter_by(
+                    user_id=user_id,
+                    title=title,
+                    content=content
+                ).first()
+            
+            # 墓碑：删除已有回向
+            if dedication_data.get('is_deleted'):
+                if existing:
+                    db.session.delete(existing)
+                    deleted_count += 1
+                else:
+                    skipped_count += 1
+                continue
+            
+            if not title or not content:
+                skipped_count += 1
+                continue
+            
+            # 查找关联的佛号经文
+            chanting_id = None
+            if dedication_data.get('chanting_title') and dedication_data.get('chanting_content'):
+                chanting = resolver.resolve(dedication_data['chanting_title'], dedication_data['chanting_content'])
+                if chanting:
+                    chanting_id = chanting.id
+            
+            if existing:
+                existing.title = title
+                existing.content = content
+                existing.chanting_id = chanting_id
+                existing.updated_at = datetime.utcnow()
+                updated_count += 1
+            else:
+                new_dedication = Dedication(
+                    title=title,
+                    content=content,
+                    chanting_id=chanting_id,
+                    user_id=user_id,
+                    client_uuid=client_uuid,
+                    created_at=parse_datetime(dedication_data.get('created_at')),
+                    updated_at=datetime.utcnow()
+                )
+                db.session.add(new_dedication)
+                if client_uuid:
+                    existing_map[client_uuid] = new_dedication
+                synced_count += 1
+        
+        result['details']['dedications'] = {
+            'synced': synced_count,
+            'updated': updated_count,
+            'deleted': deleted_count,
+            'skipped': skipped_count
+        }
+        sync_logger.info(f"回向数据增量合并完成: 新建 {synced_count}, 更新 {updated_count}, 删除 {deleted_count}, 跳过 {skipped_count}")
+    
+    except Exception as e:
+        sync_logger.error(f"增量合并回向数据失败: {str(e)}")
+
+def merge_chanting_records(records_data, result, user_id, resolver=None):
+    """增量合并修行记录：按客户端主键更新或创建，is_deleted为墓碑标记"""
+    try:
+        resolver = resolver or ChantingResolver(user_id)
+        synced_count = 0
+        updated_count = 0
+        deleted_count = 0
+        skipped_count = 0
+        
+        # 一次性取出本批涉及的已有记录
+        uuids = [get_client_uuid(item) for item in records_data if get_client_uuid(item)]
+        existing_map = {}
+        if uuids:
+            existing_map = {
+                record.client_uuid: record
+                for record in ChantingRecord.query.filter(
+                    ChantingRecord.user_id == user_id,
+                    ChantingRecord.client_uuid.in_(uuids)
+                ).all()
+            }
+        
+        for record_data in records_data:
+            client_uuid = get_client_uuid(record_data)
+            chanting_title = record_data.get('chanting_title')
+            chanting_content = record_data.get('chanting_content')
+            
+            chanting = None
+            if chanting_title and chanting_content:
+                chanting = resolver.resolve(chanting_title, chanting_content)
+            
+            existing = existing_map.get(client_uuid) if client_uuid else None
+            if not existing and not client_uuid and chanting:
+                # 旧版app没有客户端主键，退回按佛号经文和创建时间匹配
+                existing = ChantingRecord.query.filter_by(
+                    user_id=user_id,
+                    chanting_id=chanting.id,
+                    created_at=parse_datetime(record_data.get('created_at'))
+                ).first()
+            
+            # 墓碑：删除已有记录
+            if record_data.get('is_deleted'):
+                if existing:
+                    db.session.delete(existing)
+                    deleted_count += 1
+                else:
+                    skipped_count += 1
+                continue
+            
+            if not chanting:
+                sync_logger.warning(f"找不到对应的佛号经文: {chanting_title}")
+                skipped_count += 1
+                continue
+            
+            if existing:
+                existing.chanting_id = chanting.id
+                existing.updated_at = datetime.utcnow()
+                updated_count += 1
+            else:
+                new_record = ChantingRecord(
+                    chanting_id=chanting.id,
+                    user_id=user_id,
+                    client_uuid=client_uuid,
+                    created_at=parse_datetime(record_data.get('created_at')),
+                    updated_at=datetime.utcnow()
+                )
+                db.session.add(new_record)
+                if client_uuid:
+                    existing_map[client_uuid] = new_record
+                synced_count += 1
+        
+        result['details']['chanting_records'] = {
+            'synced': synced_count,
+            'updated': updated_count,
+            'deleted': deleted_count,
+            'skipped': skipped_count
+        }
+        sync_logger.info(f"修行记录增量合并完成: 新建 {synced_count}, 更新 {updated_count}, 删除 {deleted_count}, 跳过 {skipped_count}")
+    
+    except Exception as e:
+        sync_logger.error(f"增量合并修行记录失败: {str(e)}")
+
+def merge_daily_stats(stats_data, result, user_id, resolver=None, batch_size=None):
+    """增量合并每日统计：按 (佛号经文, 日期) upsert，is_deleted为墓碑标记"""
+    try:
+        resolver = resolver or ChantingResolver(user_id)
+        pending_stats = {}  # (佛号经文ID, 日期) -> 待upsert的行
+        deleted_stats = []  # 墓碑删除的统计，写入后更新其修行汇总
+        synced_count = 0
+        updated_count = 0
+        deleted_count = 0
+        skipped_count = 0
+        
+        # 先解析日期，再一次性取出并锁住这些日期的已有统计（墓碑删除按锁定时的次数更新汇总）
+        parsed_rows = []
+        for stat_data in stats_data:
+            try:
+                stat_date_obj = parse_stat_date(stat_data.get('date'))
+            except Exception as date_error:
+                sync_logger.warning(f"跳过数据，日期解析失败: {stat_data.get('date')}, 错误: {date_error}")
+                skipped_count += 1
+                continue
+            parsed_rows.append((stat_data, stat_date_obj))
+        
+        existing_map = {}
+        stat_dates = {stat_date_obj for _, stat_date_obj in parsed_rows}
+        if stat_dates:
+            existing_map = {
+                (stat.chanting_id, stat.date): stat
+                for stat in DailyStats.query.filter(
+                    DailyStats.user_id == user_id,
+                    DailyStats.date.in_(stat_dates)
+                ).populate_existing().with_for_update().all()
+            }
+        
+        for stat_data, stat_date_obj in parsed_rows:
+            chanting_title = stat_data.get('chanting_title')
+            chanting_content = stat_data.get('chanting_content')
+            if not chanting_title or not chanting_content:
+                skipped_count += 1
+                continue
+            
+            chanting = resolver.resolve(chanting_title, chanting_content)
+            if not chanting:
+                sync_logger.warning(f"跳过数据，找不到佛号经文: {chanting_title}")
+                skipped_count += 1
+                continue
+            
+            key = (chanting.id, stat_date_obj)
+            existing = existing_map.get(key)
+            
+            # 墓碑：删除已有统计
+            if stat_data.get('is_deleted'):
+                if existing:
+                    db.session.delete(existing)
+                    deleted_stats.append(existing)
+                    existing_map.pop(key)
+                    pending_stats.pop(key, None)
+                    deleted_count += 1
+                else:
+                    skipped_count += 1
+                continue
+            
+            if existing or key in pending_stats:
+                updated_count += 1
+            else:
+                synced_count += 1
+            pending_stats[key] = {
+                'chanting_id': chanting.id,
+                'user_id': user_id,
+                'count': stat_data.get('count', 0),
+                'date': stat_date_obj,
+                'created_at': parse_datetime(stat_data.get('created_at')),
+                'updated_at': datetime.utcnow()
+            }
+        
+        # 先执行墓碑删除，再锁住待写入的统计、读取原次数，最后以upsert写入新建和更新的统计
+        db.session.flush()
+        previous_counts = DailyStats.lock_counts(pending_stats.values(), batch_size)
+        
+        # 同步的计数是绝对值，锁住统计行后，删除和覆盖的统计都丢弃计数缓冲中尚未写入的增量
+        DailyStatsBuffer.discard_many(
+            [(user_id, stat.chanting_id, stat.date) for stat in deleted_stats] +
+            [(user_id, chanting_id, stat_date) for chanting_id, stat_date in pending_stats]
+        )
+        writer = BulkWriter(DailyStats, batch_size, statement_builder=DailyStats.build_upsert)
+        for row in pending_stats.values():
+            writer.add(row)
+        writer.close()
+        # 先删除再写入，汇总的变化按同样的顺序应用
+        DailyStats.refresh_summaries(
+            [(user_id, stat.chanting_id, stat.date, stat.count, 0) for stat in deleted_stats] +
+            [(user_id, chanting_id, stat_date, previous_counts.get((user_id, chanting_id, stat_date), 0), row['count'])
+             for (chanting_id, stat_date), row in pending_stats.items()]
+        )
+        DAILY_STATS_WRITES.inc(len(pending_stats), source='sync')
+        DAILY_STATS_WRITES.inc(len(deleted_stats), source='sync_delete')
+        
+        result['details']['daily_stats'] = {
+            'synced': synced_count,
+            'updated': updated_count,
+            'deleted': deleted_count,
+            'skipped': skipped_count
+        }
+        sync_logger.info(f"每日统计增量合并完成: 新建 {synced_count}, 更新 {updated_count}, 删除 {deleted_count}, 跳过 {skipped_count}")
+    
+    except Exception as e:
+        sync_logger.error(f"增量合并每日统计失败: {str(e)}")
+
+def get_sync_batch_size():
+    """获取批量同步的批次大小（sync_batch_size配置）"""
+    try:
+        return max(int(SyncConfig.get_config('sync_batch_size', BulkWriter.DEFAULT_BATCH_SIZE)), 1)
+    except (TypeError, ValueError):
+        return BulkWriter.DEFAULT_BATCH_SIZE
+
+def is_async_upload(data):
+    """是否请求异步处理上传（请求体 async=true 或查询参数 ?async=1）"""
+    if data.get('async') is True:
+        return True
+    return request.args.get('async', '').lower() in ('1', 'true', 'yes')
+
+def authenticate_sync_user(data):
+    """JWT或请求体用户名密码认证，返回用户对象，失败返回None"""
+    try:
+        from flask_jwt_extended import verify_jwt_in_request
+        verify_jwt_in_request()
+        user = User.query.get(get_jwt_identity())
+        if user and not user.is_deleted:
+            return user
+    except Exception as e:
+        sync_logger.info(f"JWT认证失败: {str(e)}")
+    
+    auth_info = (data or {}).get('auth', {})
+    username = auth_info.get('username')
+    password = auth_info.get('password')
+    if not username or not password:
+        return None
+    
+    from utils.crypto_utils import CryptoUtils
+    user = User.query.filter_by(username=username, is_deleted=False).first()
+    if user and CryptoUtils.verify_password(password, user.password):
+        return user
+    return None
+
+def get_client_uuid(item):
+    """获取app端数据的稳定主键（uuid），没有则返回None"""
+    client_uuid = item.get('uuid') or item.get('client_uuid')
+    return str(client_uuid) if client_uuid else None
+
+def parse_stat_date(stat_date):
+    """解析统计日期 - 支持多种格式"""
+    if not stat_date:
+        raise ValueError("日期为空")
+    
+    if not isinstance(stat_date, str):
+        return stat_date
+    
+    date_formats = [
+        '%Y-%m-%d',                    # 2025-08-30
+        '%Y-%m-%dT%H:%M:%S.%f',        # 2025-08-30T00:00:00.000
+        '%Y-%m-%dT%H:%M:%S',           # 2025-08-30T00:00:00
+        '%Y-%m-%d %H:%M:%S'            # 2025-08-30 00:00:00
+    ]
+    for fmt in date_formats:
+        try:
+            return datetime.strptime(stat_date, fmt).date()
+        except ValueError:
+            continue
+    
+    raise ValueError(f"无法解析日期格式: {stat_date}")
+
 def parse_datetime(datetime_str):
     """解析日期时间字符串"""
     if not datetime_str:
@@ -634,25 +1065,84 @@ def _clear_user_data(user_id, incoming_data, logger):
         
         # 只清理app端上传的数据类型
         if 'dedications' in incoming_data:
-            # 清理回向数据
+            # 清理回向数据，本次未重新上传的回向记录删除标记
+            existing_payloads = [
+                SyncTombstone.dedication_payload(client_uuid, title, content)
+                for client_uuid, title, content in db.session.query(
+                    Dedication.client_uuid, Dedication.title, Dedication.content
+                ).filter(Dedication.user_id == user_id)
+            ]
+            incoming_payloads = [
+                SyncTombstone.dedication_payload(get_client_uuid(item), item.get('title'), item.get('content'))
+                for item in incoming_data['dedications']
+            ]
+            record_cleared_tombstones(user_id, 'dedications', existing_payloads, incoming_payloads)
             deleted_count = db.session.query(Dedication).filter_by(user_id=user_id).delete()
             cleared_counts['dedications'] = deleted_count
             logger.info(f"清理用户回向数据: {deleted_count} 条")
         
         if 'chanting_records' in incoming_data:
-            # 清理修行记录
+            # 清理修行记录，本次未重新上传的记录删除标记
+            existing_payloads = [
+                SyncTombstone.chanting_record_payload(client_uuid, title, content, created_at)
+                for client_uuid, created_at, title, content in db.session.query(
+                    ChantingRecord.client_uuid, ChantingRecord.created_at, Chanting.title, Chanting.content
+                ).outerjoin(Chanting, ChantingRecord.chanting_id == Chanting.id).filter(ChantingRecord.user_id == user_id)
+            ]
+            incoming_payloads = [
+                SyncTombstone.chanting_record_payload(
+                    get_client_uuid(item), item.get('chanting_title'), item.get('chanting_content'),
+                    to_naive_utc(parse_datetime(item.get('created_at'))) if item.get('created_at') else None
+                )
+                for item in incoming_data['chanting_records']
+            ]
+            record_cleared_tombstones(user_id, 'chanting_records', existing_payloads, incoming_payloads)
             deleted_count = db.session.query(ChantingRecord).filter_by(user_id=user_id).delete()
             cleared_counts['chanting_records'] = deleted_count
             logger.info(f"清理用户修行记录: {deleted_count} 条")
         
         if 'daily_stats' in incoming_data:
-            # 清理每日统计
+            # 清理每日统计，本次未重新上传的统计记录删除标记
+            existing_stats = db.session.query(DailyStats.date, DailyStats.count, Chanting.title, Chanting.content).outerjoin(
+                Chanting, DailyStats.chanting_id == Chanting.id
+            ).filter(DailyStats.user_id == user_id).all()
+            cleared_deltas = {}
+            for stat_date, count, _, _ in existing_stats:
+                cleared_deltas[stat_date] = cleared_deltas.get(stat_date, 0) - (count or 0)
+            incoming_payloads = []
+            for item in incoming_data['daily_stats']:
+                try:
+                    incoming_payloads.append(SyncTombstone.daily_stats_payload(
+                        item.get('chanting_title'), item.get('chanting_content'), parse_stat_date(item.get('date'))
+                    ))
+                except Exception:
+                    continue
+            record_cleared_tombstones(user_id, 'daily_stats', [
+                SyncTombstone.daily_stats_payload(title, content, stat_date)
+                for stat_date, _, title, content in existing_stats
+            ], incoming_payloads)
             deleted_count = db.session.query(DailyStats).filter_by(user_id=user_id).delete()
+            PracticeSummary.delete_for_user(user_id)
+            StatsRollup.apply_deltas(cleared_deltas)
+            PracticeHeatmap.refresh_user(user_id)
             cleared_counts['daily_stats'] = deleted_count
             logger.info(f"清理用户每日统计: {deleted_count} 条")
         
         if 'chantings' in incoming_data:
-            # 清理用户创建的佛号经文（不清理内置内容）
+            # 清理用户创建的佛号经文（不清理内置内容），本次未重新上传的记录删除标记
+            existing_payloads = [
+                SyncTombstone.chanting_payload(title, content)
+                for title, content in db.session.query(Chanting.title, Chanting.content).filter(
+                    Chanting.user_id == user_id,
+                    Chanting.is_built_in == False,
+                    Chanting.is_deleted == False
+                )
+            ]
+            incoming_payloads = [
+                SyncTombstone.chanting_payload(item.get('title'), item.get('content'))
+                for item in incoming_data['chantings']
+            ]
+            record_cleared_tombstones(user_id, 'chantings', existing_payloads, incoming_payloads)
             deleted_count = db.session.query(Chanting).filter(
                 Chanting.user_id == user_id,
                 Chanting.is_built_in == False
@@ -672,11 +1162,29 @@ def _clear_user_data(user_id, incoming_data, logger):
         db.session.rollback()
         raise e
 
+def record_cleared_tombstones(user_id, data_type, existing_payloads, incoming_payloads):
+    """替换式同步清理的数据中，app本次没有重新上传的才记录删除标记"""
+    incoming_keys = {SyncTombstone.compute_client_key(payload) for payload in incoming_payloads}
+    SyncTombstone.record(user_id, data_type, (
+        payload for payload in existing_payloads
+        if SyncTombstone.compute_client_key(payload) not in incoming_keys
+    ))
+
+def to_naive_utc(value):
+    """带时区的时间转换为不带时区的UTC时间，与数据库中保存的格式一致"""
+    if isinstance(value, datetime) and value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
 @sync_bp.route('/download', methods=['POST'])
 def download_data():
     """
     提供数据下载服务，将服务器数据发送给app
     支持多种认证方式：JWT token 或 请求体中的用户名密码（与上传保持一致）
+    响应以流式JSON输出；请求体可带 since（ISO时间）或 cursor（上次返回的next_cursor）只下载变更数据，
+    此时 data.deleted 返回期间服务端删除的数据（在其他数据之前输出，app应先删除再合并），
+    tombstones_expired 为真时删除标记已超过保留期，app需要不带游标全量下载；
+    带 catalog_version 时若内置内容目录未变化，则不再返回内置佛号经文和回向模板
     """
     try:
         sync_logger.info("=== 开始处理数据下载请求 ===")
@@ -725,16 +1233,36 @@ def download_data():
             sync_logger.warning("所有认证方式都失败，返回认证失败")
             return jsonify({'status': 'error', 'message': 'authentication failed'}), 401
         
-        result = {
+        # 增量下载：只返回since之后变更的数据，未提供时返回全部数据
+        data = request.get_json(silent=True) or {}
+        try:
+            since = parse_download_since(data)
+        except ValueError:
+            sync_logger.warning(f"无效的下载游标: since={data.get('since')}, cursor={data.get('cursor')}")
+            return jsonify({'status': 'error', 'message': 'invalid since or cursor'}), 400
+        
+        # 查询前记录截止时间，回退一段时间后作为下一次的游标，查询期间变更的数据下次会再次返回（重复下载无害）
+        snapshot_at = datetime.utcnow()
+        
+        # 内置内容目录：客户端提供的目录版本与当前一致时，只返回"未变化"标记
+        catalog = CatalogCache.get_catalog()
+        client_catalog_version = data.get('catalog_version')
+        catalog_unchanged = client_catalog_version is not None and str(client_catalog_version) == str(catalog['version'])
+        
+        header = {
             'status': 'success',
             'message': 'data downloaded',
-            'data': {},
             'user_id': user_id,
-            'timestamp': datetime.utcnow().isoformat()
+            'timestamp': snapshot_at.isoformat(),
+            'since': since.isoformat() if since else None,
+            'next_cursor': encode_download_cursor(snapshot_at - DOWNLOAD_CURSOR_OVERLAP),
+            'tombstones_expired': since is not None and SyncTombstone.is_expired(since),
+            'catalog_version': catalog['version'],
+            'catalog_unchanged': catalog_unchanged
         }
         
         # 只获取当前用户数据
-        result['data']['users'] = [{
+        users_data = [{
             'username': current_user.username,
             'password': current_user.password,
             'avatar': current_user.avatar,
@@ -743,110 +1271,217 @@ def download_data():
             'created_at': current_user.created_at.isoformat() if current_user.created_at else None
         }]
         
-        # 获取佛号经文数据（内置 + 用户自己创建的）
-        chantings = Chanting.query.filter(
-            db.and_(
-                Chanting.is_deleted == False,
-                db.or_(
-                    Chanting.is_built_in == True,  # 内置内容
-                    Chanting.user_id == user_id   # 用户创建的内容
-                )
-            )
-        ).all()
-        result['data']['chantings'] = []
-        for chanting in chantings:
-            chanting_data = {
-                'title': chanting.title,
-                'content': chanting.content,
-                'pronunciation': chanting.pronunciation,
-                'type': chanting.type,
-                'is_built_in': chanting.is_built_in,
-                'created_at': chanting.created_at.isoformat() if chanting.created_at else None,
-                'updated_at': chanting.updated_at.isoformat() if chanting.updated_at else None
-            }
-            
-            # 获取用户信息
-            if chanting.user_id:
-                user = User.query.get(chanting.user_id)
-                chanting_data['username'] = user.username if user else None
-            else:
-                chanting_data['username'] = None
-                
-            result['data']['chantings'].append(chanting_data)
+        sync_logger.info(f"用户 {current_user.username} 开始流式下载，since={header['since']}, "
+                         f"目录版本={catalog['version']}, 目录未变化={catalog_unchanged}")
+        
+        return Response(
+            stream_with_context(measure_download(generate_download(
+                header, users_data, user_id, current_user.username, since, catalog, catalog_unchanged
+            ))),
+            mimetype='application/json'
+        )
+    
+    except Exception as e:
+        sync_logger.error(f"数据下载失败: {str(e)}")
+        return jsonify({
+            'status': 'error',
+            'message': 'download failed',
+            'error': str(e)
+        }), 500
+
+def generate_download(header, users_data, user_id, username, since=None, catalog=None, catalog_unchanged=False):
+    """
+    逐段输出下载数据的JSON，各数据类型使用服务端游标分批读取
+    输出格式与原一次性返回的结构一致：头部字段 + data对象
+    """
+    counts = {'users': len(users_data)}
+    try:
+        yield json.dumps(header)[:-1] + ', "data": {"users": ' + json.dumps(users_data)
+        
+        for key, rows in iter_download_sections(user_id, since, catalog, catalog_unchanged):
+            yield f', "{key}": ['
+            count = 0
+            chunk = []
+            for row in rows:
+                # 共享目录中的数据已经序列化
+                chunk.append(row if isinstance(row, str) else json.dumps(row))
+                if len(chunk) >= DOWNLOAD_CHUNK_SIZE:
+                    yield (',' if count else '') + ','.join(chunk)
+                    count += len(chunk)
+                    chunk = []
+            if chunk:
+                yield (',' if count else '') + ','.join(chunk)
+                count += len(chunk)
+            yield ']'
+            counts[key] = count
         
-        # 获取用户的回向数据（包含关联的佛号经文信息）
-        dedications = db.session.query(Dedication, Chanting).outerjoin(
-            Chanting, Dedication.chanting_id == Chanting.id
-        ).filter(Dedication.user_id == user_id).all()
-        result['data']['dedications'] = [{
+        yield '}}'
+        sync_logger.info(f"用户 {username} 数据下载完成，返回数据量: {counts}")
+        for key, count in counts.items():
+            SYNC_ROWS.observe(count, direction='download', data_type=key)
+    
+    except Exception as e:
+        # 响应头已发送，无法再返回错误状态，只记录日志（客户端会收到不完整的JSON）
+        sync_logger.error(f"数据下载失败: {str(e)}")
+        raise
+
+def measure_download(chunks):
+    """将下载输出编码为字节，完整输出后记录响应体大小"""
+    size = 0
+    for chunk in chunks:
+        data = chunk.encode('utf-8')
+        size += len(data)
+        yield data
+    SYNC_PAYLOAD_BYTES.observe(size, direction='download')
+
+def iter_download_sections(user_id, since=None, catalog=None, catalog_unchanged=False):
+    """
+    按输出顺序返回 (数据类型, 行数据迭代器)
+    增量下载时先输出删除标记；内置佛号经文和回向模板来自共享目录缓存，客户端目录版本一致时不再输出
+    """
+    if since:
+        yield 'deleted', (tombstone.to_dict() for tombstone in SyncTombstone.get_since(user_id, since))
+    built_in_chantings = [] if catalog_unchanged else iter_catalog_rows(catalog['chantings'], since)
+    yield 'chantings', chain(built_in_chantings, iter_download_chantings(user_id, since))
+    yield 'dedications', iter_download_dedications(user_id, since)
+    yield 'chanting_records', iter_download_chanting_records(user_id, since)
+    yield 'daily_stats', iter_download_daily_stats(user_id, since)
+    if not catalog_unchanged:
+        yield 'dedication_templates', iter_catalog_rows(catalog['dedication_templates'], since)
+
+def iter_download_chantings(user_id, since=None):
+    """用户自己创建的佛号经文（内置内容来自共享目录），创建者用户名通过外连接一并查出"""
+    query = db.session.query(Chanting, User.username).outerjoin(
+        User, Chanting.user_id == User.id
+    ).filter(
+        db.and_(
+            Chanting.is_deleted == False,
+            Chanting.is_built_in == False,
+            Chanting.user_id == user_id
+        )
+    )
+    if since:
+        query = query.filter(Chanting.updated_at > since)
+    
+    for chanting, username in query.order_by(Chanting.id).yield_per(DOWNLOAD_CHUNK_SIZE):
+        yield serialize_chanting(chanting, username)
+
+def iter_download_dedications(user_id, since=None):
+    """用户的回向数据（包含关联的佛号经文信息）"""
+    query = db.session.query(Dedication, Chanting).outerjoin(
+        Chanting, Dedication.chanting_id == Chanting.id
+    ).filter(Dedication.user_id == user_id)
+    if since:
+        query = query.filter(Dedication.updated_at > since)
+    
+    for dedication, chanting in query.order_by(Dedication.id).yield_per(DOWNLOAD_CHUNK_SIZE):
+        yield {
+            'uuid': dedication.client_uuid,
             'title': dedication.title,
             'content': dedication.content,
             'chanting_title': chanting.title if chanting else None,
             'chanting_content': chanting.content if chanting else None,
             'created_at': dedication.created_at.isoformat() if dedication.created_at else None,
             'updated_at': dedication.updated_at.isoformat() if dedication.updated_at else None
-        } for dedication, chanting in dedications]
-        
-        # 获取用户的修行记录（包含关联的佛号经文信息）
-        records = db.session.query(ChantingRecord, Chanting).join(
-            Chanting, ChantingRecord.chanting_id == Chanting.id
-        ).filter(
-            db.and_(
-                ChantingRecord.user_id == user_id,
-                Chanting.is_deleted == False
-            )
-        ).all()
-        result['data']['chanting_records'] = [{
+        }
+
+def iter_download_chanting_records(user_id, since=None):
+    """用户的修行记录（包含关联的佛号经文信息）"""
+    query = db.session.query(ChantingRecord, Chanting).join(
+        Chanting, ChantingRecord.chanting_id == Chanting.id
+    ).filter(
+        db.and_(
+            ChantingRecord.user_id == user_id,
+            Chanting.is_deleted == False
+        )
+    )
+    if since:
+        query = query.filter(ChantingRecord.updated_at > since)
+    
+    for record, chanting in query.order_by(ChantingRecord.id).yield_per(DOWNLOAD_CHUNK_SIZE):
+        yield {
+            'uuid': record.client_uuid,
             'chanting_title': chanting.title,
             'chanting_content': chanting.content,
             'created_at': record.created_at.isoformat() if record.created_at else None,
             'updated_at': record.updated_at.isoformat() if record.updated_at else None
-        } for record, chanting in records]
-        
-        # 获取用户的每日统计（包含关联的佛号经文信息）
-        stats = db.session.query(DailyStats, Chanting).join(
-            Chanting, DailyStats.chanting_id == Chanting.id
-        ).filter(
-            db.and_(
-                DailyStats.user_id == user_id,
-                Chanting.is_deleted == False
-            )
-        ).all()
-        result['data']['daily_stats'] = [{
+        }
+
+def iter_download_daily_stats(user_id, since=None):
+    """用户的每日统计（包含关联的佛号经文信息）"""
+    query = db.session.query(DailyStats, Chanting).join(
+        Chanting, DailyStats.chanting_id == Chanting.id
+    ).filter(
+        db.and_(
+            DailyStats.user_id == user_id,
+            Chanting.is_deleted == False
+        )
+    )
+    if since:
+        query = query.filter(DailyStats.updated_at > since)
+    
+    for stat, chanting in query.order_by(DailyStats.id).yield_per(DOWNLOAD_CHUNK_SIZE):
+        yield {
             'chanting_title': chanting.title,
             'chanting_content': chanting.content,
             'count': stat.count,
             'date': stat.date.isoformat() if stat.date else None,
             'created_at': stat.created_at.isoformat() if stat.created_at else None,
             'updated_at': stat.updated_at.isoformat() if stat.updated_at else None
-        } for stat, chanting in stats]
-        
-        # 获取所有回向模板（模板是全局共享的）
-        templates = DedicationTemplate.query.all()
-        result['data']['dedication_templates'] = [{
-            'title': template.title,
-            'content': template.content,
-            'is_built_in': template.is_built_in,
-            'created_at': template.created_at.isoformat() if template.created_at else None,
-            'updated_at': template.updated_at.isoformat() if template.updated_at else None
-        } for template in templates]
-        
-        sync_logger.info(f"用户 {current_user.username} 数据下载完成，返回数据量: users=1, "
-                        f"chantings={len(result['data']['chantings'])}, "
-                        f"dedications={len(result['data']['dedications'])}, "
-                        f"records={len(result['data']['chanting_records'])}, "
-                        f"stats={len(result['data']['daily_stats'])}, "
-                        f"templates={len(result['data']['dedication_templates'])}")
-        
-        return jsonify(result), 200
+        }
+
+def encode_download_cursor(snapshot_at):
+    """将下载截止时间编码为不透明游标"""
+    return base64.urlsafe_b64encode(snapshot_at.isoformat().encode('utf-8')).decode('ascii')
+
+def parse_download_since(data):
+    """
+    解析下载起点：cursor（上次返回的next_cursor）优先，其次since时间戳
+    返回不带时区的UTC时间，未提供时返回None，格式错误抛出ValueError
+    """
+    cursor = data.get('cursor')
+    since = data.get('since')
+    if cursor:
+        try:
+            since = base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8')
+        except Exception:
+            raise ValueError(f"无效的游标: {cursor}")
+    if not since:
+        return None
     
-    except Exception as e:
-        sync_logger.error(f"数据下载失败: {str(e)}")
-        return jsonify({
-            'status': 'error',
-            'message': 'download failed',
-            'error': str(e)
-        }), 500
+    since_at = datetime.fromisoformat(str(since).replace('Z', '+00:00'))
+    if since_at.tzinfo is not None:
+        since_at = since_at.astimezone(timezone.utc).replace(tzinfo=None)
+    return since_at
+
+@sync_bp.route('/jobs/<int:job_id>', methods=['GET', 'POST'])
+def get_sync_job(job_id):
+    """
+    查询异步上传任务的状态和进度
+    支持JWT（GET）或请求体中的用户名密码（POST）认证
+    """
+    current_user = authenticate_sync_user(request.get_json(silent=True) or {})
+    if not current_user:
+        return jsonify({'status': 'error', 'message': 'authentication failed'}), 401
+    
+    sync_record = SyncRecord.query.filter_by(id=job_id, user_id=current_user.id).first()
+    if not sync_record or not sync_record.job_status:
+        return jsonify({'status': 'error', 'message': 'job not found'}), 404
+    
+    return jsonify({
+        'status': 'success',
+        'job': {
+            'job_id': sync_record.id,
+            'job_status': sync_record.job_status,
+            'progress': sync_record.job_progress or 0,
+            'sync_type': sync_record.sync_type,
+            'sync_status': sync_record.sync_status,
+            'details': sync_record.get_result_details(),
+            'error_message': sync_record.error_message,
+            'sync_started_at': sync_record.sync_started_at.isoformat() if sync_record.sync_started_at else None,
+            'sync_completed_at': sync_record.sync_completed_at.isoformat() if sync_record.sync_completed_at else None
+        }
+    }), 200
 
 @sync_bp.route('/health', methods=['GET'])
 def sync_health():
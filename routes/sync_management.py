@@ -1,11 +1,13 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, Response
+from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, Response, abort
 from flask_login import login_required, current_user
 from datetime import datetime, timedelta
 from database import db
 from models.sync_record import SyncRecord
 from models.sync_config import SyncConfig
 from models.user import User
-from sqlalchemy import desc, func
+from sqlalchemy import desc
+from utils.keyset_pagination import keyset_paginate
+from utils.stats_snapshot import get_sync_stats_snapshot
 import json
 import csv
 import io
@@ -59,7 +61,7 @@ def get_config_rate_limit(config_key, limit_key):
 @login_required
 def sync_records():
     """同步记录管理页面"""
-    page = request.args.get('page', 1, type=int)
+    cursor = request.args.get('cursor')
     per_page = request.args.get('per_page', 20, type=int)
     
     # 限制每页最大数量，防止性能问题
@@ -76,7 +78,7 @@ def sync_records():
     # 构建查询
     query = db.session.query(SyncRecord, User).join(
         User, SyncRecord.user_id == User.id
-    ).order_by(desc(SyncRecord.sync_started_at))
+    )
     
     # 应用过滤条件
     if user_id:
@@ -90,20 +92,23 @@ def sync_records():
     if date_to:
         query = query.filter(SyncRecord.sync_started_at <= datetime.strptime(date_to, '%Y-%m-%d') + timedelta(days=1))
     
-    # 分页
-    pagination = query.paginate(
-        page=page, 
-        per_page=per_page, 
-        error_out=False
-    )
+    # 如果是导出请求
+    if request.args.get('export') == 'csv':
+        return export_sync_records_csv(query.order_by(desc(SyncRecord.sync_started_at)))
+    
+    # 按 (开始时间, id) 游标分页
+    def sync_record_key(row):
+        return row[0].sync_started_at, row[0].id
+    
+    try:
+        pagination = keyset_paginate(query, SyncRecord.sync_started_at, SyncRecord.id,
+                                     cursor=cursor, per_page=per_page, key=sync_record_key)
+    except ValueError:
+        abort(400, description='无效的分页游标')
     
     # 获取用户列表用于筛选
     users = User.query.filter_by(is_deleted=False).all()
     
-    # 如果是导出请求
-    if request.args.get('export') == 'csv':
-        return export_sync_records_csv(query)
-    
     # 如果是AJAX请求，只返回表格部分
     if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
         return render_template('sync_management/records_table.html',
@@ -576,62 +581,17 @@ def api_record_details(record_id):
         'sync_status': record.sync_status,
         'sync_data_types': record.sync_data_types,
         'error_message': record.error_message,
+        'result_details': record.get_result_details(),
+        'job_status': record.job_status,
+        'job_progress': record.job_progress,
         'sync_started_at': record.sync_started_at.isoformat() if record.sync_started_at else None,
         'sync_completed_at': record.sync_completed_at.isoformat() if record.sync_completed_at else None,
         'duration': str(record.sync_completed_at - record.sync_started_at) if record.sync_completed_at and record.sync_started_at else None
     })
 
 def get_sync_stats():
-    """获取同步统计信息"""
-    now = datetime.utcnow()
-    today = now.date()
-    week_ago = now - timedelta(days=7)
-    month_ago = now - timedelta(days=30)
-    
-    # 总统计
-    total_records = SyncRecord.query.count()
-    success_records = SyncRecord.query.filter_by(sync_status='success').count()
-    failed_records = SyncRecord.query.filter_by(sync_status='failed').count()
-    
-    # 今日统计
-    today_records = SyncRecord.query.filter(
-        func.date(SyncRecord.sync_started_at) == today
-    ).count()
-    
-    # 7天统计
-    week_records = SyncRecord.query.filter(
-        SyncRecord.sync_started_at >= week_ago
-    ).count()
-    
-    # 30天统计
-    month_records = SyncRecord.query.filter(
-        SyncRecord.sync_started_at >= month_ago
-    ).count()
-    
-    # 活跃用户
-    active_users = db.session.query(func.count(func.distinct(SyncRecord.user_id))).filter(
-        SyncRecord.sync_started_at >= week_ago
-    ).scalar()
-    
-    # 设备数量
-    active_devices = db.session.query(func.count(func.distinct(SyncRecord.device_id))).filter(
-        SyncRecord.sync_started_at >= week_ago
-    ).scalar()
-    
-    # 成功率
-    success_rate = (success_records / total_records * 100) if total_records > 0 else 0
-    
-    return {
-        'total_records': total_records,
-        'success_records': success_records,
-        'failed_records': failed_records,
-        'success_rate': round(success_rate, 2),
-        'today_records': today_records,
-        'week_records': week_records,
-        'month_records': month_records,
-        'active_users': active_users,
-        'active_devices': active_devices
-    }
+    """获取同步统计信息（短时缓存的统计快照）"""
+    return get_sync_stats_snapshot()
 
 def export_sync_records_csv(query):
     """导出同步记录为CSV文件"""
@@ -656,7 +616,7 @@ def export_sync_records_csv(query):
             
         sync_type_map = {'full': '全量同步', 'incremental': '增量同步'}
         sync_direction_map = {'upload': '上传', 'download': '下载', 'bidirectional': '双向'}
-        sync_status_map = {'success': '成功', 'failed': '失败', 'partial': '部分成功'}
+        sync_status_map = {'success': '成功', 'failed': '失败', 'partial': '部分成功', 'pending': '处理中'}
         
         writer.writerow([
             record.id,
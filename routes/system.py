@@ -1,9 +1,12 @@
-from flask import Blueprint, jsonify, current_app
-from flask_login import login_required
-from utils.db_monitor import DatabaseMonitor
+from flask import Blueprint, Response, jsonify, current_app, request
+from flask_login import login_required, current_user
+from utils.db_monitor import DatabaseMonitor, DatabaseHealth
+from utils.slow_query_log import SlowQueryLog
+from utils.metrics import MetricsRegistry, CONTENT_TYPE as METRICS_CONTENT_TYPE
 from utils.config_loader import config_loader
 from database import db
 import psutil
+import hmac
 import os
 from datetime import datetime
 
@@ -11,8 +14,9 @@ system_bp = Blueprint('system', __name__)
 
 @system_bp.route('/health')
 def health_check():
-    """系统健康检查"""
-    db_health = DatabaseMonitor.check_health()
+    """系统健康检查（数据库状态取后台检查的缓存结果，不额外查询数据库）"""
+    DatabaseHealth.ensure_thread()
+    db_health = DatabaseHealth.is_available()
     pool_status = DatabaseMonitor.get_pool_status()
     
     return jsonify({
@@ -20,6 +24,7 @@ def health_check():
         'timestamp': datetime.utcnow().isoformat(),
         'database': {
             'connected': db_health,
+            'circuit_breaker': DatabaseHealth.get_status(),
             'pool': pool_status
         },
         'system': {
@@ -66,6 +71,49 @@ def reset_db_pool():
             'timestamp': datetime.utcnow().isoformat()
         }), 500
 
+@system_bp.route('/metrics')
+def metrics():
+    """Prometheus格式的运行指标（需要METRICS_TOKEN对应的Bearer令牌，或已登录后台）"""
+    token = current_app.config.get('METRICS_TOKEN')
+    authorization = request.headers.get('Authorization', '')
+    token_valid = bool(token) and hmac.compare_digest(authorization.encode('utf-8'), f'Bearer {token}'.encode('utf-8'))
+    if not token_valid and not current_user.is_authenticated:
+        return jsonify({'error': 'unauthorized'}), 401
+    
+    return Response(MetricsRegistry.render(), content_type=METRICS_CONTENT_TYPE)
+
+@system_bp.route('/slow-queries')
+@login_required
+def slow_queries():
+    """最近的慢查询及执行计划（需要登录）
+
+    参数 order=recent|duration，limit=返回条数（默认50，最多为缓冲大小），plan=0 时不返回执行计划
+    （执行计划在记录时由后台线程获取，尚未获取完成的为null）
+    """
+    order = request.args.get('order', 'recent')
+    if order not in ('recent', 'duration'):
+        return jsonify({'error': 'order只能为recent或duration'}), 400
+    limit = min(max(request.args.get('limit', 50, type=int), 1), SlowQueryLog.max_entries)
+    with_plan = request.args.get('plan', '1') != '0'
+    
+    return jsonify({
+        'stats': SlowQueryLog.get_stats(),
+        'summary': SlowQueryLog.get_summary(),
+        'queries': [entry.to_dict(with_plan=with_plan) for entry in SlowQueryLog.get_entries(limit, order)],
+        'timestamp': datetime.utcnow().isoformat()
+    })
+
+@system_bp.route('/slow-queries/clear', methods=['POST'])
+@login_required
+def clear_slow_queries():
+    """清空慢查询记录（需要登录）"""
+    SlowQueryLog.clear()
+    return jsonify({
+        'status': 'success',
+        'message': '慢查询记录已清空',
+        'timestamp': datetime.utcnow().isoformat()
+    })
+
 @system_bp.route('/config')
 @login_required
 def get_config_info():
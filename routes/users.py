@@ -2,12 +2,16 @@ from flask import Blueprint, render_template, request, jsonify, redirect, url_fo
 from flask_login import login_required, current_user
 from database import db
 from models.user import User
-from datetime import datetime
+from datetime import datetime, timedelta
 import logging
 from utils.crypto_utils import CryptoUtils
+from utils.date_histogram import date_histogram
 
 users_bp = Blueprint('users', __name__)
 
+# 注册趋势可选的天数
+TREND_DAYS_OPTIONS = (7, 30, 90)
+
 @users_bp.route('/')
 @login_required
 def index():
@@ -64,13 +68,14 @@ def detail(user_id):
         # 获取用户相关统计
         from models.chanting_record import ChantingRecord
         from models.daily_stats import DailyStats
+        from models.practice_summary import PracticeSummary
         from models.dedication import Dedication
         
         # 修行记录数（根据用户ID查询）
         record_count = ChantingRecord.query.filter_by(user_id=user_id).count()
         
-        # 总念诵次数（根据用户ID查询每日统计的总和）
-        total_count = db.session.query(db.func.sum(DailyStats.count)).filter_by(user_id=user_id).scalar() or 0
+        # 总念诵次数（根据用户ID汇总各佛号经文的修行汇总）
+        total_count = db.session.query(db.func.sum(PracticeSummary.total_count)).filter_by(user_id=user_id).scalar() or 0
         
         # 回向数量（根据用户ID查询）
         dedication_count = Dedication.query.filter_by(user_id=user_id).count()
@@ -228,22 +233,19 @@ def stats():
             User.is_deleted == False
         ).count()
         
-        # 用户注册趋势（最近7天） - 统计users表中所有用户
-        from datetime import timedelta
-        trends = []
-        for i in range(7):
-            date = today - timedelta(days=i)
-            next_date = date + timedelta(days=1)
-            count = User.query.filter(
-                User.created_at >= date,
-                User.created_at < next_date,
-                User.is_deleted == False
-            ).count()
-            trends.append({
-                'date': date.strftime('%m-%d'),
-                'count': count
-            })
-        trends.reverse()
+        # 用户注册趋势（最近7/30/90天） - 一次按日期分组查询
+        days = request.args.get('days', 7, type=int)
+        if days not in TREND_DAYS_OPTIONS:
+            days = 7
+        trends = [
+            {'date': day.strftime('%m-%d'), 'count': count}
+            for day, count in date_histogram(
+                User.created_at,
+                today.date() - timedelta(days=days - 1),
+                today.date(),
+                filters=[User.is_deleted == False]
+            )
+        ]
         
         # 头像类型分布 - 统计users表中所有用户
         avatar_types = db.session.query(
@@ -256,6 +258,8 @@ def stats():
                              monthly_new=monthly_new,
                              daily_new=daily_new,
                              trends=trends,
+                             trend_days=days,
+                             trend_days_options=TREND_DAYS_OPTIONS,
                              avatar_types=avatar_types,
                              now=datetime.now())
     
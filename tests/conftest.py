@@ -0,0 +1,74 @@
+"""
+测试公共夹具：内存SQLite的测试应用、已登录用户和SQL语句计数
+"""
+import os
+import sys
+import threading
+from contextlib import contextmanager
+
+import pytest
+from sqlalchemy import event
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app
+from database import db
+
+TEST_USERNAME = 'tester'
+TEST_PASSWORD = 'test-password'
+
+@pytest.fixture
+def app():
+    """测试应用，建表并写入内置内容、默认同步配置和测试用户"""
+    app = create_app('testing')
+    with app.app_context():
+        from models import User, Chanting, DedicationTemplate, SyncConfig
+        from utils.crypto_utils import CryptoUtils
+        from utils.catalog_cache import CatalogCache
+
+        db.create_all()
+        Chanting.create_built_in_chantings()
+        DedicationTemplate.create_built_in_templates()
+        SyncConfig.init_default_configs()
+        db.session.add(User(username=TEST_USERNAME, password=CryptoUtils.hash_password(TEST_PASSWORD)))
+        db.session.commit()
+        # 进程内缓存在各测试的应用之间共享，每个测试从空缓存开始
+        CatalogCache.invalidate()
+
+        yield app
+
+        db.session.remove()
+        db.drop_all()
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+@pytest.fixture
+def user(app):
+    from models import User
+    return User.query.filter_by(username=TEST_USERNAME).first()
+
+@pytest.fixture
+def count_queries(app):
+    """
+    统计代码块内当前线程执行的SQL语句，返回语句列表
+    只计当前线程，避免后台线程（健康检查、缓冲写入等）的查询干扰结果
+    """
+    @contextmanager
+    def counter():
+        statements = []
+        thread_id = threading.get_ident()
+
+        def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            if threading.get_ident() == thread_id:
+                statements.append(statement)
+
+        engine = db.engine
+        event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+        try:
+            yield statements
+        finally:
+            event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+
+    return counter
@@ -0,0 +1,63 @@
+"""
+查询次数预算：下载接口的SQL语句数不随用户数据量增长
+"""
+from datetime import date, timedelta
+
+import pytest
+
+from database import db
+from tests.conftest import TEST_USERNAME, TEST_PASSWORD
+
+# 内置内容目录缓存命中时：用户认证、同步配置各1条 + 每个用户数据类型1条；
+# 增量下载另有删除标记保留期配置和删除标记各1条
+FULL_DOWNLOAD_QUERY_BUDGET = 6
+INCREMENTAL_DOWNLOAD_QUERY_BUDGET = 8
+
+def seed_user_data(user_id, rows):
+    """为用户写入rows条自建佛号、回向、念诵记录和每日统计"""
+    from models import Chanting, Dedication, ChantingRecord, DailyStats
+
+    chantings = [
+        Chanting(title=f'佛号{i}', content=f'南无阿弥陀佛{i}', type='buddha', user_id=user_id)
+        for i in range(rows)
+    ]
+    db.session.add_all(chantings)
+    db.session.flush()
+
+    today = date.today()
+    for i, chanting in enumerate(chantings):
+        db.session.add(Dedication(title=f'回向{i}', content=f'回向内容{i}', chanting_id=chanting.id,
+                                  user_id=user_id, client_uuid=f'dedication-{i}'))
+        db.session.add(ChantingRecord(chanting_id=chanting.id, user_id=user_id, client_uuid=f'record-{i}'))
+        db.session.add(DailyStats(chanting_id=chanting.id, user_id=user_id, count=i + 1,
+                                  date=today - timedelta(days=i)))
+    db.session.commit()
+
+def download(client, count_queries, **body):
+    body['auth'] = {'username': TEST_USERNAME, 'password': TEST_PASSWORD}
+    with count_queries() as statements:
+        response = client.post('/sync/download', json=body)
+        payload = response.get_json()
+    assert response.status_code == 200, payload
+    return payload, statements
+
+@pytest.mark.parametrize('since, budget', [
+    (None, FULL_DOWNLOAD_QUERY_BUDGET),
+    ('2000-01-01T00:00:00', INCREMENTAL_DOWNLOAD_QUERY_BUDGET),
+])
+def test_download_query_count_is_constant(app, client, user, count_queries, since, budget):
+    body = {'since': since} if since else {}
+
+    # 内置内容目录在进程内缓存，先下载一次使两次计数都在缓存命中时进行
+    download(client, count_queries, **body)
+
+    seed_user_data(user.id, 5)
+    small, small_statements = download(client, count_queries, **body)
+
+    seed_user_data(user.id, 300)
+    large, large_statements = download(client, count_queries, **body)
+
+    assert len(small['data']['chanting_records']) == 5
+    assert len(large['data']['chanting_records']) == 305
+    assert len(large_statements) == len(small_statements), large_statements
+    assert len(large_statements) <= budget, large_statements
@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+"""
+重建修行汇总、修行日历和时间汇总
+这些汇总都由每日统计写入时自动维护；直接修改数据库或汇总出现偏差时，运行本脚本根据daily_stats重新计算
+
+用法:
+    python tools/rebuild_practice_summaries.py              # 重建全部
+    python tools/rebuild_practice_summaries.py --user-id 3  # 只重建指定用户的修行汇总和修行日历
+    python tools/rebuild_practice_summaries.py --rollups-only  # 只重建时间汇总
+"""
+import os
+import sys
+import argparse
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app
+from database import db
+from models.practice_summary import PracticeSummary
+from models.stats_rollup import StatsRollup
+from models.practice_heatmap import PracticeHeatmap
+
+def main():
+    parser = argparse.ArgumentParser(description='根据daily_stats重建修行汇总、修行日历和时间汇总')
+    parser.add_argument('--user-id', type=int, default=None, help='只重建指定用户的修行汇总和修行日历（不重建时间汇总）')
+    parser.add_argument('--rollups-only', action='store_true', help='只重建日、周、月、年时间汇总')
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        try:
+            if not args.rollups_only:
+                scope = f"用户 {args.user_id}" if args.user_id else "全部用户"
+                print(f"开始重建修行汇总（{scope}）...")
+                rebuilt = PracticeSummary.rebuild(user_id=args.user_id)
+                print(f"✓ 修行汇总 {rebuilt} 条")
+                rebuilt = PracticeHeatmap.rebuild(user_id=args.user_id)
+                print(f"✓ 修行日历 {rebuilt} 条")
+
+            if not args.user_id:
+                print("开始重建时间汇总...")
+                rebuilt = StatsRollup.rebuild()
+                print(f"✓ 时间汇总 {rebuilt} 条")
+
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            print(f"✗ 重建失败: {e}")
+            sys.exit(1)
+        print("✓ 重建完成")
+
+if __name__ == '__main__':
+    main()
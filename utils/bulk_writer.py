@@ -0,0 +1,79 @@
+"""
+批量写入工具
+收集待插入的行数据，按批次使用多行INSERT写入数据库
+"""
+import time
+import sqlite3
+import logging
+from database import db
+
+logger = logging.getLogger(__name__)
+
+def max_bind_params(dialect):
+    """单条语句允许的绑定参数上限：SQLite 3.32起为32766，更早为999；MySQL/PostgreSQL为65535"""
+    if dialect == 'sqlite':
+        return 32766 if sqlite3.sqlite_version_info >= (3, 32, 0) else 999
+    return 65535
+
+class BulkWriter:
+    """批量写入器 - 绕过ORM逐行add，按批次执行多行INSERT"""
+
+    DEFAULT_BATCH_SIZE = 100
+
+    def __init__(self, model, batch_size=None, statement_builder=None):
+        """
+        Args:
+            model: 目标模型类
+            batch_size: 每批写入的行数，默认100；超过数据库绑定参数上限允许的行数时按上限写入
+            statement_builder: 可选，接收一批行数据并返回写入语句（如upsert），默认为多行INSERT
+        """
+        self.table = model.__table__
+        self.statement_builder = statement_builder or (lambda rows: self.table.insert().values(rows))
+        self.batch_size = min(max(int(batch_size or self.DEFAULT_BATCH_SIZE), 1), self.max_batch_size())
+        self._pending = []
+        self.rows_written = 0
+        self.batches = 0
+        self.elapsed = 0.0
+
+    def max_batch_size(self):
+        """
+        每批最多写入的行数：行数 × 列数不超过绑定参数上限
+        按表的全部列计算，并预留一行的参数给upsert更新子句中的值
+        """
+        columns = len(self.table.columns)
+        return max(max_bind_params(db.engine.dialect.name) // columns - 1, 1)
+
+    def add(self, row):
+        """添加一行数据（列名 -> 值），达到批次大小时自动写入"""
+        self._pending.append(row)
+        if len(self._pending) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """写入当前批次"""
+        if not self._pending:
+            return
+
+        started = time.perf_counter()
+        db.session.execute(self.statement_builder(self._pending))
+        self.elapsed += time.perf_counter() - started
+
+        self.rows_written += len(self._pending)
+        self.batches += 1
+        logger.debug(f"{self.table.name} 批量写入 {len(self._pending)} 行")
+        self._pending = []
+
+    def close(self):
+        """写入剩余数据并返回写入统计"""
+        self.flush()
+        return self.get_stats()
+
+    def get_stats(self):
+        """获取写入统计信息"""
+        return {
+            'rows_written': self.rows_written,
+            'batches': self.batches,
+            'batch_size': self.batch_size,
+            'elapsed_ms': round(self.elapsed * 1000, 2),
+            'rows_per_second': round(self.rows_written / self.elapsed, 1) if self.elapsed > 0 else 0
+        }
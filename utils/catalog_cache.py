@@ -0,0 +1,172 @@
+"""
+共享目录缓存
+内置佛号经文和回向模板对所有用户相同，序列化结果按目录版本号缓存在进程内
+"""
+import json
+import logging
+import threading
+from datetime import datetime
+from itertools import chain
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from database import db
+from models.user import User
+from models.chanting import Chanting
+from models.dedication_template import DedicationTemplate
+from models.sync_config import SyncConfig
+
+logger = logging.getLogger(__name__)
+
+class CatalogCache:
+    """内置内容目录缓存
+
+    目录版本号保存在sync_configs表（catalog_version），内置佛号经文或回向模板
+    发生变更时在同一事务内递增；每次读取先查版本号，版本一致时直接使用缓存，
+    多进程部署时各进程也能各自感知变更。
+    """
+
+    VERSION_KEY = 'catalog_version'
+
+    _cache = None
+    _lock = threading.Lock()
+    hits = 0
+    misses = 0
+
+    @staticmethod
+    def get_version():
+        """获取当前目录版本号"""
+        try:
+            return int(SyncConfig.get_config(CatalogCache.VERSION_KEY, 0))
+        except (TypeError, ValueError):
+            return 0
+
+    @classmethod
+    def get_catalog(cls):
+        """获取当前版本的目录，返回 {'version', 'chantings', 'dedication_templates'}
+
+        各数据类型为 (updated_at, 序列化后的JSON字符串) 列表
+        """
+        version = cls.get_version()
+        catalog = cls._cache
+        if catalog and catalog['version'] == version:
+            cls.hits += 1
+            return catalog
+
+        with cls._lock:
+            catalog = cls._cache
+            if not catalog or catalog['version'] != version:
+                catalog = cls._build(version)
+                cls._cache = catalog
+                cls.misses += 1
+            else:
+                cls.hits += 1
+        return catalog
+
+    @classmethod
+    def get_stats(cls):
+        """获取缓存统计信息"""
+        catalog = cls._cache
+        return {
+            'version': catalog['version'] if catalog else None,
+            'hits': cls.hits,
+            'misses': cls.misses
+        }
+
+    @classmethod
+    def invalidate(cls):
+        """清空进程内缓存"""
+        cls._cache = None
+
+    @staticmethod
+    def bump_version(connection):
+        """在给定连接（当前事务）内递增目录版本号"""
+        table = SyncConfig.__table__
+        now = datetime.utcnow()
+        result = connection.execute(
+            table.update()
+            .where(table.c.config_key == CatalogCache.VERSION_KEY)
+            .values(
+                config_value=db.cast(db.cast(table.c.config_value, db.Integer) + 1, db.String),
+                updated_at=now
+            )
+        )
+        if result.rowcount == 0:
+            connection.execute(table.insert().values(
+                config_key=CatalogCache.VERSION_KEY,
+                config_value='1',
+                description='内置佛号经文和回向模板的目录版本号，内容变更时自动递增',
+                is_active=True,
+                created_at=now,
+                updated_at=now
+            ))
+
+    @staticmethod
+    def _build(version):
+        chantings = db.session.query(Chanting, User.username).outerjoin(
+            User, Chanting.user_id == User.id
+        ).filter(
+            Chanting.is_built_in == True,
+            Chanting.is_deleted == False
+        ).order_by(Chanting.id).all()
+
+        templates = DedicationTemplate.query.order_by(DedicationTemplate.id).all()
+
+        logger.info(f"构建目录缓存，版本: {version}, 佛号经文: {len(chantings)}, 回向模板: {len(templates)}")
+        return {
+            'version': version,
+            'chantings': [
+                (chanting.updated_at, json.dumps(serialize_chanting(chanting, username)))
+                for chanting, username in chantings
+            ],
+            'dedication_templates': [
+                (template.updated_at, json.dumps(serialize_dedication_template(template)))
+                for template in templates
+            ]
+        }
+
+def iter_catalog_rows(rows, since=None):
+    """输出目录中的序列化数据，提供since时只输出之后变更的"""
+    for updated_at, row_json in rows:
+        if since and (not updated_at or updated_at <= since):
+            continue
+        yield row_json
+
+def serialize_chanting(chanting, username=None):
+    """佛号经文的同步数据格式"""
+    return {
+        'title': chanting.title,
+        'content': chanting.content,
+        'pronunciation': chanting.pronunciation,
+        'type': chanting.type,
+        'is_built_in': chanting.is_built_in,
+        'content_hash': chanting.content_hash,
+        'username': username,
+        'created_at': chanting.created_at.isoformat() if chanting.created_at else None,
+        'updated_at': chanting.updated_at.isoformat() if chanting.updated_at else None
+    }
+
+def serialize_dedication_template(template):
+    """回向模板的同步数据格式"""
+    return {
+        'title': template.title,
+        'content': template.content,
+        'is_built_in': template.is_built_in,
+        'created_at': template.created_at.isoformat() if template.created_at else None,
+        'updated_at': template.updated_at.isoformat() if template.updated_at else None
+    }
+
+def _is_catalog_object(obj):
+    """是否属于共享目录的内容（回向模板全部共享，佛号经文只包括内置的）"""
+    if isinstance(obj, DedicationTemplate):
+        return True
+    if isinstance(obj, Chanting):
+        # 由内置改为非内置同样需要更新目录
+        return bool(obj.is_built_in) or True in db.inspect(obj).attrs.is_built_in.history.deleted
+    return False
+
+@event.listens_for(Session, 'after_flush')
+def _bump_catalog_version(session, flush_context):
+    """内置内容变更时，在同一事务内递增目录版本号"""
+    dirty = (obj for obj in session.dirty if session.is_modified(obj))
+    if any(_is_catalog_object(obj) for obj in chain(session.new, dirty, session.deleted)):
+        CatalogCache.bump_version(session.connection())
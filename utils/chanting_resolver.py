@@ -0,0 +1,89 @@
+"""
+佛号经文解析缓存
+同步上传时按标题+内容查找佛号经文，每个请求只预加载一次
+"""
+import logging
+from sqlalchemy.orm import defer
+from database import db
+from models.chanting import Chanting
+
+logger = logging.getLogger(__name__)
+
+class ChantingResolver:
+    """单次请求内的佛号经文查找缓存
+
+    预加载用户可见的全部佛号经文（内置 + 用户自己创建的）到以content_hash为键的字典，
+    之后每条记录的查找都是O(1)；未命中的内容只回查数据库一次，结果同样缓存。
+    """
+
+    def __init__(self, user_id):
+        self.user_id = user_id
+        self._chantings = {}  # content_hash -> [Chanting]，同内容时内置在前
+        self.hits = 0
+        self.misses = 0
+        self.preload()
+
+    def preload(self):
+        """一次性加载用户可见的佛号经文"""
+        chantings = Chanting.query.options(
+            defer(Chanting.content),
+            defer(Chanting.pronunciation)
+        ).filter(
+            Chanting.is_deleted == False,
+            db.or_(
+                Chanting.is_built_in == True,
+                Chanting.user_id == self.user_id
+            )
+        ).order_by(Chanting.is_built_in.desc(), Chanting.id).all()
+
+        self._chantings = {}
+        for chanting in chantings:
+            self._add(chanting)
+        logger.debug(f"预加载佛号经文 {len(chantings)} 条，用户ID: {self.user_id}")
+
+    def resolve(self, title, content):
+        """查找未删除的佛号经文，同内容时优先返回内置内容"""
+        candidates = self._lookup(title, content)
+        return candidates[0] if candidates else None
+
+    def find_built_in(self, title, content):
+        """查找同内容的内置佛号经文"""
+        return next((c for c in self._lookup(title, content) if c.is_built_in), None)
+
+    def find_user_owned(self, title, content):
+        """查找当前用户创建的同内容非内置佛号经文"""
+        return next(
+            (c for c in self._lookup(title, content)
+             if not c.is_built_in and c.user_id == self.user_id),
+            None
+        )
+
+    def register(self, chanting):
+        """登记本次请求中新建的佛号经文"""
+        self._add(chanting)
+
+    def get_stats(self):
+        """获取缓存命中统计"""
+        return {'hits': self.hits, 'misses': self.misses}
+
+    def _add(self, chanting):
+        content_hash = chanting.content_hash or Chanting.compute_content_hash(chanting.title, chanting.content)
+        candidates = self._chantings.setdefault(content_hash, [])
+        if chanting not in candidates:
+            candidates.append(chanting)
+
+    def _lookup(self, title, content):
+        if not title or not content:
+            return []
+
+        content_hash = Chanting.compute_content_hash(title, content)
+        candidates = self._chantings.get(content_hash)
+        if candidates is not None:
+            self.hits += 1
+            return [c for c in candidates if c.title == title]
+
+        # 未预加载的内容（如其他用户创建的），回查一次并缓存结果（包括未找到）
+        self.misses += 1
+        candidates = Chanting.find_by_content(title, content).filter_by(is_deleted=False).all()
+        self._chantings[content_hash] = candidates
+        return candidates
@@ -0,0 +1,259 @@
+"""
+每日统计计数缓冲
+念诵计数接口每次点击都会调用，增量先在进程内按 (用户, 佛号经文, 日期) 合并，
+由后台线程定期或达到阈值时以 count = count + n 的原子更新批量写入；
+数据库不可用时整批放回缓冲，其他错误逐条重试以隔离出错的统计，超过重试次数的丢弃并记录日志；
+同步写入绝对次数时丢弃同一统计的增量，包括正在写入和写入失败待放回的增量
+"""
+import atexit
+import logging
+import threading
+from datetime import date
+from sqlalchemy.exc import DisconnectionError, OperationalError
+from database import db
+from models.daily_stats import DailyStats
+from utils.metrics import DAILY_STATS_BUFFER_FLUSHES, DAILY_STATS_BUFFER_INCREMENTS
+
+logger = logging.getLogger(__name__)
+
+class DailyStatsBuffer:
+    """每日统计写回缓冲
+
+    未写入的增量最多保留 flush_interval 秒（或累计 flush_threshold 次），
+    进程正常退出时会再写入一次；进程异常退出时最多丢失一个写入周期的计数。
+    """
+
+    DEFAULT_FLUSH_INTERVAL = 2  # 秒
+    DEFAULT_FLUSH_THRESHOLD = 500  # 累计增量次数
+    DEFAULT_MAX_RETRIES = 5  # 单条统计写入失败的最大重试次数（不含数据库不可用）
+
+    _app = None
+    _pending = {}  # (user_id, chanting_id, date) -> 增量
+    _pending_calls = {}  # (user_id, chanting_id, date) -> 合并的增量次数
+    _pending_total = 0
+    _discarded = set()  # 本次写入取出批次后被丢弃的统计，写入和放回缓冲时跳过
+    _failures = {}  # (user_id, chanting_id, date) -> 连续写入失败次数
+    _lock = threading.Lock()
+    _flush_lock = threading.Lock()
+    _stop_event = threading.Event()
+    _thread = None
+    _atexit_registered = False
+    flush_interval = DEFAULT_FLUSH_INTERVAL
+    flush_threshold = DEFAULT_FLUSH_THRESHOLD
+    max_retries = DEFAULT_MAX_RETRIES
+
+    @classmethod
+    def init_app(cls, app):
+        """读取配置并注册退出时的写入"""
+        cls._app = app
+        cls.flush_interval = app.config.get('DAILY_STATS_FLUSH_INTERVAL', cls.DEFAULT_FLUSH_INTERVAL)
+        cls.flush_threshold = app.config.get('DAILY_STATS_FLUSH_THRESHOLD', cls.DEFAULT_FLUSH_THRESHOLD)
+        cls.max_retries = app.config.get('DAILY_STATS_FLUSH_MAX_RETRIES', cls.DEFAULT_MAX_RETRIES)
+        if not cls._atexit_registered:
+            atexit.register(cls.shutdown)
+            cls._atexit_registered = True
+
+    @classmethod
+    def add(cls, user_id, chanting_id, increment=1, stat_date=None):
+        """记录一次增量，累计次数达到阈值时立即写入"""
+        key = (int(user_id), int(chanting_id), stat_date or date.today())
+        with cls._lock:
+            cls._pending[key] = cls._pending.get(key, 0) + increment
+            cls._pending_calls[key] = cls._pending_calls.get(key, 0) + 1
+            cls._pending_total += 1
+            should_flush = cls.flush_interval <= 0 or cls._pending_total >= cls.flush_threshold
+        DAILY_STATS_BUFFER_INCREMENTS.inc()
+
+        if should_flush:
+            cls.flush()
+        else:
+            cls._ensure_thread()
+
+    @classmethod
+    def get_pending(cls, user_id, chanting_id, stat_date=None):
+        """获取某条统计尚未写入的增量"""
+        key = (int(user_id), int(chanting_id), stat_date or date.today())
+        with cls._lock:
+            return cls._pending.get(key, 0)
+
+    @classmethod
+    def get_pending_for_user(cls, user_id, stat_date=None):
+        """获取某用户某天全部佛号经文尚未写入的增量之和"""
+        user_id = int(user_id)
+        stat_date = stat_date or date.today()
+        with cls._lock:
+            return sum(
+                increment for (pending_user_id, _, pending_date), increment in cls._pending.items()
+                if pending_user_id == user_id and pending_date == stat_date
+            )
+
+    @classmethod
+    def discard(cls, user_id, chanting_id, stat_date=None):
+        """丢弃某条统计尚未写入的增量（直接设置计数时，旧的增量已被覆盖）"""
+        cls.discard_many([(user_id, chanting_id, stat_date or date.today())])
+
+    @classmethod
+    def discard_many(cls, keys):
+        """
+        丢弃多条统计尚未写入的增量，keys为 (user_id, chanting_id, date) 序列
+        调用方需先锁住这些统计行：正在写入的批次在取得行锁后会看到丢弃标记并跳过这些统计
+        """
+        with cls._lock:
+            for user_id, chanting_id, stat_date in keys:
+                key = (int(user_id), int(chanting_id), stat_date)
+                cls._pending.pop(key, None)
+                cls._pending_total -= cls._pending_calls.pop(key, 0)
+                cls._discarded.add(key)
+
+    @classmethod
+    def flush(cls):
+        """将缓冲的增量写入数据库，返回写入的统计条数"""
+        with cls._flush_lock:
+            with cls._lock:
+                pending = cls._pending
+                cls._pending = {}
+                cls._pending_calls = {}
+                cls._pending_total = 0
+                # 取出批次之前的丢弃已从缓冲中移除，只需记录之后的
+                cls._discarded = set()
+            if not pending:
+                return 0
+
+            try:
+                written = cls._write(pending)
+            except Exception as e:
+                db.session.rollback()
+                DAILY_STATS_BUFFER_FLUSHES.inc(result='failed')
+                if cls._is_unavailable(e):
+                    # 数据库不可用：整批放回缓冲，下个周期重试，不计入单条的重试次数
+                    logger.error(f"每日统计缓冲写入失败（数据库不可用），{len(pending)} 条将重试: {str(e)}")
+                    cls._requeue(pending)
+                    return 0
+                logger.error(f"每日统计缓冲批量写入失败，逐条重试 {len(pending)} 条: {str(e)}")
+                return cls._write_each(pending)
+
+            cls._clear_failures(pending)
+            logger.debug(f"每日统计缓冲写入 {written} 条")
+            DAILY_STATS_BUFFER_FLUSHES.inc(result='success')
+            return written
+
+    @classmethod
+    def get_stats(cls):
+        """获取缓冲中待写入的统计条数、增量次数和写入失败待重试的条数"""
+        with cls._lock:
+            return {
+                'pending_keys': len(cls._pending),
+                'pending_increments': cls._pending_total,
+                'failing_keys': len(cls._failures)
+            }
+
+    @classmethod
+    def _write_each(cls, pending):
+        """逐条写入以隔离出错的统计，出错的放回缓冲，超过重试次数的丢弃，返回写入的条数"""
+        written = 0
+        items = list(pending.items())
+        for index, (key, increment) in enumerate(items):
+            try:
+                if not cls._write({key: increment}):
+                    continue
+            except Exception as e:
+                db.session.rollback()
+                if cls._is_unavailable(e):
+                    logger.error(f"每日统计缓冲写入失败（数据库不可用），{len(items) - index} 条将重试: {str(e)}")
+                    cls._requeue(dict(items[index:]))
+                    break
+                with cls._lock:
+                    attempts = cls._failures.get(key, 0) + 1
+                    if attempts < cls.max_retries:
+                        cls._failures[key] = attempts
+                    else:
+                        cls._failures.pop(key, None)
+                if attempts < cls.max_retries:
+                    logger.warning(f"每日统计缓冲写入失败（第 {attempts} 次），将重试: {key} +{increment}: {str(e)}")
+                    cls._requeue({key: increment})
+                else:
+                    logger.error(f"每日统计缓冲写入连续失败 {attempts} 次，丢弃增量: {key} +{increment}: {str(e)}")
+                    DAILY_STATS_BUFFER_FLUSHES.inc(result='dropped')
+                continue
+            cls._clear_failures({key: increment})
+            written += 1
+        return written
+
+    @classmethod
+    def _requeue(cls, pending):
+        # 放回缓冲，与期间新增的增量合并；期间已被同步丢弃的统计不再放回
+        with cls._lock:
+            for key, increment in pending.items():
+                if key not in cls._discarded:
+                    cls._pending[key] = cls._pending.get(key, 0) + increment
+
+    @classmethod
+    def _clear_failures(cls, pending):
+        with cls._lock:
+            if cls._failures:
+                for key in pending:
+                    cls._failures.pop(key, None)
+
+    @staticmethod
+    def _is_unavailable(error):
+        """连接断开、数据库被锁等错误与数据本身无关，整批重试"""
+        return isinstance(error, (OperationalError, DisconnectionError)) or getattr(error, 'connection_invalidated', False)
+
+    @classmethod
+    def shutdown(cls):
+        """停止后台线程并写入剩余增量"""
+        cls._stop_event.set()
+        if cls._app is None:
+            return
+        with cls._app.app_context():
+            cls.flush()
+
+    @classmethod
+    def _write(cls, pending):
+        """
+        一条多行upsert完成本周期的全部增量：count = count + n，返回写入的统计条数
+        提交前检查丢弃标记：同步先锁住统计行再丢弃增量，本次写入若在同步之后才取得行锁，
+        此时一定能看到标记，回滚后只写入其余的增量，不会叠加在同步的绝对次数上
+        """
+        pending = dict(pending)
+        while pending:
+            DailyStats.upsert_many([
+                {'user_id': user_id, 'chanting_id': chanting_id, 'date': stat_date, 'count': increment}
+                for (user_id, chanting_id, stat_date), increment in pending.items()
+            ], increment=True)
+            with cls._lock:
+                discarded = [key for key in pending if key in cls._discarded]
+            if not discarded:
+                db.session.commit()
+                return len(pending)
+            db.session.rollback()
+            for key in discarded:
+                pending.pop(key)
+            logger.info(f"每日统计缓冲跳过 {len(discarded)} 条已被同步覆盖的增量")
+        return 0
+
+    @classmethod
+    def _ensure_thread(cls):
+        if cls._thread is not None and cls._thread.is_alive():
+            return
+        with cls._lock:
+            if cls._thread is not None and cls._thread.is_alive():
+                return
+            cls._stop_event.clear()
+            cls._thread = threading.Thread(
+                target=cls._run, name='daily-stats-flush', daemon=True
+            )
+            cls._thread.start()
+
+    @classmethod
+    def _run(cls):
+        while not cls._stop_event.wait(cls.flush_interval):
+            try:
+                with cls._app.app_context():
+                    cls.flush()
+            except Exception as e:
+                logger.error(f"每日统计缓冲后台写入异常: {str(e)}")
+
+def init_daily_stats_buffer(app):
+    """初始化每日统计计数缓冲"""
+    DailyStatsBuffer.init_app(app)
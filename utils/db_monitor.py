@@ -1,22 +1,172 @@
-from sqlalchemy import text
+from sqlalchemy import event, text
+from flask import request
 from database import db
 import logging
+import threading
+import time
 
 logger = logging.getLogger(__name__)
 
+class DatabaseHealth:
+    """数据库健康状态与熔断器
+
+    健康检查由后台线程按间隔执行（SELECT 1），结果缓存在进程内，请求处理时只读取缓存状态。
+    请求中出现连接类错误时立即唤醒后台线程复查；连续失败达到阈值后熔断器打开，
+    打开期间API和同步请求直接返回503，后台线程按重试间隔探测，恢复后自动关闭。
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+
+    DEFAULT_CHECK_INTERVAL = 30  # 秒，正常时的检查间隔，0为只在出错时检查
+    DEFAULT_RETRY_INTERVAL = 5  # 秒，出错或熔断期间的检查间隔
+    DEFAULT_FAILURE_THRESHOLD = 3  # 连续失败次数
+
+    _app = None
+    _lock = threading.Lock()
+    _wake_event = threading.Event()
+    _probing = threading.local()
+    _thread = None
+    state = CLOSED
+    consecutive_failures = 0
+    last_check_at = None
+    last_success_at = None
+    last_error = None
+    opened_at = None
+    check_interval = DEFAULT_CHECK_INTERVAL
+    retry_interval = DEFAULT_RETRY_INTERVAL
+    failure_threshold = DEFAULT_FAILURE_THRESHOLD
+
+    @classmethod
+    def init_app(cls, app):
+        """读取配置"""
+        cls._app = app
+        cls.check_interval = app.config.get('DB_HEALTH_CHECK_INTERVAL', cls.DEFAULT_CHECK_INTERVAL)
+        cls.retry_interval = max(app.config.get('DB_HEALTH_RETRY_INTERVAL', cls.DEFAULT_RETRY_INTERVAL), 1)
+        cls.failure_threshold = max(int(app.config.get('DB_CIRCUIT_FAILURE_THRESHOLD', cls.DEFAULT_FAILURE_THRESHOLD)), 1)
+
+    @classmethod
+    def is_available(cls):
+        """熔断器是否关闭（只读取缓存状态，不访问数据库）"""
+        return cls.state == cls.CLOSED
+
+    @classmethod
+    def probe(cls):
+        """立即执行一次健康检查并更新状态（需要应用上下文），返回是否健康"""
+        cls._probing.active = True
+        try:
+            # 使用独立连接，不影响当前请求的session
+            with db.engine.connect() as connection:
+                connection.execute(text('SELECT 1'))
+        except Exception as e:
+            cls.record_failure(e, wake=False)
+            return False
+        finally:
+            cls._probing.active = False
+        cls.record_success()
+        return True
+
+    @classmethod
+    def record_success(cls):
+        """记录一次成功的检查，熔断器打开时关闭"""
+        with cls._lock:
+            now = time.time()
+            cls.last_check_at = now
+            cls.last_success_at = now
+            cls.consecutive_failures = 0
+            if cls.state == cls.OPEN:
+                logger.info(f"数据库连接已恢复，熔断器关闭（持续 {now - cls.opened_at:.1f} 秒）")
+                cls.state = cls.CLOSED
+                cls.opened_at = None
+
+    @classmethod
+    def record_failure(cls, error, wake=True):
+        """记录一次检查失败或请求中的连接错误，达到阈值时打开熔断器；wake为True时唤醒后台线程复查"""
+        with cls._lock:
+            cls.last_check_at = time.time()
+            cls.last_error = str(error)
+            cls.consecutive_failures += 1
+            if cls.state == cls.CLOSED and cls.consecutive_failures >= cls.failure_threshold:
+                cls.state = cls.OPEN
+                cls.opened_at = cls.last_check_at
+                logger.error(f"数据库连续 {cls.consecutive_failures} 次失败，熔断器打开: {error}")
+            else:
+                logger.warning(f"数据库健康检查失败（连续 {cls.consecutive_failures} 次）: {error}")
+        if wake:
+            cls.wake()
+
+    @classmethod
+    def is_probing(cls):
+        """当前线程是否正在执行健康检查（检查自身的错误由probe记录）"""
+        return getattr(cls._probing, 'active', False)
+
+    @classmethod
+    def wake(cls):
+        """唤醒后台线程立即检查"""
+        cls._wake_event.set()
+
+    @classmethod
+    def get_status(cls):
+        """获取缓存的健康状态"""
+        with cls._lock:
+            return {
+                'state': cls.state,
+                'consecutive_failures': cls.consecutive_failures,
+                'failure_threshold': cls.failure_threshold,
+                'last_check_at': cls.last_check_at,
+                'last_success_at': cls.last_success_at,
+                'last_error': cls.last_error,
+                'opened_at': cls.opened_at
+            }
+
+    @classmethod
+    def ensure_thread(cls):
+        """按需启动后台检查线程"""
+        if cls._thread is not None and cls._thread.is_alive():
+            return
+        with cls._lock:
+            if cls._thread is not None and cls._thread.is_alive():
+                return
+            cls._thread = threading.Thread(
+                target=cls._run, name='db-health-check', daemon=True
+            )
+            cls._thread.start()
+
+    @classmethod
+    def _next_wait(cls):
+        if cls.state == cls.OPEN or cls.consecutive_failures:
+            return cls.retry_interval
+        return cls.check_interval if cls.check_interval > 0 else None
+
+    @classmethod
+    def _run(cls):
+        while True:
+            woken = cls._wake_event.wait(cls._next_wait())
+            cls._wake_event.clear()
+            if woken:
+                # 请求出错后唤醒时稍作等待，合并同一时刻的多个错误
+                time.sleep(min(cls.retry_interval, 1))
+                cls._wake_event.clear()
+            try:
+                with cls._app.app_context():
+                    cls.probe()
+            except Exception as e:
+                logger.error(f"数据库后台健康检查异常: {str(e)}")
+
+def _is_connection_error(context):
+    """请求中的错误是否为连接类错误（连接断开或无法建立连接）"""
+    if context.is_pre_ping:
+        # 连接池预检失败后会自动重连，不计入失败
+        return False
+    return context.is_disconnect or (context.execution_context is None and context.statement is None)
+
 class DatabaseMonitor:
     """数据库连接池监控和健康检查"""
     
     @staticmethod
     def check_health():
-        """检查数据库连接健康状态"""
-        try:
-            # 简单查询测试连接
-            result = db.session.execute(text('SELECT 1'))
-            return True
-        except Exception as e:
-            logger.error(f"数据库健康检查失败: {e}")
-            return False
+        """检查数据库连接健康状态（立即检查一次并更新熔断器状态）"""
+        return DatabaseHealth.probe()
     
     @staticmethod
     def get_pool_status():
@@ -63,13 +213,29 @@ class DatabaseMonitor:
 
 def init_db_monitoring(app):
     """初始化数据库监控"""
+    DatabaseHealth.init_app(app)
+    
+    with app.app_context():
+        engine = db.engine
+    
+    @event.listens_for(engine, 'handle_error')
+    def handle_error(context):
+        """请求中出现连接类错误时记录失败，由后台线程复查"""
+        if not DatabaseHealth.is_probing() and _is_connection_error(context):
+            DatabaseHealth.record_failure(context.original_exception)
     
     @app.before_request
     def before_request():
-        """请求前检查数据库连接"""
-        if not DatabaseMonitor.check_health():
-            logger.warning("数据库连接异常，尝试重新连接")
-            DatabaseMonitor.cleanup_connections()
+        """熔断器打开时API和同步请求直接返回503，不再访问数据库"""
+        DatabaseHealth.ensure_thread()
+        if DatabaseHealth.is_available() or request.blueprint not in ('api', 'sync'):
+            return None
+        return {
+            'error': 'Service Unavailable',
+            'message': '数据库暂时不可用，请稍后重试',
+            'status_code': 503,
+            'path': request.path
+        }, 503, {'Retry-After': str(DatabaseHealth.retry_interval)}
     
     @app.after_request
     def after_request(response):
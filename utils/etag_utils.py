@@ -0,0 +1,26 @@
+"""
+ETag工具函数
+根据数据版本（行数、最大updated_at等）生成强ETag，命中If-None-Match时直接返回304
+"""
+import hashlib
+from flask import request, jsonify, make_response
+
+def compute_etag(*parts):
+    """由版本信息计算ETag（不含引号）"""
+    raw = '|'.join('' if part is None else str(part) for part in parts)
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+def etag_response(etag, build_body):
+    """
+    返回带ETag的JSON响应
+    客户端If-None-Match命中时返回304，不调用build_body，也不序列化响应体
+    """
+    if request.if_none_match.contains(etag):
+        response = make_response('', 304)
+    else:
+        response = jsonify(build_body())
+
+    response.set_etag(etag)
+    # 允许客户端缓存，但每次使用前都需要用ETag重新验证
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
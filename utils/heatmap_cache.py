@@ -0,0 +1,125 @@
+"""
+修行日历缓存
+按 (用户, 年份) 缓存解码后的日历，每次读取先查版本号，版本一致时直接使用缓存；
+条目数超过上限时淘汰最久未使用的
+"""
+import base64
+import calendar
+import threading
+from collections import OrderedDict
+from models.practice_heatmap import PracticeHeatmap
+
+class HeatmapCache:
+    """修行日历LRU缓存"""
+
+    DEFAULT_MAX_ENTRIES = 1024
+
+    _entries = OrderedDict()  # (user_id, year) -> (版本号, 日历数据)
+    _lock = threading.Lock()
+    max_entries = DEFAULT_MAX_ENTRIES
+    hits = 0
+    misses = 0
+
+    @classmethod
+    def init_app(cls, app):
+        """读取缓存大小配置"""
+        cls.max_entries = max(int(app.config.get('HEATMAP_CACHE_SIZE', cls.DEFAULT_MAX_ENTRIES)), 1)
+
+    @classmethod
+    def get_heatmap(cls, user_id, year):
+        """
+        获取某用户某年的日历
+
+        Returns:
+            dict: year、days、version、counts（每天次数列表）、active_bits（修行日位图，base64，
+                  第i位为当年第i+1天，字节内低位在前）、total_count、active_days、max_count
+        """
+        key = (int(user_id), int(year))
+        version = PracticeHeatmap.get_version(*key)
+
+        with cls._lock:
+            entry = cls._entries.get(key)
+            if entry and entry[0] == version:
+                cls._entries.move_to_end(key)
+                cls.hits += 1
+                return entry[1]
+            cls.misses += 1
+
+        heatmap = cls._load(key, version)
+        with cls._lock:
+            cls._entries[key] = (version, heatmap)
+            cls._entries.move_to_end(key)
+            while len(cls._entries) > cls.max_entries:
+                cls._entries.popitem(last=False)
+        return heatmap
+
+    @classmethod
+    def invalidate(cls, keys):
+        """移除指定 (user_id, year) 的缓存"""
+        with cls._lock:
+            for user_id, year in keys:
+                cls._entries.pop((int(user_id), int(year)), None)
+
+    @classmethod
+    def clear(cls):
+        """清空缓存"""
+        with cls._lock:
+            cls._entries.clear()
+
+    @classmethod
+    def get_stats(cls):
+        """获取缓存统计信息"""
+        with cls._lock:
+            return {
+                'size': len(cls._entries),
+                'max_entries': cls.max_entries,
+                'hits': cls.hits,
+                'misses': cls.misses
+            }
+
+    @staticmethod
+    def with_increment(heatmap, day, increment):
+        """返回在某天加上增量后的日历副本（用于计入尚未写入的计数），不修改缓存"""
+        index = day.timetuple().tm_yday - 1
+        counts = list(heatmap['counts'])
+        was_active = counts[index] > 0
+        counts[index] += increment
+        bits = bytearray(base64.b64decode(heatmap['active_bits']))
+        bits[index // 8] |= 1 << (index % 8)
+        return {
+            **heatmap,
+            'counts': counts,
+            'active_bits': base64.b64encode(bytes(bits)).decode('ascii'),
+            'total_count': heatmap['total_count'] + increment,
+            'active_days': heatmap['active_days'] + (0 if was_active else 1),
+            'max_count': max(heatmap['max_count'], counts[index])
+        }
+
+    @staticmethod
+    def _load(key, version):
+        user_id, year = key
+        days = 366 if calendar.isleap(year) else 365
+        row = None
+        if version:
+            row = PracticeHeatmap.query.filter_by(user_id=user_id, year=year).first()
+
+        counts = list(PracticeHeatmap.unpack(row.counts)[:days]) if row else [0] * days
+        bits = bytearray((days + 7) // 8)
+        for index, count in enumerate(counts):
+            if count:
+                bits[index // 8] |= 1 << (index % 8)
+
+        return {
+            'year': year,
+            'days': days,
+            'version': version,
+            'counts': counts,
+            'active_bits': base64.b64encode(bytes(bits)).decode('ascii'),
+            'total_count': row.total_count if row else 0,
+            'active_days': row.active_days if row else 0,
+            'max_count': max(counts, default=0)
+        }
+
+def init_heatmap_cache(app):
+    """初始化修行日历缓存"""
+    HeatmapCache.init_app(app)
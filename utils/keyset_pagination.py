@@ -0,0 +1,74 @@
+"""
+游标分页工具
+按 (排序时间, id) 降序分页，下一页从上一页最后一条之后继续读取，
+不需要OFFSET，也不统计总条数，第N页与第1页的查询代价相同；
+排序时间列须为非空列，过滤和排序条件才能直接使用 (排序时间, id) 复合索引
+"""
+import base64
+import json
+from datetime import datetime
+from database import db
+
+class KeysetPage:
+    """一页游标分页结果"""
+
+    def __init__(self, items, per_page, cursor=None, next_cursor=None):
+        self.items = items
+        self.per_page = per_page
+        self.cursor = cursor
+        self.next_cursor = next_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def is_first(self):
+        return not self.cursor
+
+def encode_cursor(sort_value, row_id):
+    """将 (排序值, id) 编码为不透明游标"""
+    if isinstance(sort_value, datetime):
+        sort_value = sort_value.isoformat()
+    raw = json.dumps([sort_value, row_id])
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+
+def decode_cursor(cursor):
+    """解析游标，返回 (排序时间, id)，格式错误抛出ValueError"""
+    try:
+        sort_value, row_id = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8'))
+        return datetime.fromisoformat(sort_value), int(row_id)
+    except Exception:
+        raise ValueError(f"无效的分页游标: {cursor}")
+
+def keyset_paginate(query, sort_column, id_column, cursor=None, per_page=20, key=None):
+    """
+    按 (sort_column, id_column) 降序执行游标分页
+
+    Args:
+        query: 已应用过滤条件、未排序的查询
+        sort_column: 非空的排序时间列，如 ChantingRecord.created_at
+        id_column: 主键列，用于相同时间时确定顺序
+        cursor: 上一页返回的next_cursor，为空时取第一页
+        per_page: 每页数量
+        key: 可选，从结果行取出 (排序值, id)，结果行为元组时需要提供
+
+    Raises:
+        ValueError: 游标格式错误
+    """
+    if cursor:
+        sort_value, last_id = decode_cursor(cursor)
+        query = query.filter(db.or_(
+            sort_column < sort_value,
+            db.and_(sort_column == sort_value, id_column < last_id)
+        ))
+
+    # 多取一条判断是否还有下一页
+    rows = query.order_by(sort_column.desc(), id_column.desc()).limit(per_page + 1).all()
+    next_cursor = None
+    if len(rows) > per_page:
+        rows = rows[:per_page]
+        key = key or (lambda row: (getattr(row, sort_column.key), getattr(row, id_column.key)))
+        next_cursor = encode_cursor(*key(rows[-1]))
+
+    return KeysetPage(rows, per_page, cursor=cursor, next_cursor=next_cursor)
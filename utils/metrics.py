@@ -0,0 +1,279 @@
+"""
+运行指标
+进程内的计数器和直方图，以及抓取时读取各缓存、连接池状态的采集函数，
+由 /system/metrics 按Prometheus文本格式输出。本模块不依赖模型，模型和工具模块可直接引用
+"""
+import logging
+import math
+import threading
+import time
+from flask import g, request
+from database import db
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+BYTES_BUCKETS = (1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216, 67108864)
+ROWS_BUCKETS = (0, 1, 10, 100, 1000, 10000, 100000)
+CHECKOUT_BUCKETS = (0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 30)
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in labels) + '}'
+
+def _format_value(value):
+    if value == math.inf:
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+class Counter:
+    """只增计数器"""
+
+    type = 'counter'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(str(labels.get(name, '')) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            values = dict(self._values)
+        for key, value in sorted(values.items()):
+            yield self.name, tuple(zip(self.labelnames, key)), value
+
+class Histogram:
+    """累积分桶直方图"""
+
+    type = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._values = {}  # 标签值 -> [各桶计数..., 总和, 次数]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels.get(name, '')) for name in self.labelnames)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [0] * len(self.buckets) + [0.0, 0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[index] += 1
+                    break
+            state[-2] += value
+            state[-1] += 1
+
+    def samples(self):
+        with self._lock:
+            values = {key: list(state) for key, state in self._values.items()}
+        for key, state in sorted(values.items()):
+            labels = tuple(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, count in zip(self.buckets, state):
+                cumulative += count
+                yield f'{self.name}_bucket', labels + (('le', _format_value(bound)),), cumulative
+            yield f'{self.name}_bucket', labels + (('le', '+Inf'),), state[-1]
+            yield f'{self.name}_sum', labels, state[-2]
+            yield f'{self.name}_count', labels, state[-1]
+
+class MetricsRegistry:
+    """指标注册表
+
+    计数器和直方图在事件发生时更新；采集函数在抓取时调用，
+    返回 [(名称, 类型, 说明, [(标签元组, 值)])]，用于读取已有组件自带的统计
+    """
+
+    _metrics = {}
+    _collectors = []
+    _lock = threading.Lock()
+
+    @classmethod
+    def counter(cls, name, documentation, labelnames=()):
+        return cls._register(Counter(name, documentation, labelnames))
+
+    @classmethod
+    def histogram(cls, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        return cls._register(Histogram(name, documentation, labelnames, buckets))
+
+    @classmethod
+    def add_collector(cls, collector):
+        with cls._lock:
+            if collector not in cls._collectors:
+                cls._collectors.append(collector)
+
+    @classmethod
+    def render(cls):
+        """按Prometheus文本格式输出全部指标"""
+        with cls._lock:
+            metrics = list(cls._metrics.values())
+            collectors = list(cls._collectors)
+
+        lines = []
+        for metric in metrics:
+            lines.append(f'# HELP {metric.name} {metric.documentation}')
+            lines.append(f'# TYPE {metric.name} {metric.type}')
+            for name, labels, value in metric.samples():
+                lines.append(f'{name}{_format_labels(labels)} {_format_value(value)}')
+
+        for collector in collectors:
+            try:
+                families = collector()
+            except Exception as e:
+                logger.error(f"指标采集失败 {getattr(collector, '__name__', collector)}: {str(e)}")
+                continue
+            for name, metric_type, documentation, samples in families:
+                lines.append(f'# HELP {name} {documentation}')
+                lines.append(f'# TYPE {name} {metric_type}')
+                for labels, value in samples:
+                    lines.append(f'{name}{_format_labels(labels)} {_format_value(value)}')
+        return '\n'.join(lines) + '\n'
+
+    @classmethod
+    def _register(cls, metric):
+        with cls._lock:
+            return cls._metrics.setdefault(metric.name, metric)
+
+REQUEST_LATENCY = MetricsRegistry.histogram(
+    'http_request_duration_seconds', '请求处理耗时（流式响应为开始输出前的耗时）',
+    ('blueprint', 'endpoint', 'method')
+)
+REQUESTS = MetricsRegistry.counter(
+    'http_requests_total', '请求次数', ('blueprint', 'endpoint', 'method', 'status')
+)
+SYNC_PAYLOAD_BYTES = MetricsRegistry.histogram(
+    'sync_payload_bytes', '同步上传请求体和下载响应体的字节数', ('direction',), BYTES_BUCKETS
+)
+SYNC_ROWS = MetricsRegistry.histogram(
+    'sync_rows', '每次同步各数据类型的行数', ('direction', 'data_type'), ROWS_BUCKETS
+)
+POOL_CHECKOUT_WAIT = MetricsRegistry.histogram(
+    'db_pool_checkout_seconds', '从连接池获取连接的耗时（含等待空闲连接和新建连接）', (), CHECKOUT_BUCKETS
+)
+DAILY_STATS_WRITES = MetricsRegistry.counter(
+    'daily_stats_rows_written_total', '写入的每日统计行数（按来源）', ('source',)
+)
+DAILY_STATS_BUFFER_INCREMENTS = MetricsRegistry.counter(
+    'daily_stats_buffer_increments_total', '进入计数缓冲的念诵增量次数'
+)
+DAILY_STATS_BUFFER_FLUSHES = MetricsRegistry.counter(
+    'daily_stats_buffer_flushes_total', '计数缓冲写入次数（按结果）', ('result',)
+)
+
+def cache_families(caches):
+    """由 {缓存名: get_stats()} 生成命中、未命中和命中率指标"""
+    hits, misses, ratios = [], [], []
+    for name, stats in caches.items():
+        labels = (('cache', name),)
+        total = stats['hits'] + stats['misses']
+        hits.append((labels, stats['hits']))
+        misses.append((labels, stats['misses']))
+        ratios.append((labels, stats['hits'] / total if total else 0))
+    return [
+        ('cache_hits_total', 'counter', '缓存命中次数', hits),
+        ('cache_misses_total', 'counter', '缓存未命中次数', misses),
+        ('cache_hit_ratio', 'gauge', '缓存命中率（进程启动以来）', ratios)
+    ]
+
+def collect_caches():
+    from utils.heatmap_cache import HeatmapCache
+    from utils.stats_snapshot import StatsSnapshot
+    from utils.catalog_cache import CatalogCache
+    return cache_families({
+        'heatmap': HeatmapCache.get_stats(),
+        'stats_snapshot': StatsSnapshot.get_stats(),
+        'catalog': CatalogCache.get_stats()
+    })
+
+def collect_database():
+    from utils.db_monitor import DatabaseMonitor, DatabaseHealth
+    from utils.slow_query_log import SlowQueryLog
+    health = DatabaseHealth.get_status()
+    families = [
+        ('db_circuit_open', 'gauge', '数据库熔断器是否打开',
+         [((), 0 if health['state'] == DatabaseHealth.CLOSED else 1)]),
+        ('db_health_consecutive_failures', 'gauge', '数据库健康检查连续失败次数',
+         [((), health['consecutive_failures'])]),
+        ('db_slow_queries_total', 'counter', '记录的慢查询条数',
+         [((), SlowQueryLog.get_stats()['total_recorded'])])
+    ]
+    pool = DatabaseMonitor.get_pool_status() or {}
+    for key in ('pool_size', 'checked_in', 'checked_out', 'overflow'):
+        if isinstance(pool.get(key), int):
+            families.append((f'db_pool_{key}', 'gauge', f'连接池 {key}', [((), pool[key])]))
+    return families
+
+def collect_daily_stats_buffer():
+    from utils.counter_buffer import DailyStatsBuffer
+    stats = DailyStatsBuffer.get_stats()
+    return [
+        ('daily_stats_buffer_pending_keys', 'gauge', '计数缓冲中待写入的统计条数', [((), stats['pending_keys'])]),
+        ('daily_stats_buffer_pending_increments', 'gauge', '计数缓冲中待写入的增量次数',
+         [((), stats['pending_increments'])])
+    ]
+
+def instrument_pool(engine):
+    """统计从连接池获取连接的耗时，连接池重建（dispose）后重新挂载"""
+    pool = engine.pool
+    if getattr(pool.connect, '_metrics_instrumented', False):
+        return
+    connect = pool.connect
+
+    def timed_connect():
+        started = time.perf_counter()
+        try:
+            return connect()
+        finally:
+            POOL_CHECKOUT_WAIT.observe(time.perf_counter() - started)
+
+    timed_connect._metrics_instrumented = True
+    pool.connect = timed_connect
+
+def init_metrics(app):
+    """初始化运行指标：请求耗时、连接池获取耗时和抓取时的采集函数"""
+    from sqlalchemy import event
+    with app.app_context():
+        engine = db.engine
+    instrument_pool(engine)
+    event.listen(engine, 'engine_disposed', instrument_pool)
+
+    MetricsRegistry.add_collector(collect_caches)
+    MetricsRegistry.add_collector(collect_database)
+    MetricsRegistry.add_collector(collect_daily_stats_buffer)
+
+    @app.before_request
+    def start_request_timer():
+        g._metrics_started = time.perf_counter()
+
+    @app.after_request
+    def observe_request(response):
+        started = g.pop('_metrics_started', None)
+        if started is not None:
+            blueprint = request.blueprint or ''
+            endpoint = request.endpoint or 'unmatched'
+            REQUEST_LATENCY.observe(
+                time.perf_counter() - started, blueprint=blueprint, endpoint=endpoint, method=request.method
+            )
+            REQUESTS.inc(
+                blueprint=blueprint, endpoint=endpoint, method=request.method, status=response.status_code
+            )
+        return response
@@ -0,0 +1,138 @@
+"""
+请求级SQL统计
+通过SQLAlchemy的 before_cursor_execute / after_cursor_execute 事件统计每个请求的查询次数、
+数据库耗时和相同形状语句的重复次数，写入 Server-Timing 响应头；
+超出预算或同一语句重复过多（疑似N+1）时记录警告
+"""
+import logging
+import re
+import time
+from collections import Counter
+from flask import g, has_request_context, request
+from sqlalchemy import event
+from database import db
+
+logger = logging.getLogger(__name__)
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r'\b\d+(?:\.\d+)?\b')
+_PLACEHOLDER = r'(?:\?|%s|%\(\w+\)s|:\w+)'
+_PLACEHOLDER_LIST = re.compile(r'\(\s*' + _PLACEHOLDER + r'(?:\s*,\s*' + _PLACEHOLDER + r')+\s*\)')
+_VALUES_LIST = re.compile(r'(VALUES\s*\(\?\.\.\.\))(?:\s*,\s*\(\?\.\.\.\))+', re.IGNORECASE)
+_WHITESPACE = re.compile(r'\s+')
+
+def fingerprint(statement):
+    """
+    语句形状：去掉字面量，折叠 IN (?, ?, ...) 和多行 VALUES，合并空白
+    参数个数不同的同一语句得到相同的形状
+    """
+    shape = _STRING_LITERAL.sub('?', statement)
+    shape = _NUMBER_LITERAL.sub('?', shape)
+    shape = _PLACEHOLDER_LIST.sub('(?...)', shape)
+    shape = _VALUES_LIST.sub(r'\1', shape)
+    return _WHITESPACE.sub(' ', shape).strip()
+
+class RequestQueryStats:
+    """单个请求的SQL统计"""
+
+    __slots__ = ('started', 'count', 'duration', 'shapes')
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.count = 0
+        self.duration = 0.0  # 秒
+        self.shapes = Counter()
+
+    def add(self, statement, duration):
+        self.count += 1
+        self.duration += duration
+        self.shapes[fingerprint(statement)] += 1
+
+    def repeated(self, threshold):
+        """重复次数超过阈值的语句形状，按次数降序"""
+        return [(shape, times) for shape, times in self.shapes.most_common() if times > threshold]
+
+class QueryProfiler:
+    """请求级SQL统计与N+1检测"""
+
+    DEFAULT_MAX_QUERIES = 50  # 每个请求的查询次数预算
+    DEFAULT_MAX_DB_TIME = 500  # 每个请求的数据库耗时预算（毫秒）
+    DEFAULT_REPEAT_THRESHOLD = 10  # 同一语句形状允许的重复次数
+
+    _observers = []  # 每条语句执行后调用 callback(conn, statement, parameters, duration, executemany)
+    enabled = True
+    max_queries = DEFAULT_MAX_QUERIES
+    max_db_time = DEFAULT_MAX_DB_TIME
+    repeat_threshold = DEFAULT_REPEAT_THRESHOLD
+
+    @classmethod
+    def init_app(cls, app):
+        """读取配置并注册数据库事件和请求钩子（关闭时只保留语句计时供观察者使用）"""
+        cls.enabled = app.config.get('QUERY_PROFILER_ENABLED', True)
+        cls.max_queries = app.config.get('QUERY_BUDGET_COUNT', cls.DEFAULT_MAX_QUERIES)
+        cls.max_db_time = app.config.get('QUERY_BUDGET_TIME_MS', cls.DEFAULT_MAX_DB_TIME)
+        cls.repeat_threshold = app.config.get('QUERY_REPEAT_THRESHOLD', cls.DEFAULT_REPEAT_THRESHOLD)
+
+        with app.app_context():
+            engine = db.engine
+        event.listen(engine, 'before_cursor_execute', cls._before_cursor_execute)
+        event.listen(engine, 'after_cursor_execute', cls._after_cursor_execute)
+        if cls.enabled:
+            app.before_request(cls._start_request)
+            app.after_request(cls._finish_request)
+
+    @classmethod
+    def add_observer(cls, callback):
+        """注册语句执行后的回调（如慢查询日志）"""
+        if callback not in cls._observers:
+            cls._observers.append(callback)
+
+    @staticmethod
+    def current():
+        """当前请求的统计，不在请求中或未开始统计时返回None"""
+        if not has_request_context():
+            return None
+        return g.get('_query_stats')
+
+    @staticmethod
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('query_start_time', []).append(time.perf_counter())
+
+    @classmethod
+    def _after_cursor_execute(cls, conn, cursor, statement, parameters, context, executemany):
+        duration = time.perf_counter() - conn.info['query_start_time'].pop()
+        stats = cls.current()
+        if stats is not None:
+            stats.add(statement, duration)
+        for callback in cls._observers:
+            callback(conn, statement, parameters, duration, executemany)
+
+    @staticmethod
+    def _start_request():
+        g._query_stats = RequestQueryStats()
+
+    @classmethod
+    def _finish_request(cls, response):
+        stats = g.pop('_query_stats', None)
+        if stats is None:
+            return response
+
+        total_ms = (time.perf_counter() - stats.started) * 1000
+        db_ms = stats.duration * 1000
+        response.headers.add(
+            'Server-Timing', f'db;dur={db_ms:.2f};desc="{stats.count} queries", app;dur={total_ms:.2f}'
+        )
+
+        endpoint = request.endpoint or request.path
+        if stats.count > cls.max_queries or db_ms > cls.max_db_time:
+            logger.warning(
+                f"请求超出SQL预算: {request.method} {endpoint} 查询 {stats.count} 次"
+                f"（预算 {cls.max_queries}），数据库耗时 {db_ms:.1f}ms（预算 {cls.max_db_time}ms）"
+            )
+        for shape, times in stats.repeated(cls.repeat_threshold):
+            logger.warning(f"疑似N+1查询: {request.method} {endpoint} 同一语句执行 {times} 次: {shape[:300]}")
+        return response
+
+def init_query_profiler(app):
+    """初始化请求级SQL统计"""
+    QueryProfiler.init_app(app)
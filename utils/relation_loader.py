@@ -0,0 +1,71 @@
+"""
+批量关联加载
+序列化列表时先收集所有关联的佛号经文、用户、章节ID，每种类型一次IN查询加载，
+避免 to_dict_with_* 逐条 Query.get 造成的N+1查询
+"""
+from models.chanting import Chanting
+from models.chapter import Chapter
+from models.user import User
+
+class RelationLoader:
+    """关联对象缓存，按 (模型, ID) 查找；未预加载的ID在首次访问时单独查询"""
+
+    def __init__(self):
+        self._objects = {}  # 模型 -> {ID: 对象或None}
+
+    @classmethod
+    def for_items(cls, items, **relations):
+        """
+        为一组模型实例预加载关联对象
+        relations: 外键属性名 -> 关联模型，如 chanting_id=Chanting
+        """
+        loader = cls()
+        for attr, model in relations.items():
+            loader.preload(model, (getattr(item, attr) for item in items))
+        return loader
+
+    def preload(self, model, ids):
+        """一次IN查询加载尚未缓存的ID"""
+        loaded = self._objects.setdefault(model, {})
+        missing = {obj_id for obj_id in ids if obj_id} - loaded.keys()
+        if not missing:
+            return
+
+        for obj in model.query.filter(model.id.in_(missing)).all():
+            loaded[obj.id] = obj
+        # 不存在的ID也记录下来，避免重复查询
+        for obj_id in missing:
+            loaded.setdefault(obj_id, None)
+
+    def get(self, model, obj_id):
+        """获取关联对象，不存在时返回None"""
+        if not obj_id:
+            return None
+        loaded = self._objects.get(model, {})
+        if obj_id not in loaded:
+            self.preload(model, [obj_id])
+        return self._objects[model].get(obj_id)
+
+def serialize_chanting_records(records, with_user=True):
+    """批量序列化修行记录（包含佛号经文，可选包含用户）"""
+    if with_user:
+        loader = RelationLoader.for_items(records, chanting_id=Chanting, user_id=User)
+        return [record.to_dict_with_user_and_chanting(loader) for record in records]
+
+    loader = RelationLoader.for_items(records, chanting_id=Chanting)
+    return [record.to_dict_with_chanting(loader) for record in records]
+
+def serialize_daily_stats(stats):
+    """批量序列化每日统计（包含佛号经文）"""
+    loader = RelationLoader.for_items(stats, chanting_id=Chanting)
+    return [stat.to_dict_with_chanting(loader) for stat in stats]
+
+def serialize_chapters(chapters):
+    """批量序列化章节（包含所属经文）"""
+    loader = RelationLoader.for_items(chapters, chanting_id=Chanting)
+    return [chapter.to_dict_with_chanting(loader) for chapter in chapters]
+
+def serialize_reading_progress(progress_list):
+    """批量序列化阅读进度（包含经文、章节和用户）"""
+    loader = RelationLoader.for_items(progress_list, chanting_id=Chanting, chapter_id=Chapter, user_id=User)
+    return [progress.to_dict_with_details(loader) for progress in progress_list]
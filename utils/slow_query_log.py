@@ -0,0 +1,260 @@
+"""
+慢查询日志
+耗时超过阈值的语句记录在进程内的定长环形缓冲中（语句形状、脱敏参数、耗时、来源端点），
+执行计划（SQLite为 EXPLAIN QUERY PLAN，MySQL为 EXPLAIN）在记录时交给后台线程用独立连接获取，
+不占用慢请求本身的时间；获取后即丢弃原始参数，计划反映的是记录时的数据和索引
+"""
+import logging
+import queue
+import threading
+from collections import deque
+from datetime import date, datetime
+from decimal import Decimal
+from flask import has_request_context, request
+from database import db
+from utils.query_profiler import QueryProfiler, fingerprint
+
+logger = logging.getLogger(__name__)
+
+EXPLAIN_PREFIXES = {
+    'sqlite': 'EXPLAIN QUERY PLAN ',
+    'mysql': 'EXPLAIN ',
+    'postgresql': 'EXPLAIN '
+}
+EXPLAINABLE_STATEMENTS = ('SELECT', 'WITH', 'UPDATE', 'DELETE')
+SKIP_OPTION = 'slow_query_log_skip'  # 带此执行选项的连接（获取执行计划本身）不记录
+
+def redact_value(value):
+    """参数脱敏：保留数字、日期、布尔和空值，字符串和二进制只保留类型和长度"""
+    if value is None or isinstance(value, (bool, int, float, Decimal)):
+        return value
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, (str, bytes, bytearray, memoryview)):
+        return f'<{type(value).__name__}:{len(value)}>'
+    return f'<{type(value).__name__}>'
+
+def redact_parameters(parameters, executemany=False):
+    """参数集脱敏，executemany时只保留第一组参数和组数"""
+    if executemany:
+        parameter_sets = list(parameters or ())
+        return {
+            'first': redact_parameters(parameter_sets[0]) if parameter_sets else None,
+            'sets': len(parameter_sets)
+        }
+    if isinstance(parameters, dict):
+        return {key: redact_value(value) for key, value in parameters.items()}
+    if isinstance(parameters, (list, tuple)):
+        return [redact_value(value) for value in parameters]
+    return redact_value(parameters)
+
+class SlowQueryEntry:
+    """一条慢查询记录"""
+
+    __slots__ = ('fingerprint', 'statement', 'parameters', 'duration', 'endpoint',
+                 'recorded_at', 'executemany', '_raw_parameters', '_plan')
+
+    def __init__(self, statement, parameters, duration, endpoint, executemany):
+        self.fingerprint = fingerprint(statement)
+        self.statement = statement
+        self.parameters = redact_parameters(parameters, executemany)
+        self.duration = duration
+        self.endpoint = endpoint
+        self.recorded_at = datetime.utcnow()
+        self.executemany = executemany
+        # 原始参数只保留到后台线程获取执行计划为止，不对外输出
+        self._raw_parameters = parameters if self.is_explainable() else None
+        self._plan = None if self.is_explainable() else []
+
+    def is_explainable(self):
+        return not self.executemany and self.statement.lstrip().upper().startswith(EXPLAINABLE_STATEMENTS)
+
+    def capture_plan(self):
+        """获取执行计划并丢弃原始参数（由后台线程在应用上下文中调用）"""
+        try:
+            self._plan = SlowQueryLog.explain(self.statement, self._raw_parameters)
+        finally:
+            self._raw_parameters = None
+
+    def skip_plan(self, reason):
+        """不获取执行计划，丢弃原始参数"""
+        self._raw_parameters = None
+        self._plan = [{'error': reason}]
+
+    def get_plan(self):
+        """执行计划，后台线程尚未获取时返回None"""
+        return self._plan
+
+    def to_dict(self, with_plan=True):
+        data = {
+            'fingerprint': self.fingerprint,
+            'statement': self.statement,
+            'parameters': self.parameters,
+            'duration_ms': round(self.duration * 1000, 2),
+            'endpoint': self.endpoint,
+            'recorded_at': self.recorded_at.isoformat()
+        }
+        if with_plan:
+            data['plan'] = self.get_plan()
+        return data
+
+class SlowQueryLog:
+    """慢查询环形缓冲"""
+
+    DEFAULT_THRESHOLD = 200  # 毫秒
+    DEFAULT_MAX_ENTRIES = 100
+
+    _entries = deque(maxlen=DEFAULT_MAX_ENTRIES)
+    _lock = threading.Lock()
+    _app = None
+    _plan_queue = queue.Queue(maxsize=DEFAULT_MAX_ENTRIES)
+    _plan_thread = None
+    enabled = True
+    threshold = DEFAULT_THRESHOLD / 1000  # 秒
+    max_entries = DEFAULT_MAX_ENTRIES
+    total_recorded = 0
+
+    @classmethod
+    def init_app(cls, app):
+        """读取阈值和缓冲大小配置并注册到SQL统计（阈值为0时不记录）"""
+        cls._app = app
+        threshold_ms = app.config.get('SLOW_QUERY_THRESHOLD_MS', cls.DEFAULT_THRESHOLD)
+        cls.enabled = threshold_ms > 0
+        cls.threshold = threshold_ms / 1000
+        cls.max_entries = max(int(app.config.get('SLOW_QUERY_LOG_SIZE', cls.DEFAULT_MAX_ENTRIES)), 1)
+        with cls._lock:
+            cls._entries = deque(cls._entries, maxlen=cls.max_entries)
+            cls._plan_queue = queue.Queue(maxsize=cls.max_entries)
+        QueryProfiler.add_observer(cls.observe)
+
+    @classmethod
+    def observe(cls, conn, statement, parameters, duration, executemany):
+        """由SQL统计的cursor事件调用，超过阈值时记录"""
+        if not cls.enabled or duration < cls.threshold:
+            return
+        if conn.get_execution_options().get(SKIP_OPTION):
+            return
+
+        if has_request_context():
+            endpoint = f'{request.method} {request.endpoint or request.path}'
+        else:
+            endpoint = threading.current_thread().name
+        entry = SlowQueryEntry(statement, parameters, duration, endpoint, executemany)
+        with cls._lock:
+            cls._entries.append(entry)
+            cls.total_recorded += 1
+        logger.warning(f"慢查询 {duration * 1000:.1f}ms [{endpoint}]: {entry.fingerprint[:300]}")
+        if entry.get_plan() is None:
+            cls._submit_plan(entry)
+
+    @classmethod
+    def _submit_plan(cls, entry):
+        """交给后台线程获取执行计划，队列已满时放弃"""
+        try:
+            cls._plan_queue.put_nowait(entry)
+        except queue.Full:
+            entry.skip_plan('执行计划队列已满，未获取')
+            return
+        cls._ensure_plan_thread()
+
+    @classmethod
+    def _ensure_plan_thread(cls):
+        if cls._plan_thread is not None and cls._plan_thread.is_alive():
+            return
+        with cls._lock:
+            if cls._plan_thread is not None and cls._plan_thread.is_alive():
+                return
+            cls._plan_thread = threading.Thread(target=cls._run_plans, name='slow-query-explain', daemon=True)
+            cls._plan_thread.start()
+
+    @classmethod
+    def _run_plans(cls):
+        while True:
+            entry = cls._plan_queue.get()
+            try:
+                if cls._app is None:
+                    entry.skip_plan('慢查询日志未初始化')
+                    continue
+                with cls._app.app_context():
+                    entry.capture_plan()
+            except Exception as e:
+                logger.error(f"获取慢查询执行计划异常: {str(e)}")
+                entry.skip_plan(str(e))
+            finally:
+                cls._plan_queue.task_done()
+
+    @classmethod
+    def get_entries(cls, limit=None, order='recent'):
+        """获取记录，order为recent（最新在前）或duration（最慢在前）"""
+        with cls._lock:
+            entries = list(cls._entries)
+        if order == 'duration':
+            entries.sort(key=lambda entry: entry.duration, reverse=True)
+        else:
+            entries.reverse()
+        return entries[:limit] if limit else entries
+
+    @classmethod
+    def get_summary(cls):
+        """按语句形状汇总缓冲中的记录，按累计耗时降序"""
+        groups = {}
+        for entry in cls.get_entries():
+            group = groups.setdefault(entry.fingerprint, {
+                'fingerprint': entry.fingerprint, 'count': 0, 'total_ms': 0.0, 'max_ms': 0.0, 'endpoints': set()
+            })
+            duration_ms = entry.duration * 1000
+            group['count'] += 1
+            group['total_ms'] += duration_ms
+            group['max_ms'] = max(group['max_ms'], duration_ms)
+            group['endpoints'].add(entry.endpoint)
+
+        summary = sorted(groups.values(), key=lambda group: group['total_ms'], reverse=True)
+        for group in summary:
+            group['total_ms'] = round(group['total_ms'], 2)
+            group['max_ms'] = round(group['max_ms'], 2)
+            group['endpoints'] = sorted(group['endpoints'])
+        return summary
+
+    @classmethod
+    def clear(cls):
+        """清空记录"""
+        with cls._lock:
+            cls._entries.clear()
+
+    @classmethod
+    def get_stats(cls):
+        """获取缓冲统计信息"""
+        with cls._lock:
+            return {
+                'enabled': cls.enabled,
+                'threshold_ms': round(cls.threshold * 1000, 2),
+                'size': len(cls._entries),
+                'max_entries': cls.max_entries,
+                'total_recorded': cls.total_recorded,
+                'pending_plans': cls._plan_queue.qsize()
+            }
+
+    @staticmethod
+    def explain(statement, parameters):
+        """用独立连接获取语句的执行计划，返回行字典列表；不支持的数据库或失败时返回错误说明"""
+        prefix = EXPLAIN_PREFIXES.get(db.engine.dialect.name)
+        if prefix is None:
+            return [{'error': f'不支持的数据库类型: {db.engine.dialect.name}'}]
+        try:
+            with db.engine.connect() as connection:
+                result = connection.execution_options(**{SKIP_OPTION: True}).exec_driver_sql(
+                    prefix + statement, parameters if parameters is not None else ()
+                )
+                rows = [
+                    {key: value if isinstance(value, (int, float, type(None))) else str(value)
+                     for key, value in row._mapping.items()}
+                    for row in result
+                ]
+            return rows
+        except Exception as e:
+            logger.error(f"获取执行计划失败: {str(e)}")
+            return [{'error': str(e)}]
+
+def init_slow_query_log(app):
+    """初始化慢查询日志"""
+    SlowQueryLog.init_app(app)
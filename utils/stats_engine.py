@@ -0,0 +1,155 @@
+"""
+修行统计计算
+将每日统计转换为按天连续的紧凑计数数组（起始日期 + array），
+一次遍历计算总数、近7/30天、最高单日、当前与最长连续天数等指标
+"""
+from array import array
+from datetime import date, timedelta
+from database import db
+from models.daily_stats import DailyStats
+from utils.counter_buffer import DailyStatsBuffer
+
+MAX_CHART_DAYS = 90
+
+class DailySeries:
+    """按天的计数序列，counts[i] 为 start_date + i 天的念诵次数，缺失的日期为0"""
+
+    def __init__(self, start_date=None, counts=None):
+        self.start_date = start_date
+        self.counts = counts if counts is not None else array('q')
+
+    @classmethod
+    def from_rows(cls, rows):
+        """由按日期升序的 (日期, 次数) 序列构造，同一天出现多次时累加"""
+        series = cls()
+        for stat_date, count in rows:
+            series.add(stat_date, count)
+        return series
+
+    def add(self, stat_date, count):
+        """累加某天的次数，超出当前范围时扩展数组"""
+        if self.start_date is None:
+            self.start_date = stat_date
+        index = (stat_date - self.start_date).days
+        if index < 0:
+            self.counts[0:0] = array('q', [0] * -index)
+            self.start_date = stat_date
+            index = 0
+        if index >= len(self.counts):
+            self.counts.extend([0] * (index + 1 - len(self.counts)))
+        self.counts[index] += count or 0
+
+    @property
+    def end_date(self):
+        if self.start_date is None or not self.counts:
+            return None
+        return self.start_date + timedelta(days=len(self.counts) - 1)
+
+    def count_on(self, target_date):
+        """某天的念诵次数"""
+        if self.start_date is None:
+            return 0
+        index = (target_date - self.start_date).days
+        return self.counts[index] if 0 <= index < len(self.counts) else 0
+
+    def window(self, end_date, days):
+        """截至end_date（含）最近days天的 (日期, 次数) 列表"""
+        return [(day, self.count_on(day)) for day in
+                (end_date - timedelta(days=offset) for offset in range(days - 1, -1, -1))]
+
+def load_daily_series(user_id, chanting_id):
+    """读取某用户某佛号经文的每日统计序列（只查询日期和次数两列）"""
+    rows = db.session.query(DailyStats.date, DailyStats.count).filter(
+        DailyStats.user_id == user_id,
+        DailyStats.chanting_id == chanting_id
+    ).order_by(DailyStats.date).all()
+    return DailySeries.from_rows(rows)
+
+def scan_series(series, today=None):
+    """
+    一次遍历计算统计指标，日期字段为date对象
+
+    Returns:
+        dict: today_count、total_count、total_days、week_total、month_total、max_daily、
+              max_daily_date、consecutive_days（截至今天）、last_streak（截至最近修行日）、
+              max_consecutive、avg_daily、first_practice_date、last_practice_date
+    """
+    today = today or date.today()
+    week_start = today - timedelta(days=6)
+    month_start = today - timedelta(days=29)
+
+    total_count = 0
+    total_days = 0
+    week_total = 0
+    month_total = 0
+    max_daily = 0
+    max_daily_date = None
+    streak = 0
+    last_streak = 0
+    max_consecutive = 0
+    first_practice_date = None
+    last_practice_date = None
+
+    current_date = series.start_date
+    for count in series.counts:
+        if count > 0:
+            total_count += count
+            total_days += 1
+            streak += 1
+            last_streak = streak
+            max_consecutive = max(max_consecutive, streak)
+            first_practice_date = first_practice_date or current_date
+            last_practice_date = current_date
+            # 相同次数取较近的日期
+            if count >= max_daily:
+                max_daily = count
+                max_daily_date = current_date
+            if week_start <= current_date <= today:
+                week_total += count
+            if month_start <= current_date <= today:
+                month_total += count
+        else:
+            streak = 0
+        current_date += timedelta(days=1)
+
+    return {
+        'today_count': series.count_on(today),
+        'total_count': total_count,
+        'total_days': total_days,
+        'week_total': week_total,
+        'month_total': month_total,
+        'max_daily': max_daily,
+        'max_daily_date': max_daily_date,
+        # 今天没有修行时当前连续天数为0
+        'consecutive_days': last_streak if last_practice_date == today else 0,
+        'last_streak': last_streak,
+        'max_consecutive': max_consecutive,
+        'avg_daily': round(total_count / total_days, 1) if total_days > 0 else 0,
+        'first_practice_date': first_practice_date,
+        'last_practice_date': last_practice_date
+    }
+
+def summarize_series(series, today=None, chart_days=7):
+    """计算统计指标（日期格式化为字符串），并附带最近chart_days天的图表数据"""
+    today = today or date.today()
+    stats = scan_series(series, today)
+    for key in ('max_daily_date', 'first_practice_date', 'last_practice_date'):
+        stats[key] = stats[key].strftime('%Y-%m-%d') if stats[key] else None
+
+    stats['chart_data'] = [
+        {
+            'date': day.strftime('%Y-%m-%d'),
+            'date_short': day.strftime('%m-%d'),
+            'count': count
+        }
+        for day, count in series.window(today, chart_days)
+    ]
+    return stats
+
+def summarize_practice(user_id, chanting_id, today=None, chart_days=7):
+    """某用户某佛号经文的修行统计，计入计数缓冲中尚未写入的今日增量；chart_days限制在1到MAX_CHART_DAYS天"""
+    today = today or date.today()
+    chart_days = min(max(chart_days, 1), MAX_CHART_DAYS)
+    series = load_daily_series(user_id, chanting_id)
+    series.add(today, DailyStatsBuffer.get_pending(user_id, chanting_id, today))
+    return summarize_series(series, today, chart_days=chart_days)
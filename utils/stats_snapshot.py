@@ -0,0 +1,196 @@
+"""
+统计快照服务
+后台首页和同步管理的计数各自合并为一条查询，结果在进程内缓存STATS_SNAPSHOT_TTL秒，
+缓存期内刷新页面不再访问数据库
+"""
+import logging
+import threading
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import case, func, select
+from database import db
+from models.user import User
+from models.chanting import Chanting
+from models.dedication import Dedication
+from models.chanting_record import ChantingRecord
+from models.sync_record import SyncRecord
+from utils.relation_loader import serialize_chanting_records
+from utils.date_histogram import date_histogram
+
+logger = logging.getLogger(__name__)
+
+SYNC_TREND_DAYS = 30  # 同步趋势的天数
+
+class StatsSnapshot:
+    """带TTL的统计快照缓存
+
+    同一快照同时只有一个请求在计算，其他请求等待并直接使用计算结果
+    """
+
+    DEFAULT_TTL = 30  # 秒
+
+    _snapshots = {}  # 名称 -> (过期时间, 数据)
+    _locks = {}  # 名称 -> 计算锁
+    _lock = threading.Lock()
+    ttl = DEFAULT_TTL
+    hits = 0
+    misses = 0
+
+    @classmethod
+    def init_app(cls, app):
+        """读取缓存时间配置"""
+        cls.ttl = app.config.get('STATS_SNAPSHOT_TTL', cls.DEFAULT_TTL)
+
+    @classmethod
+    def get(cls, name, builder):
+        """获取快照，过期或不存在时调用builder重新计算"""
+        snapshot = cls._get_fresh(name)
+        if snapshot is not None:
+            return snapshot
+
+        with cls._lock:
+            build_lock = cls._locks.setdefault(name, threading.Lock())
+
+        with build_lock:
+            # 等待期间其他请求可能已经计算完成
+            snapshot = cls._get_fresh(name)
+            if snapshot is not None:
+                return snapshot
+
+            started = time.perf_counter()
+            snapshot = builder()
+            logger.debug(f"统计快照 {name} 计算耗时 {(time.perf_counter() - started) * 1000:.1f}ms")
+            with cls._lock:
+                cls.misses += 1
+                if cls.ttl > 0:
+                    cls._snapshots[name] = (time.monotonic() + cls.ttl, snapshot)
+            return snapshot
+
+    @classmethod
+    def invalidate(cls, name=None):
+        """清除指定快照，不指定时清除全部"""
+        with cls._lock:
+            if name is None:
+                cls._snapshots.clear()
+            else:
+                cls._snapshots.pop(name, None)
+
+    @classmethod
+    def get_stats(cls):
+        """获取缓存统计信息"""
+        with cls._lock:
+            return {
+                'ttl': cls.ttl,
+                'snapshots': len(cls._snapshots),
+                'hits': cls.hits,
+                'misses': cls.misses
+            }
+
+    @classmethod
+    def _get_fresh(cls, name):
+        with cls._lock:
+            entry = cls._snapshots.get(name)
+            if entry and entry[0] > time.monotonic():
+                cls.hits += 1
+                return entry[1]
+        return None
+
+def get_dashboard_snapshot():
+    """后台首页快照：计数、最近用户和最近修行记录"""
+    return StatsSnapshot.get('dashboard', build_dashboard_snapshot)
+
+def get_sync_stats_snapshot():
+    """同步管理统计快照"""
+    return StatsSnapshot.get('sync_stats', build_sync_stats)
+
+def build_dashboard_snapshot():
+    """计算后台首页数据：六项计数合并为一条查询（各表的标量子查询）"""
+    active_chantings = Chanting.is_deleted == False
+    counts = db.session.execute(select(
+        select(func.count(User.id)).where(User.is_deleted == False).scalar_subquery(),
+        select(func.count(Chanting.id)).where(active_chantings).scalar_subquery(),
+        select(func.count(ChantingRecord.id)).scalar_subquery(),
+        select(func.count(Dedication.id)).scalar_subquery(),
+        select(func.count(Chanting.id)).where(active_chantings, Chanting.is_built_in == True).scalar_subquery(),
+        select(func.count(Chanting.id)).where(active_chantings, Chanting.is_built_in == False).scalar_subquery()
+    )).one()
+
+    stats = dict(zip(
+        ('total_users', 'total_chantings', 'total_records', 'total_dedications',
+         'built_in_chantings', 'custom_chantings'),
+        (count or 0 for count in counts)
+    ))
+
+    # 最近的用户和修行记录转为字典缓存，不持有会话中的模型对象
+    recent_users = [
+        {
+            'id': user.id,
+            'username': user.username,
+            'nickname': user.nickname,
+            'created_at': user.created_at
+        }
+        for user in User.query.filter_by(is_deleted=False).order_by(User.created_at.desc()).limit(5)
+    ]
+    recent_records = serialize_chanting_records(
+        ChantingRecord.query.order_by(ChantingRecord.created_at.desc()).limit(10).all(),
+        with_user=False
+    )
+
+    return {
+        'stats': stats,
+        'recent_users': recent_users,
+        'recent_records': recent_records
+    }
+
+def build_sync_stats():
+    """计算同步统计：全部计数和去重计数合并为一条条件聚合查询"""
+    now = datetime.utcnow()
+    today_start = datetime.combine(now.date(), datetime.min.time())
+    week_ago = now - timedelta(days=7)
+    month_ago = now - timedelta(days=30)
+    started = SyncRecord.sync_started_at
+    in_week = started >= week_ago
+
+    def count_if(condition):
+        return func.coalesce(func.sum(case((condition, 1), else_=0)), 0)
+
+    row = db.session.query(
+        func.count(SyncRecord.id),
+        count_if(SyncRecord.sync_status == 'success'),
+        count_if(SyncRecord.sync_status == 'failed'),
+        count_if(db.and_(started >= today_start, started < today_start + timedelta(days=1))),
+        count_if(in_week),
+        count_if(started >= month_ago),
+        func.count(func.distinct(case((in_week, SyncRecord.user_id)))),
+        func.count(func.distinct(case((in_week, SyncRecord.device_id))))
+    ).one()
+    (total_records, success_records, failed_records, today_records,
+     week_records, month_records, active_users, active_devices) = (int(value or 0) for value in row)
+
+    # 成功率
+    success_rate = (success_records / total_records * 100) if total_records > 0 else 0
+
+    # 最近30天每天的同步次数（一次按日期分组查询）
+    daily_records = [
+        {'date': day.strftime('%m-%d'), 'count': count}
+        for day, count in date_histogram(
+            SyncRecord.sync_started_at, now.date() - timedelta(days=SYNC_TREND_DAYS - 1), now.date()
+        )
+    ]
+
+    return {
+        'total_records': total_records,
+        'success_records': success_records,
+        'failed_records': failed_records,
+        'success_rate': round(success_rate, 2),
+        'today_records': today_records,
+        'week_records': week_records,
+        'month_records': month_records,
+        'active_users': active_users,
+        'active_devices': active_devices,
+        'daily_records': daily_records
+    }
+
+def init_stats_snapshot(app):
+    """初始化统计快照缓存"""
+    StatsSnapshot.init_app(app)
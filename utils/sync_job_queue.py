@@ -0,0 +1,250 @@
+"""
+同步任务队列
+异步上传时请求只负责保存任务，由后台线程池执行实际的同步处理；
+后台恢复线程定期接管重启或崩溃后遗留的排队任务和超时的处理中任务
+"""
+import json
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from flask import current_app
+from database import db
+from models.sync_record import SyncRecord
+
+logger = logging.getLogger('sync')
+
+class SyncJobQueue:
+    """异步同步任务队列
+
+    任务本身保存在sync_records表（job_status/job_payload），进程内只保留线程池；
+    工作线程通过条件更新领取任务，多进程部署时同一任务只会被处理一次。
+    进程重启后线程池中的任务会丢失，由恢复线程重新提交排队超过 QUEUED_GRACE 秒的任务，
+    处理超过 sync_job_timeout 秒的任务重新排队，执行次数达到 sync_job_max_attempts 后标记失败。
+    """
+
+    DEFAULT_WORKERS = 2
+    DEFAULT_TIMEOUT = 1800  # 秒
+    DEFAULT_MAX_ATTEMPTS = 3
+    RECOVERY_INTERVAL = 60  # 秒
+    QUEUED_GRACE = 60  # 秒，刚入队的任务可能还在其他进程的线程池中
+
+    _app = None
+    _executor = None
+    _submitted = set()  # 本进程线程池中尚未结束的任务ID
+    _lock = threading.Lock()
+    _recovery_thread = None
+
+    @classmethod
+    def init_app(cls, app):
+        """记录应用，首个请求时启动恢复线程（启动时先恢复一次）"""
+        cls._app = app
+        app.before_request(cls.ensure_recovery_thread)
+
+    @classmethod
+    def enqueue(cls, sync_record, payload):
+        """保存任务数据并提交到后台线程池，返回任务ID"""
+        sync_record.sync_status = 'pending'
+        sync_record.job_status = 'queued'
+        sync_record.job_progress = 0
+        sync_record.job_attempts = 0
+        sync_record.job_payload = json.dumps(payload, ensure_ascii=False)
+        db.session.add(sync_record)
+        db.session.commit()
+
+        cls.submit(sync_record.id)
+        return sync_record.id
+
+    @classmethod
+    def submit(cls, job_id):
+        """提交已保存的任务"""
+        app = current_app._get_current_object()
+        with cls._lock:
+            cls._submitted.add(job_id)
+        cls._get_executor().submit(cls._run_job, app, job_id)
+        logger.info(f"异步同步任务已提交，任务ID: {job_id}")
+
+    @classmethod
+    def recover(cls):
+        """
+        接管遗留任务（需要应用上下文），返回 {'resubmitted', 'requeued', 'failed'} 任务ID列表
+        - 排队超过 QUEUED_GRACE 秒且不在本进程线程池中的任务重新提交
+        - 处理中超过超时时间且不在本进程线程池中的任务重新排队并提交，执行次数用完时标记失败
+        """
+        from models.sync_config import SyncConfig
+        timeout = cls._get_int_config(SyncConfig, 'sync_job_timeout', cls.DEFAULT_TIMEOUT)
+        max_attempts = cls._get_int_config(SyncConfig, 'sync_job_max_attempts', cls.DEFAULT_MAX_ATTEMPTS)
+        now = datetime.utcnow()
+        with cls._lock:
+            submitted = set(cls._submitted)
+
+        table = SyncRecord.__table__
+        recovered = {'resubmitted': [], 'requeued': [], 'failed': []}
+
+        queued = db.session.query(SyncRecord.id).filter(
+            SyncRecord.job_status == 'queued',
+            SyncRecord.created_at < now - timedelta(seconds=cls.QUEUED_GRACE)
+        ).all()
+        recovered['resubmitted'] = [job_id for job_id, in queued if job_id not in submitted]
+
+        stale = db.session.query(SyncRecord.id, SyncRecord.job_attempts).filter(
+            SyncRecord.job_status == 'running',
+            SyncRecord.sync_started_at < now - timedelta(seconds=timeout)
+        ).all()
+        for job_id, attempts in stale:
+            if job_id in submitted:
+                continue
+            # 条件更新，多个进程同时恢复时只有一个生效
+            still_running = db.and_(table.c.id == job_id, table.c.job_status == 'running')
+            if (attempts or 0) >= max_attempts:
+                result = db.session.execute(table.update().where(still_running).values(
+                    sync_status='failed', job_status='failed', job_payload=None, sync_completed_at=now,
+                    error_message=f'任务执行 {attempts} 次均未完成（超时或服务重启）'
+                ))
+                if result.rowcount:
+                    recovered['failed'].append(job_id)
+            else:
+                result = db.session.execute(table.update().where(still_running).values(
+                    job_status='queued', job_progress=0
+                ))
+                if result.rowcount:
+                    recovered['requeued'].append(job_id)
+        db.session.commit()
+
+        for job_id in recovered['resubmitted'] + recovered['requeued']:
+            cls.submit(job_id)
+        if any(recovered.values()):
+            logger.warning(f"接管遗留的异步同步任务: {recovered}")
+        return recovered
+
+    @classmethod
+    def ensure_recovery_thread(cls):
+        """按需启动恢复线程"""
+        if cls._recovery_thread is not None and cls._recovery_thread.is_alive():
+            return
+        with cls._lock:
+            if cls._recovery_thread is not None and cls._recovery_thread.is_alive():
+                return
+            cls._recovery_thread = threading.Thread(
+                target=cls._run_recovery, name='sync-job-recovery', daemon=True
+            )
+            cls._recovery_thread.start()
+
+    @classmethod
+    def _run_recovery(cls):
+        while True:
+            try:
+                with cls._app.app_context():
+                    try:
+                        cls.recover()
+                    finally:
+                        db.session.remove()
+            except Exception as e:
+                logger.error(f"异步同步任务恢复异常: {str(e)}")
+            time.sleep(cls.RECOVERY_INTERVAL)
+
+    @staticmethod
+    def _get_int_config(config_model, key, default):
+        try:
+            return max(int(config_model.get_config(key, default)), 1)
+        except (TypeError, ValueError):
+            return default
+
+    @classmethod
+    def _get_executor(cls):
+        with cls._lock:
+            if cls._executor is None:
+                from models.sync_config import SyncConfig
+                try:
+                    workers = max(int(SyncConfig.get_config('sync_async_workers', cls.DEFAULT_WORKERS)), 1)
+                except (TypeError, ValueError):
+                    workers = cls.DEFAULT_WORKERS
+                cls._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='sync-job')
+            return cls._executor
+
+    @staticmethod
+    def claim(job_id):
+        """领取排队中的任务，返回是否领取成功"""
+        table = SyncRecord.__table__
+        result = db.session.execute(
+            table.update()
+            .where(table.c.id == job_id, table.c.job_status == 'queued')
+            .values(
+                job_status='running', job_progress=0, sync_started_at=datetime.utcnow(),
+                job_attempts=db.func.coalesce(table.c.job_attempts, 0) + 1
+            )
+        )
+        db.session.commit()
+        return result.rowcount == 1
+
+    @staticmethod
+    def update_progress(job_id, progress):
+        """记录任务进度
+
+        进度通过独立连接提交，不进入同步数据所在的事务；
+        SQLite在写事务期间整库加锁，另开连接写入会阻塞，因此只在结束时记录进度。
+        """
+        if db.engine.dialect.name == 'sqlite':
+            return
+
+        table = SyncRecord.__table__
+        try:
+            with db.engine.begin() as conn:
+                conn.execute(
+                    table.update()
+                    .where(table.c.id == job_id)
+                    .values(job_progress=progress)
+                )
+        except Exception as e:
+            logger.warning(f"更新任务进度失败，任务ID: {job_id}, 错误: {str(e)}")
+
+    @classmethod
+    def _run_job(cls, app, job_id):
+        with app.app_context():
+            try:
+                if not cls.claim(job_id):
+                    logger.info(f"任务 {job_id} 已被领取或不存在，跳过")
+                    return
+                cls._process(job_id)
+            except Exception as e:
+                logger.error(f"异步同步任务执行异常，任务ID: {job_id}, 错误: {str(e)}")
+            finally:
+                db.session.remove()
+                with cls._lock:
+                    cls._submitted.discard(job_id)
+
+    @classmethod
+    def _process(cls, job_id):
+        from models.user import User
+        from routes.sync import process_upload
+
+        sync_record = SyncRecord.query.get(job_id)
+        try:
+            data = json.loads(sync_record.job_payload or '{}')
+            current_user = User.query.get(sync_record.user_id)
+            if not current_user:
+                raise ValueError(f"用户不存在: {sync_record.user_id}")
+
+            logger.info(f"开始处理异步同步任务，任务ID: {job_id}, 用户: {current_user.username}")
+            process_upload(
+                data, current_user, sync_record,
+                progress_callback=lambda progress: cls.update_progress(job_id, progress)
+            )
+            logger.info(f"异步同步任务完成，任务ID: {job_id}")
+
+        except Exception as e:
+            logger.error(f"异步同步任务失败，任务ID: {job_id}, 错误: {str(e)}")
+            db.session.rollback()
+
+            sync_record = SyncRecord.query.get(job_id)
+            sync_record.sync_status = 'failed'
+            sync_record.job_status = 'failed'
+            sync_record.job_payload = None
+            sync_record.error_message = str(e)
+            sync_record.sync_completed_at = datetime.utcnow()
+            db.session.commit()
+
+def init_sync_job_queue(app):
+    """初始化异步同步任务队列"""
+    SyncJobQueue.init_app(app)
@@ -0,0 +1,42 @@
+"""
+批量upsert语句构造
+MySQL使用 INSERT ... ON DUPLICATE KEY UPDATE，SQLite/PostgreSQL使用 ON CONFLICT DO UPDATE；
+其他数据库在应用启动时即报配置错误，不会等到第一次写入才失败
+"""
+from sqlalchemy.engine import make_url
+from database import db
+
+SUPPORTED_DIALECTS = ('mysql', 'sqlite', 'postgresql')
+
+def check_database_dialect(app):
+    """启动时检查配置的数据库是否支持upsert，不支持时抛出RuntimeError"""
+    dialect = make_url(app.config['SQLALCHEMY_DATABASE_URI']).get_backend_name()
+    if dialect not in SUPPORTED_DIALECTS:
+        raise RuntimeError(
+            f"不支持的数据库类型: {dialect}，请在配置中使用 MySQL 或 SQLite"
+            f"（支持: {', '.join(SUPPORTED_DIALECTS)}）"
+        )
+
+def upsert_statement(table, values, conflict_columns, build_updates):
+    """
+    构造批量upsert语句
+
+    Args:
+        table: 目标表
+        values: 待插入的行字典列表
+        conflict_columns: 唯一约束的列名，冲突时改为更新
+        build_updates: 接收待插入行（MySQL的inserted，SQLite/PostgreSQL的excluded），
+            返回冲突时更新的 {列名: 值}
+    """
+    dialect = db.engine.dialect.name
+    if dialect == 'mysql':
+        from sqlalchemy.dialects.mysql import insert
+        stmt = insert(table).values(values)
+        return stmt.on_duplicate_key_update(build_updates(stmt.inserted))
+
+    if dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    stmt = insert(table).values(values)
+    return stmt.on_conflict_do_update(index_elements=conflict_columns, set_=build_updates(stmt.excluded))